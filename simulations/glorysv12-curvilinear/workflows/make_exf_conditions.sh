@@ -18,7 +18,9 @@ source $SCRIPT_DIR/env.sh
 
 ###############################################################################################
 # Run the script to download make the exf boundary conditions
+# Each worker holds one TIME_CHUNK block (~2.5 GB peak); size EXF_WORKERS to node memory.
 ###############################################################################################
+EXF_WORKERS=${EXF_WORKERS:-16}
 srun --container-image=$SPECTRE_UTILS_IMG \
      --container-mounts=${HOME}:${HOME},${SCRIPT_DIR}/../:/workspace,${HOST_DATADIR}:/data \
-     python /opt/spectre_utils/mk_exf_conditions.py /workspace/etc/config.yaml
+     python /opt/spectre_utils/mk_exf_conditions.py /workspace/etc/config.yaml --workers ${EXF_WORKERS}
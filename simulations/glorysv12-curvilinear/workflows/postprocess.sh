@@ -26,7 +26,9 @@ echo " Simulation dir: ${SIMULATION_DIR}"
 echo " SLURM Job ID:   ${SLURM_JOB_ID}"
 echo "======================================="
 
-# Step 1: Converter (binary diagnostics → per-tile NetCDF)
+# Step 1: Converter (binary diagnostics → per-tile NetCDF, or one Zarr store
+# per run with DIAG_FORMAT=zarr)
+DIAG_FORMAT=${DIAG_FORMAT:-netcdf}
 srun --ntasks=1 --cpus-per-task=2 --exclusive \
      --container-image=$SPECTRE_UTILS_IMG \
      --container-mounts=${HOME}:${HOME},${SIMULATION_DIR}:/workspace,${HOST_DATADIR}:/data \
@@ -34,7 +36,8 @@ srun --ntasks=1 --cpus-per-task=2 --exclusive \
        /workspace \
        --poll 60 \
        --start-date 2002-07-01 \
-       --dt 360.0 &
+       --dt 360.0 \
+       --format ${DIAG_FORMAT} &
 CONVERTER_PID=$!
 echo "Converter started: srun PID $CONVERTER_PID"
 
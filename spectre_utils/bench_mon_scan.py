@@ -0,0 +1,198 @@
+"""
+bench_mon_scan.py
+=================
+Throughput of the ``%MON`` parsers on a synthetic MITgcm STDOUT.
+
+Writes a STDOUT of about ``--size-gb`` gigabytes laid out like a real run:
+every time step has a ``%MON`` block of ``--keys`` statistics (values with
+Fortran ``D`` exponents) followed by ``--noise`` lines of solver output
+that are not ``%MON`` lines.  Keys of the ``exf_`` package only start a
+third of the way in, as when a package is switched on at a restart.
+
+The file is then parsed twice and the MB/s of each reported:
+
+  * ``legacy`` - the per-line regex parser the watchers used before
+    mon_scan.py, appending one dict per record to a MonitorRecords;
+  * ``mon_scan`` - MonScanner + split_records + MonitorRecords.extend.
+
+Both must give the same number of records and the same columns.  The file
+is read once beforehand, so both runs see a warm page cache.
+
+Usage:
+    python bench_mon_scan.py --size-gb 2 --path /scratch/bench_STDOUT
+    python bench_mon_scan.py --path run/STDOUT.0000 --no-generate
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+
+import numpy as np
+
+from spectre_utils.mon_scan import MonScanner, split_records
+from spectre_utils.monitor_records import MonitorRecords
+
+
+# ---------------------------------------------------------------------------
+# Synthetic STDOUT
+# ---------------------------------------------------------------------------
+
+STATS = ["max", "min", "mean", "sd", "del2"]
+FIELDS = ["dynstat_eta", "dynstat_uvel", "dynstat_vvel", "dynstat_wvel",
+          "dynstat_theta", "dynstat_salt", "advcfl_uvel", "advcfl_vvel",
+          "ke", "exf_hflux", "exf_sflux", "exf_ustress", "exf_vstress"]
+
+
+def monitor_keys(n_keys):
+    keys = [f"{field}_{stat}" for field in FIELDS for stat in STATS]
+    return keys[:n_keys]
+
+
+def _fortran(values):
+    return [f"{v: .16E}".replace("E", "D") for v in values]
+
+
+def generate(path, size_gb, n_keys=40, n_noise=30, seed=0):
+    """Write a synthetic STDOUT of about ``size_gb`` GB; returns its size in bytes."""
+    rng = np.random.default_rng(seed)
+    keys = monitor_keys(n_keys)
+    noise = "".join(f"(PID.TID 0000.0001) cg2d: Sum(rhs),rhsMax =   {-1.2e-10 * (i + 1):.13E}"
+                    f"   {3.4 + i:.13E}\n".replace("E", "D") for i in range(n_noise))
+    target = int(size_gb * 1e9)
+    step_bytes = len(noise) + (n_keys + 2) * 90
+    n_steps = max(target // step_bytes, 1)
+    exf_from = n_steps // 3
+    chunk = 1000
+
+    with open(path, "w") as f:
+        f.write("(PID.TID 0000.0001) // MITgcmUV version:  checkpoint68o\n")
+        for first in range(0, n_steps, chunk):
+            values = _fortran(rng.standard_normal(chunk * len(keys)))
+            out = []
+            for i in range(min(chunk, n_steps - first)):
+                step = first + i
+                out.append("(PID.TID 0000.0001) // Begin MONITOR dynamic field statistics\n")
+                out.append(f"(PID.TID 0000.0001) %MON time_tsnumber                ="
+                           f"                  {step * 10}\n")
+                out.append(f"(PID.TID 0000.0001) %MON time_secondsf                ="
+                           f"  {_fortran([step * 3600.0])[0]}\n")
+                for j, key in enumerate(keys):
+                    if key.startswith("exf_") and step < exf_from:
+                        continue
+                    out.append(f"(PID.TID 0000.0001) %MON {key:<30s} =  {values[i * len(keys) + j]}\n")
+                out.append("(PID.TID 0000.0001) // End MONITOR dynamic field statistics\n")
+                out.append(noise)
+            f.write("".join(out))
+            done = f.tell()
+            print(f"\r  wrote {done / 1e9:.2f} / {target / 1e9:.2f} GB", end="", flush=True)
+    print()
+    return os.path.getsize(path)
+
+
+# ---------------------------------------------------------------------------
+# Parsers
+# ---------------------------------------------------------------------------
+
+LEGACY_PATTERN = re.compile(r'%MON\s+(\S+)\s+=\s+(\S+)')
+
+
+def parse_legacy(path):
+    """The per-line parser of the watchers before mon_scan.py."""
+    records = MonitorRecords()
+    current = {}
+    with open(path, "r") as f:
+        for line in f:
+            m = LEGACY_PATTERN.search(line)
+            if not m:
+                continue
+            name, val_str = m.group(1), m.group(2)
+            try:
+                val = int(val_str)
+            except ValueError:
+                try:
+                    val = float(val_str.replace("D", "E"))
+                except ValueError:
+                    continue
+            if name == "time_tsnumber" and current:
+                records.append(current)
+                current = {}
+            current[name] = val
+    return records
+
+
+def parse_mon_scan(path):
+    records = MonitorRecords()
+    current = {}
+    for names, values in MonScanner(path).read():
+        columns, n, int_keys, current = split_records(names, values, current)
+        records.extend(columns, n, int_keys)
+    return records
+
+
+PARSERS = {"legacy": parse_legacy, "mon_scan": parse_mon_scan}
+
+
+def _warm(path, block=64 << 20):
+    with open(path, "rb") as f:
+        while f.read(block):
+            pass
+
+
+def _same(a, b):
+    if len(a) != len(b) or set(a.keys()) != set(b.keys()):
+        return False
+    return all(np.array_equal(a.column(k), b.column(k), equal_nan=True) for k in a.keys())
+
+
+# ---------------------------------------------------------------------------
+# Main
+# ---------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the %MON parsers on a synthetic STDOUT")
+    parser.add_argument("--path", default="bench_STDOUT.0000",
+                        help="STDOUT to write and parse (default: bench_STDOUT.0000)")
+    parser.add_argument("--size-gb", type=float, default=2.0,
+                        help="Size of the synthetic STDOUT in GB (default: 2)")
+    parser.add_argument("--keys", type=int, default=40,
+                        help=f"%%MON keys per time step, at most {len(STATS) * len(FIELDS)} (default: 40)")
+    parser.add_argument("--noise", type=int, default=30,
+                        help="Non-%%MON lines per time step (default: 30)")
+    parser.add_argument("--no-generate", action="store_true",
+                        help="Parse an existing --path instead of writing a new one")
+    parser.add_argument("--parsers", nargs="+", choices=list(PARSERS), default=list(PARSERS),
+                        help="Parsers to run (default: all)")
+    parser.add_argument("--keep", action="store_true",
+                        help="Keep the generated file")
+    args = parser.parse_args()
+
+    if args.no_generate:
+        if not os.path.exists(args.path):
+            print(f"ERROR: {args.path} not found", file=sys.stderr)
+            sys.exit(1)
+        size = os.path.getsize(args.path)
+    else:
+        print(f"Writing {args.size_gb:g} GB synthetic STDOUT to {args.path}")
+        size = generate(args.path, args.size_gb, args.keys, args.noise)
+
+    try:
+        _warm(args.path)
+        results = {}
+        for name in args.parsers:
+            t0 = time.perf_counter()
+            records = PARSERS[name](args.path)
+            elapsed = time.perf_counter() - t0
+            results[name] = records
+            print(f"  {name:<9s} {elapsed:8.2f} s  {size / 1e6 / elapsed:8.1f} MB/s  "
+                  f"{len(records)} records, {len(records.keys())} keys")
+        if len(results) == 2:
+            print("  identical records:", _same(*results.values()))
+    finally:
+        if not args.no_generate and not args.keep:
+            os.remove(args.path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+block_manifest.py
+=================
+Sidecar manifests that make binary forcing generation resumable.
+
+Each output ``.bin`` gets a ``<name>.bin.manifest.json`` next to it that
+records which time blocks have been written, together with
+
+  * a hash of the settings that determine the bytes of the file (start date,
+    grid, scale factor, boundary indices, ...), and
+  * for every block, the (mtime, size) of the source files it was computed
+    from.
+
+On a rerun a block is only recomputed if it is missing, if its record range
+changed (e.g. the last, partial block after extending the end date), or if
+one of its source files was modified.  A change in the settings hash
+discards the whole manifest.  Delete the manifest to force a full rebuild.
+
+Usage:
+    m = BlockManifest(bin_path, settings_hash(settings), record_bytes)
+    m.prepare(n_records)
+    if not m.is_complete(first, count, sources):
+        ...write records [first, first + count)...
+        m.mark_complete(first, count, sources)
+"""
+
+import hashlib
+import json
+import os
+
+
+def settings_hash(settings):
+    """Stable short hash of a JSON-serialisable settings dict."""
+    blob = json.dumps(settings, sort_keys=True, default=str)
+    return hashlib.sha1(blob.encode()).hexdigest()[:16]
+
+
+def source_signature(paths):
+    """Return ``{path: [mtime_ns, size]}`` for the given source files."""
+    sig = {}
+    for p in paths:
+        st = os.stat(p)
+        sig[str(p)] = [st.st_mtime_ns, st.st_size]
+    return sig
+
+
+def write_block(path, first_record, block):
+    """Write a ``(nt, ...)`` block as big-endian float32 starting at ``first_record``."""
+    rec_bytes = block[0].size * 4
+    with open(path, "r+b") as f:
+        f.seek(first_record * rec_bytes)
+        block.astype(">f4").tofile(f)
+
+
+class BlockManifest:
+    """Completed-block record for one binary output file."""
+
+    def __init__(self, bin_path, config_hash, record_bytes):
+        self.bin_path = str(bin_path)
+        self.path = f"{self.bin_path}.manifest.json"
+        self.config_hash = config_hash
+        self.record_bytes = int(record_bytes)
+        self.blocks = {}
+
+        if os.path.exists(self.path) and os.path.exists(self.bin_path):
+            try:
+                with open(self.path) as f:
+                    data = json.load(f)
+            except (json.JSONDecodeError, OSError):
+                data = {}
+            if (data.get("config_hash") == self.config_hash
+                    and data.get("record_bytes") == self.record_bytes):
+                self.blocks = data.get("blocks", {})
+
+    @staticmethod
+    def _key(first, count):
+        return f"{first}:{count}"
+
+    def prepare(self, n_records):
+        """Size the output for ``n_records``, keeping completed blocks that still fit.
+
+        Without any usable completed blocks the file is recreated from scratch.
+        """
+        size = n_records * self.record_bytes
+        self.blocks = {
+            k: v for k, v in self.blocks.items()
+            if sum(int(n) for n in k.split(":")) <= n_records
+        }
+        mode = "r+b" if self.blocks else "wb"
+        with open(self.bin_path, mode) as f:
+            f.truncate(size)
+        self.save()
+
+    def is_complete(self, first, count, sources):
+        return self.blocks.get(self._key(first, count)) == sources
+
+    def mark_complete(self, first, count, sources):
+        # A block with a different extent over the same records (e.g. the old
+        # partial last block) no longer describes what is on disk.
+        for k in list(self.blocks):
+            f0, n0 = (int(n) for n in k.split(":"))
+            if f0 < first + count and first < f0 + n0:
+                del self.blocks[k]
+        self.blocks[self._key(first, count)] = sources
+        self.save()
+
+    def n_complete(self):
+        return len(self.blocks)
+
+    def save(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({
+                "config_hash": self.config_hash,
+                "record_bytes": self.record_bytes,
+                "blocks": self.blocks,
+            }, f)
+        os.replace(tmp, self.path)
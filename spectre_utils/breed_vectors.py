@@ -13,11 +13,12 @@ rather than pickup files. Each breeding cycle:
 Subcommands:
     init     — Create N perturbed IC files from control ICs
     rescale  — Compute bred vectors from pickups, rescale, overwrite member ICs
+               (optionally orthogonalise the members, see ensemble_ops.py)
     status   — Report per-variable RMS of bred vectors for each member
 
 Usage:
-    python breed_vectors.py init    <breed_config.yaml>
-    python breed_vectors.py rescale <breed_config.yaml> --cycle <N>
+    python breed_vectors.py init    <breed_config.yaml> [--workers W]
+    python breed_vectors.py rescale <breed_config.yaml> --cycle <N> [--workers W] [--orthogonalize]
     python breed_vectors.py status  <breed_config.yaml> --cycle <N>
 """
 
@@ -30,6 +31,9 @@ import yaml
 import numpy as np
 from pathlib import Path
 
+from spectre_utils.ensemble_ops import WetMask, orthogonalize_members
+from spectre_utils.pickup_to_init import PickupReader
+
 
 # ---------------------------------------------------------------------------
 # IC and pickup file definitions
@@ -65,11 +69,18 @@ PICKUP_FIELDS = [
 # ---------------------------------------------------------------------------
 
 def read_ic(path, Nx, Ny, Nr, shape_type):
-    """Read an initial condition binary file."""
-    if shape_type == "3d":
-        return np.fromfile(path, dtype=">f4").reshape(Nr, Ny, Nx)
-    else:
-        return np.fromfile(path, dtype=">f4").reshape(Ny, Nx)
+    """Memory-map an initial condition binary file (read-only)."""
+    shape = (Nr, Ny, Nx) if shape_type == "3d" else (Ny, Nx)
+    return np.memmap(path, dtype=">f4", mode="r", shape=shape)
+
+
+def read_control_ics(sim_input_dir, Nx, Ny, Nr):
+    """Memory-map all control IC files as ``{pickup field: array}``."""
+    return {
+        info["field"]: read_ic(os.path.join(sim_input_dir, fname), Nx, Ny, Nr,
+                               info["shape_type"])
+        for fname, info in IC_FILES.items()
+    }
 
 
 def write_ic(path, data):
@@ -77,55 +88,199 @@ def write_ic(path, data):
     data.astype(">f4").tofile(path)
 
 
-def read_pickup_field(data_path, field_name, Nx, Ny, Nr):
-    """Read a single field from a pickup .data file.
+def open_pickup(data_path, Nx, Ny, Nr):
+    """Open ``pickup.<iter>.data`` for per-field reads.
 
-    Pickup files are float64, fields in the order defined by PICKUP_FIELDS.
+    The field layout comes from the .meta when present; otherwise
+    PICKUP_FIELDS order with float64 values is assumed.
     """
-    raw = np.fromfile(data_path, dtype=">f8")
-    offset = 0
-    for fname, ftype in PICKUP_FIELDS:
-        size = Nx * Ny * Nr if ftype == "3d" else Nx * Ny
-        shape = (Nr, Ny, Nx) if ftype == "3d" else (Ny, Nx)
-        if fname == field_name:
-            return raw[offset:offset + size].reshape(shape)
-        offset += size
-    return None
+    prefix = data_path[:-len(".data")] if data_path.endswith(".data") else data_path
+    if os.path.exists(prefix + ".meta"):
+        return PickupReader(prefix, nr=Nr)
+    return PickupReader(prefix, nx=Nx, ny=Ny, nr=Nr,
+                        fields=[fname for fname, _ in PICKUP_FIELDS], dtype=">f8")
 
 
 # ---------------------------------------------------------------------------
-# Perturbation and rescaling
+# Initial perturbations
 # ---------------------------------------------------------------------------
 
-def compute_rms(arr):
-    """Compute RMS of non-zero elements."""
-    vals = arr[arr != 0]
-    if len(vals) == 0:
-        return 0.0
-    return float(np.sqrt(np.mean(vals ** 2)))
+def member_seeds(seed, n_members):
+    """Independent per-member seeds spawned from one root ``SeedSequence``.
+
+    Member ``m`` (1-based) always gets ``seeds[m - 1]``, so its noise does not
+    depend on how members are distributed over processes.
+    """
+    return np.random.SeedSequence(seed).spawn(n_members)
+
 
+def perturb_member(member_dir, seed, control, wet, target_rms):
+    """Write ``control + scale * noise`` IC files for one member.
+
+    Noise is standard normal float32, zero on land, drawn from ``seed`` in a
+    fixed field order (Theta first).  ``scale`` makes the wet-point RMS of the
+    applied Theta noise equal ``target_rms`` and is used for all fields.
+    Outputs are written straight into memory-mapped IC files.  Returns scale.
+    """
+    rng = np.random.default_rng(seed)
+    order = ["T.init.bin"] + [f for f in IC_FILES if f != "T.init.bin"]
+    buf = np.empty(max(control[info["field"]].size for info in IC_FILES.values()),
+                   dtype=np.float32)
+
+    scale = None
+    for fname in order:
+        field = IC_FILES[fname]["field"]
+        ctrl = control[field]
+        noise = buf[:ctrl.size].reshape(ctrl.shape)
+        rng.standard_normal(out=noise, dtype=np.float32)
+        noise *= wet.masks[field]
+        if scale is None:
+            raw_rms = wet.rms(field, noise)
+            scale = target_rms / raw_rms if raw_rms > 0 else 0.0
+        noise *= np.float32(scale)
+
+        # Never write through a symlink into the shared input directory
+        path = os.path.join(member_dir, fname)
+        if os.path.islink(path):
+            os.unlink(path)
+        out = np.memmap(path, dtype=">f4", mode="w+", shape=ctrl.shape)
+        np.add(ctrl, noise, out=out)
+        out.flush()
+        del out
+    return scale
 
-def create_perturbation(control_ic, target_rms, rng):
-    """Add scaled random noise to a control IC field.
 
-    Returns perturbed field. Scale factor is derived from the temperature
-    field externally — this function applies a pre-computed scale.
+# ---------------------------------------------------------------------------
+# Member rescaling
+# ---------------------------------------------------------------------------
+
+def rescale_member(member_dir, pickup_name, ctrl_fields, control_ics, wet,
+                   target_rms, Nx, Ny, Nr, member):
+    """Rescale one member's bred vector and overwrite its IC files.
+
+    RMS values are taken over the wet points of ``wet`` (a WetMask built
+    from the control ICs).  Returns the member's diagnostics dict, or None if it has no pickup.
     """
-    ocean_mask = control_ic != 0
-    noise = rng.standard_normal(control_ic.shape).astype(np.float32)
-    noise[~ocean_mask] = 0
-    raw_rms = compute_rms(noise)
-    if raw_rms > 0:
-        noise *= target_rms / raw_rms
-    return control_ic + noise
+    member_pickup = os.path.join(member_dir, "run", pickup_name)
+    if not os.path.exists(member_pickup):
+        return None
+
+    # Read member state at end of cycle
+    pickup = open_pickup(member_pickup, Nx, Ny, Nr)
+    member_fields = {}
+    for fname, info in IC_FILES.items():
+        if info["field"] in pickup:
+            member_fields[info["field"]] = pickup.field(info["field"]).astype(np.float32)
+
+    # Compute bred vector
+    bred = {}
+    for field_name in member_fields:
+        bred[field_name] = member_fields[field_name] - ctrl_fields[field_name]
+
+    # Compute rescale factor from temperature
+    theta_rms = wet.rms("Theta", bred["Theta"])
+    rescale = target_rms / theta_rms if theta_rms > 0 else 1.0
+
+    # Overwrite member IC files: control_IC + rescaled bred vector
+    for fname, info in IC_FILES.items():
+        field_name = info["field"]
+        new_ic = control_ics[field_name] + rescale * bred[field_name]
+        write_ic(os.path.join(member_dir, fname), new_ic)
+
+    # Diagnostics
+    diag = {"member": member, "rescale_factor": rescale, "theta_rms_before": theta_rms}
+    for field_name in bred:
+        diag[f"{field_name}_rms"] = wet.rms(field_name, bred[field_name]) * rescale
+    return diag
+
+
+def _print_member(m, diag, pickup_name):
+    if diag is None:
+        print(f"  Member {m:03d}: SKIP — no pickup at {pickup_name}")
+        return
+    print(f"  Member {m:03d}: rescale={diag['rescale_factor']:.3f}, "
+          f"T={diag.get('Theta_rms', 0):.5f}°C, "
+          f"S={diag.get('Salt_rms', 0):.5f}, "
+          f"U={diag.get('Uvel_rms', 0):.5f} m/s, "
+          f"Eta={diag.get('EtaN_rms', 0):.5f} m")
+
+
+# ---------------------------------------------------------------------------
+# Worker state for parallel init and rescale
+# ---------------------------------------------------------------------------
+
+# Views onto the shared control fields, set in each worker by _attach_shared
+# (rescale) or _attach_control (init).
+_SHARED = {}
+
+
+def _to_shared(groups):
+    """Copy ``{group: {field: array}}`` into POSIX shared memory.
+
+    Returns the SharedMemory blocks (the caller closes and unlinks them) and a
+    picklable spec that workers pass to ``_attach_shared``.
+    """
+    from multiprocessing.shared_memory import SharedMemory
+
+    blocks, spec = [], {}
+    for group, arrays in groups.items():
+        spec[group] = {}
+        for name, arr in arrays.items():
+            arr = np.asarray(arr)
+            dtype = arr.dtype.newbyteorder("=")
+            shm = SharedMemory(create=True, size=max(arr.nbytes, 1))
+            np.ndarray(arr.shape, dtype=dtype, buffer=shm.buf)[...] = arr
+            blocks.append(shm)
+            spec[group][name] = (shm.name, arr.shape, dtype.str)
+    return blocks, spec
+
+
+def _attach_shared(spec):
+    """Pool initializer: map the shared control fields as read-only arrays."""
+    from multiprocessing.shared_memory import SharedMemory
+
+    _SHARED.clear()
+    _SHARED["_blocks"] = []
+    for group, arrays in spec.items():
+        _SHARED[group] = {}
+        for name, (shm_name, shape, dtype) in arrays.items():
+            shm = SharedMemory(name=shm_name)
+            _SHARED["_blocks"].append(shm)
+            view = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+            view.flags.writeable = False
+            _SHARED[group][name] = view
+
+
+def _attach_control(sim_input_dir, Nx, Ny, Nr):
+    """Pool initializer for init: map the control ICs and build the wet mask.
+
+    The IC files are memory-mapped read-only, so all workers share the
+    page cache instead of holding private copies.
+    """
+    _SHARED.clear()
+    _SHARED["ic"] = read_control_ics(sim_input_dir, Nx, Ny, Nr)
+    _SHARED["wet"] = WetMask.from_control(_SHARED["ic"])
+
+
+def _perturb_member_shared(member_dir, seed, target_rms):
+    return perturb_member(member_dir, seed, _SHARED["ic"], _SHARED["wet"], target_rms)
+
+
+def _rescale_member_shared(m, member_dir, pickup_name, target_rms, Nx, Ny, Nr):
+    return rescale_member(member_dir, pickup_name, _SHARED["ctrl"], _SHARED["ic"],
+                          WetMask(_SHARED["wet"]), target_rms, Nx, Ny, Nr, member=m)
 
 
 # ---------------------------------------------------------------------------
 # Subcommands
 # ---------------------------------------------------------------------------
 
-def cmd_init(config, config_path):
-    """Create initial perturbed IC files for all members."""
+def cmd_init(config, config_path, workers=1):
+    """Create initial perturbed IC files for all members.
+
+    Each member draws from its own child of ``SeedSequence(breeding.seed)``,
+    so the ICs are bit-identical for any number of workers.
+    """
     breed = config["breeding"]
     grid = config["grid"]
     paths_cfg = config["paths"]
@@ -133,6 +288,7 @@ def cmd_init(config, config_path):
     Nx, Ny, Nr = grid["Nx"], grid["Ny"], grid["Nr"]
     n_members = breed["n_members"]
     target_rms = breed["target_amplitude"]["temperature_rms"]
+    seed = breed.get("seed", 42)
 
     ensemble_dir = os.path.dirname(os.path.abspath(config_path))
     sim_input_dir = os.path.join(os.path.dirname(ensemble_dir), "input")
@@ -140,48 +296,52 @@ def cmd_init(config, config_path):
     print(f"Control ICs from: {sim_input_dir}")
     print(f"Target temperature RMS: {target_rms}°C")
 
-    # Read control ICs
-    control = {}
-    for fname, info in IC_FILES.items():
+    # Check and map control ICs
+    for fname in IC_FILES:
         path = os.path.join(sim_input_dir, fname)
         if not os.path.exists(path):
             print(f"Error: {path} not found", file=sys.stderr)
             sys.exit(1)
-        control[info["field"]] = read_ic(path, Nx, Ny, Nr, info["shape_type"])
+    control = read_control_ics(sim_input_dir, Nx, Ny, Nr)
+    for fname, info in IC_FILES.items():
         print(f"  {fname}: shape={control[info['field']].shape}")
 
-    # For each member: generate noise scaled to target_rms (from temperature),
-    # apply same scale factor to all variables
-    for m in range(1, n_members + 1):
-        member_dir = os.path.join(ensemble_dir, f"{paths_cfg['member_prefix']}_{m:03d}")
+    member_dirs = {
+        m: os.path.join(ensemble_dir, f"{paths_cfg['member_prefix']}_{m:03d}")
+        for m in range(1, n_members + 1)
+    }
+    for member_dir in member_dirs.values():
         os.makedirs(member_dir, exist_ok=True)
+    seeds = dict(zip(member_dirs, member_seeds(seed, n_members)))
 
-        rng = np.random.default_rng(seed=42 + m)
-
-        # Compute scale factor from temperature noise
-        theta = control["Theta"]
-        ocean_mask = theta != 0
-        noise_t = rng.standard_normal(theta.shape).astype(np.float32)
-        noise_t[~ocean_mask] = 0
-        raw_rms = compute_rms(noise_t)
-        scale = target_rms / raw_rms if raw_rms > 0 else 0
-
-        # Write perturbed ICs for all variables
-        for fname, info in IC_FILES.items():
-            field = control[info["field"]]
-            mask = field != 0
-            noise = rng.standard_normal(field.shape).astype(np.float32)
-            noise[~mask] = 0
-            perturbed = field + scale * noise
-            write_ic(os.path.join(member_dir, fname), perturbed)
-
-        print(f"  Member {m:03d}: scale={scale:.6f}")
+    # For each member: generate noise scaled to target_rms (from temperature),
+    # apply same scale factor to all variables
+    if workers > 1:
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach_control,
+                                 initargs=(sim_input_dir, Nx, Ny, Nr)) as pool:
+            futures = {
+                pool.submit(_perturb_member_shared, member_dirs[m], seeds[m], target_rms): m
+                for m in member_dirs
+            }
+            for fut in as_completed(futures):
+                print(f"  Member {futures[fut]:03d}: scale={fut.result():.6f}")
+    else:
+        wet = WetMask.from_control(control)
+        for m, member_dir in member_dirs.items():
+            scale = perturb_member(member_dir, seeds[m], control, wet, target_rms)
+            print(f"  Member {m:03d}: scale={scale:.6f}")
 
     print(f"\nInitialized {n_members} members")
 
 
-def cmd_rescale(config, config_path, cycle):
-    """Compute bred vectors from pickups, rescale, overwrite member ICs."""
+def cmd_rescale(config, config_path, cycle, workers=1, orthogonalize=None):
+    """Compute bred vectors from pickups, rescale, overwrite member ICs.
+
+    With ``orthogonalize`` (default: ``breeding.orthogonalize`` in the config)
+    the rescaled member perturbations are then made mutually orthogonal and
+    rescaled to the target amplitude again.
+    """
     breed = config["breeding"]
     grid = config["grid"]
     ctrl_cfg = config["control"]
@@ -192,6 +352,8 @@ def cmd_rescale(config, config_path, cycle):
     n_members = breed["n_members"]
     target_rms = breed["target_amplitude"]["temperature_rms"]
     nTimeSteps = member_run_cfg["nTimeSteps"]
+    if orthogonalize is None:
+        orthogonalize = breed.get("orthogonalize", False)
 
     ensemble_dir = os.path.dirname(os.path.abspath(config_path))
     ctrl_run_dir = os.path.join(os.path.dirname(ensemble_dir), ctrl_cfg["run_dir"])
@@ -210,66 +372,71 @@ def cmd_rescale(config, config_path, cycle):
         sys.exit(1)
 
     print(f"Control pickup: {ctrl_pickup_path}")
+    ctrl_pickup = open_pickup(ctrl_pickup_path, Nx, Ny, Nr)
     ctrl_fields = {}
     for fname, info in IC_FILES.items():
         pickup_field = info["field"]
-        data = read_pickup_field(ctrl_pickup_path, pickup_field, Nx, Ny, Nr)
-        if data is not None:
+        if pickup_field in ctrl_pickup:
+            data = ctrl_pickup.field(pickup_field)
             ctrl_fields[pickup_field] = data.astype(np.float32)
             print(f"  {pickup_field}: shape={data.shape}")
 
     # Read control ICs (for creating new perturbed ICs)
     sim_input_dir = os.path.join(os.path.dirname(ensemble_dir), "input")
-    control_ics = {}
-    for fname, info in IC_FILES.items():
-        control_ics[info["field"]] = read_ic(
-            os.path.join(sim_input_dir, fname), Nx, Ny, Nr, info["shape_type"]
-        )
-
-    # Process each member
-    cycle_diags = []
-    for m in range(1, n_members + 1):
-        member_dir = os.path.join(ensemble_dir, f"{paths_cfg['member_prefix']}_{m:03d}")
-        member_run_dir = os.path.join(member_dir, "run")
-        member_pickup = os.path.join(member_run_dir, pickup_name)
-
-        if not os.path.exists(member_pickup):
-            print(f"  Member {m:03d}: SKIP — no pickup at {pickup_name}")
-            continue
-
-        # Read member state at end of cycle
-        member_fields = {}
-        for fname, info in IC_FILES.items():
-            data = read_pickup_field(member_pickup, info["field"], Nx, Ny, Nr)
-            if data is not None:
-                member_fields[info["field"]] = data.astype(np.float32)
-
-        # Compute bred vector
-        bred = {}
-        for field_name in member_fields:
-            bred[field_name] = member_fields[field_name] - ctrl_fields[field_name]
-
-        # Compute rescale factor from temperature
-        theta_rms = compute_rms(bred["Theta"])
-        rescale = target_rms / theta_rms if theta_rms > 0 else 1.0
-
-        # Overwrite member IC files: control_IC + rescaled bred vector
-        for fname, info in IC_FILES.items():
-            field_name = info["field"]
-            new_ic = control_ics[field_name] + rescale * bred[field_name]
-            write_ic(os.path.join(member_dir, fname), new_ic)
-
-        # Diagnostics
-        diag = {"member": m, "rescale_factor": rescale, "theta_rms_before": theta_rms}
-        for field_name in bred:
-            diag[f"{field_name}_rms"] = compute_rms(bred[field_name]) * rescale
-        cycle_diags.append(diag)
-
-        print(f"  Member {m:03d}: rescale={rescale:.3f}, "
-              f"T={diag.get('Theta_rms', 0):.5f}°C, "
-              f"S={diag.get('Salt_rms', 0):.5f}, "
-              f"U={diag.get('Uvel_rms', 0):.5f} m/s, "
-              f"Eta={diag.get('EtaN_rms', 0):.5f} m")
+    control_ics = read_control_ics(sim_input_dir, Nx, Ny, Nr)
+    wet = WetMask.from_control(control_ics)
+
+    # Process each member; results are keyed by member number so the
+    # convergence log is ordered the same regardless of completion order.
+    member_dirs = {
+        m: os.path.join(ensemble_dir, f"{paths_cfg['member_prefix']}_{m:03d}")
+        for m in range(1, n_members + 1)
+    }
+    results = {}
+    if workers > 1:
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+        blocks, spec = _to_shared({"ctrl": ctrl_fields, "ic": control_ics,
+                                   "wet": wet.masks})
+        try:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_attach_shared,
+                                     initargs=(spec,)) as pool:
+                futures = {
+                    pool.submit(_rescale_member_shared, m, member_dir, pickup_name,
+                                target_rms, Nx, Ny, Nr): m
+                    for m, member_dir in member_dirs.items()
+                }
+                for fut in as_completed(futures):
+                    m = futures[fut]
+                    results[m] = fut.result()
+                    _print_member(m, results[m], pickup_name)
+        finally:
+            for shm in blocks:
+                shm.close()
+                shm.unlink()
+    else:
+        for m, member_dir in member_dirs.items():
+            results[m] = rescale_member(member_dir, pickup_name, ctrl_fields, control_ics,
+                                        wet, target_rms, Nx, Ny, Nr, member=m)
+            _print_member(m, results[m], pickup_name)
+
+    cycle_diags = [results[m] for m in sorted(results) if results[m] is not None]
+
+    if orthogonalize and len(cycle_diags) > 1:
+        print(f"\nOrthogonalising {len(cycle_diags)} members")
+        paths = {
+            info["field"]: [os.path.join(member_dirs[d["member"]], fname) for d in cycle_diags]
+            for fname, info in IC_FILES.items()
+        }
+        try:
+            orth = orthogonalize_members(paths, control_ics, wet, target_rms)
+        except np.linalg.LinAlgError:
+            print("  WARNING: member perturbations are linearly dependent, "
+                  "keeping the independently rescaled ICs")
+        else:
+            for d, new in zip(cycle_diags, orth):
+                d.update(new)
+                d["orthogonalized"] = True
+                _print_member(d["member"], d, pickup_name)
 
     # Write convergence log
     convergence_path = os.path.join(ensemble_dir, "convergence.json")
@@ -345,10 +512,17 @@ def main():
 
     p_init = sub.add_parser("init", help="Create initial perturbed ICs")
     p_init.add_argument("config", help="Path to breed_config.yaml")
+    p_init.add_argument("--workers", type=int, default=1,
+                        help="Generate members concurrently on N processes")
 
     p_rescale = sub.add_parser("rescale", help="Compute bred vectors and rescale")
     p_rescale.add_argument("config", help="Path to breed_config.yaml")
     p_rescale.add_argument("--cycle", type=int, required=True)
+    p_rescale.add_argument("--workers", type=int, default=1,
+                           help="Process members concurrently on N processes")
+    p_rescale.add_argument("--orthogonalize", action="store_true", default=None,
+                           help="Gram-Schmidt orthogonalise the members after rescaling "
+                                "(default: breeding.orthogonalize in the config)")
 
     p_status = sub.add_parser("status", help="Report bred vector RMS")
     p_status.add_argument("config", help="Path to breed_config.yaml")
@@ -363,9 +537,9 @@ def main():
         config = yaml.safe_load(f)
 
     if args.command == "init":
-        cmd_init(config, args.config)
+        cmd_init(config, args.config, args.workers)
     elif args.command == "rescale":
-        cmd_rescale(config, args.config, args.cycle)
+        cmd_rescale(config, args.config, args.cycle, args.workers, args.orthogonalize)
     elif args.command == "status":
         cmd_status(config, args.config, args.cycle)
 
@@ -2,28 +2,42 @@
 convert_diagnostics_to_netcdf.py
 ================================
 Watch a simulation directory for binary diagnostics output (.data/.meta)
-across all run subdirectories and convert to per-tile NetCDF files.
+across all run subdirectories and convert to per-tile NetCDF files or, with
+``--format zarr``, append them to one Zarr store per run (see diag_zarr.py).
+
+New output is detected with inotify where possible and by polling on network
+filesystems (see diag_watcher.py).  Converted files are recorded in
+``diag_state.converted.log`` in each run directory (see diag_state.py), so a
+restart resumes without re-checking the tile directories.
 
 Usage:
-    python convert_diagnostics_to_netcdf.py <simulation_dir> [--poll 60]
+    python convert_diagnostics_to_netcdf.py <simulation_dir> [--poll 60] [--watch auto] [--workers 8]
+                                            [--format netcdf|zarr]
 """
 
 import os
 import re
 import sys
-import time
 import glob
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
 import numpy as np
 
-_xr = None
+from spectre_utils.diag_state import StateStore
+from spectre_utils.diag_watcher import DiagWatcher
+from spectre_utils.diag_zarr import append_iteration, stored_iterations
+from spectre_utils.tile_layout import find_size, tile_layout
 
+_nc = None
 
-def _import_xr():
-    global _xr
-    if _xr is None:
-        import xarray as xr
-        _xr = xr
+
+def _import_nc():
+    global _nc
+    if _nc is None:
+        import netCDF4
+        _nc = netCDF4
 
 
 def discover_runs(simulation_dir):
@@ -62,8 +76,72 @@ FIELDS_2D = {"ETAN", "EtaN", "ETAH", "dEtaHdt", "oceFWflx", "TFLUX", "SFLUX",
              "oceSflux", "oceQnet", "CH_QNET", "CH_EmP"}
 
 
-def convert_one(data_path, meta, run_dir, Nx, Ny, Nr, nPx, nPy, deltaT, start_date):
-    _import_xr()
+def _write_tile(nc_path, tile_fields, i0, j0, sNx, sNy, Nr, model_time):
+    """Write one tile's hyperslabs to ``nc_path`` (via ``<nc_path>.tmp``).
+
+    The layout matches what ``xarray.Dataset.to_netcdf`` produced for these
+    files: float32 fields on ``(T, Zmd<Nr>, Y, X)`` / ``(T, Y, X)`` with a NaN
+    ``_FillValue``, float64 X/Y/Z index coordinates and an int64 ``T`` in
+    ``days since <model time>``.
+    """
+    # Byte-swap and gather the strided tile windows
+    data = {fname: (np.ascontiguousarray(arr[..., j0:j0 + sNy, i0:i0 + sNx], dtype=np.float32),
+                    arr.ndim == 3)
+            for fname, arr in tile_fields.items()}
+    zdim = f"Zmd{Nr:06d}"
+    tmp_path = nc_path + ".tmp"
+
+    with _nc.Dataset(tmp_path, "w", format="NETCDF4") as nc:
+        nc.set_fill_off()
+        nc.createDimension("T", 1)
+        if any(is_3d for _, is_3d in data.values()):
+            nc.createDimension(zdim, Nr)
+        nc.createDimension("Y", sNy)
+        nc.createDimension("X", sNx)
+        for fname, (tile, is_3d) in data.items():
+            dims = ("T", zdim, "Y", "X") if is_3d else ("T", "Y", "X")
+            nc.createVariable(fname, "f4", dims, fill_value=np.nan)[0] = tile
+
+        t = nc.createVariable("T", "i8", ("T",))
+        t.units = f"days since {model_time:%Y-%m-%d %H:%M:%S}"
+        t.calendar = "proleptic_gregorian"
+        t[:] = 0
+        nc.createVariable("X", "f8", ("X",), fill_value=np.nan)[:] = np.arange(i0 + 1, i0 + sNx + 1)
+        nc.createVariable("Y", "f8", ("Y",), fill_value=np.nan)[:] = np.arange(j0 + 1, j0 + sNy + 1)
+        if zdim in nc.dimensions:
+            nc.createVariable(zdim, "f8", (zdim,), fill_value=np.nan)[:] = np.arange(Nr)
+    os.replace(tmp_path, nc_path)
+
+
+def map_fields(data_path, layout):
+    """Views into the memory-mapped binary for ``[(field, offset, shape), ...]``."""
+    raw = np.memmap(data_path, dtype=">f4", mode="r")
+    return {fname: raw[offset:offset + int(np.prod(shape))].reshape(shape)
+            for fname, offset, shape in layout}
+
+
+def _write_tiles(data_path, layout, jobs, sNx, sNy, Nr, model_time):
+    """Pool task: write a group of tiles, mapping the binary in this process."""
+    _import_nc()
+    tile_fields = map_fields(data_path, layout)
+    for nc_path, i0, j0 in jobs:
+        _write_tile(nc_path, tile_fields, i0, j0, sNx, sNy, Nr, model_time)
+
+
+def convert_one(data_path, meta, run_dir, Nx, Ny, Nr, nPx, nPy, deltaT, start_date,
+                pool=None, workers=1, fmt="netcdf"):
+    """Write the per-tile NetCDF files for one binary diagnostics file.
+
+    The binary is memory-mapped, so each tile only touches its own strided
+    window.  netCDF-C/HDF5 serialize all calls within a process, so given a
+    ``pool`` of ``workers`` processes the tiles are split into one group per
+    worker, each mapping the binary itself.  With ``fmt="zarr"`` the
+    iteration is appended to the run's Zarr store instead.
+
+    Returns True once every tile exists (written now or earlier), False if
+    the file should be retried later (incomplete flush, no tile layout yet).
+    """
+    _import_nc()
     from datetime import datetime, timedelta
 
     sNx = Nx // nPx
@@ -76,150 +154,155 @@ def convert_one(data_path, meta, run_dir, Nx, Ny, Nr, nPx, nPy, deltaT, start_da
     t0 = datetime.strptime(start_date, "%Y-%m-%d")
     model_time = t0 + timedelta(seconds=iter_num * deltaT)
 
-    raw = np.fromfile(data_path, dtype=">f4")
+    n_values = os.path.getsize(data_path) // 4
 
-    # Parse fields
-    global_fields = {}
+    # Parse fields (views into the memmap; nothing is read yet)
+    layout = []
     offset = 0
     for fname in fields:
         if fname in FIELDS_2D:
             fld_size = Nx * Ny
             shape = (Ny, Nx)
-            fld_3d = False
         else:
             fld_size = Nx * Ny * Nr
             shape = (Nr, Ny, Nx)
-            fld_3d = True
-        if offset + fld_size > raw.size:
+        if offset + fld_size > n_values:
             break
-        global_fields[fname] = {"data": raw[offset:offset + fld_size].reshape(shape), "is_3d": fld_3d}
+        layout.append((fname, offset, shape))
         offset += fld_size
+    global_fields = map_fields(data_path, layout)
 
     # Validate: the first field should have a reasonable number of non-zero values
     # (at least 30% — ocean covers ~80% of the domain). If mostly zeros, the
     # binary was likely read before MITgcm finished flushing to disk.
-    first_field = list(global_fields.values())[0]["data"] if global_fields else None
+    first_field = next(iter(global_fields.values()), None)
     if first_field is not None:
         nonzero_frac = np.count_nonzero(first_field) / first_field.size
         if nonzero_frac < 0.3:
             print(f"  SKIP {basename}: only {nonzero_frac:.1%} non-zero — likely incomplete flush")
             return False
 
-    # Get tile layout from grid files
-    tile_info = {}
-    for d in sorted(glob.glob(os.path.join(run_dir, "mnc_*_*/"))):
-        grid_files = glob.glob(os.path.join(d, "grid.t*.nc"))
-        if not grid_files:
-            continue
-        gf = grid_files[0]
-        ds_g = _xr.open_dataset(gf)
-        x0 = int(ds_g["X"].values[0])
-        y0 = int(ds_g["Y"].values[0])
-        ds_g.close()
-        px = (x0 - 1) // sNx
-        py = (y0 - 1) // sNy
-        tile_suffix = os.path.basename(gf).replace("grid.", "").replace(".nc", "")
-        if (py, px) not in tile_info:
-            tile_info[(py, px)] = {"dir": d, "tile": tile_suffix}
+    if fmt == "zarr":
+        append_iteration(run_dir, prefix, iter_str, global_fields, model_time,
+                         start_date, sNx, sNy)
+        return True
 
+    # Tile layout (cached per run directory, see tile_layout.py)
+    tile_info = tile_layout(run_dir, nPx, nPy, sNx, sNy)
     if not tile_info:
         return False
 
-    written = 0
+    jobs = []
     for (py, px), info in tile_info.items():
-        j0 = py * sNy
-        i0 = px * sNx
         nc_path = os.path.join(info["dir"], f"{prefix}.{iter_str}.{info['tile']}.nc")
-        if os.path.exists(nc_path):
-            continue
-
-        ds_vars = {}
-        for fname, finfo in global_fields.items():
-            arr = finfo["data"]
-            if finfo["is_3d"]:
-                tile_data = arr[:, j0:j0 + sNy, i0:i0 + sNx]
-                ds_vars[fname] = (["T", f"Zmd{Nr:06d}", "Y", "X"],
-                                  tile_data[np.newaxis, :, :, :])
-            else:
-                tile_data = arr[j0:j0 + sNy, i0:i0 + sNx]
-                ds_vars[fname] = (["T", "Y", "X"],
-                                  tile_data[np.newaxis, :, :])
+        if not os.path.exists(nc_path):
+            jobs.append((nc_path, px * sNx, py * sNy))
+
+    workers = min(workers, len(jobs))
+    if pool is not None and workers > 1:
+        futures = [pool.submit(_write_tiles, data_path, layout, jobs[k::workers],
+                               sNx, sNy, Nr, model_time)
+                   for k in range(workers)]
+        for future in futures:
+            future.result()
+    else:
+        for nc_path, i0, j0 in jobs:
+            _write_tile(nc_path, global_fields, i0, j0, sNx, sNy, Nr, model_time)
 
-        ds = _xr.Dataset(ds_vars, coords={
-            "T": [np.datetime64(model_time)],
-            "X": np.arange(i0 + 1, i0 + sNx + 1, dtype=float),
-            "Y": np.arange(j0 + 1, j0 + sNy + 1, dtype=float),
-        })
-        if any(f["is_3d"] for f in global_fields.values()):
-            ds.coords[f"Zmd{Nr:06d}"] = np.arange(Nr, dtype=float)
+    return True
 
-        tmp_path = nc_path + ".tmp"
-        ds.to_netcdf(tmp_path)
-        ds.close()
-        os.replace(tmp_path, nc_path)
-        written += 1
 
-    return written > 0
+PREFIXES = ("state3D", "state2D", "Thermo")
 
 
-def find_unconverted(run_dir, prefixes=("state3D", "state2D", "Thermo"), min_age_s=120):
-    """Find binary diagnostics files ready for conversion.
+def is_converted(run_dir, prefix, iter_str, fmt="netcdf"):
+    """True if ``prefix.iter_str`` is in the Zarr store / first tile directory.
 
-    Only returns files older than min_age_s seconds to ensure MITgcm
-    has finished writing and flushing to disk.
+    Only needed for output converted before the run had a state log.
     """
-    import time as _time
-    now = _time.time()
-    results = []
-    for prefix in prefixes:
-        for meta_path in sorted(glob.glob(os.path.join(run_dir, f"{prefix}.*.meta"))):
-            data_path = meta_path.replace(".meta", ".data")
-            if not os.path.exists(data_path):
-                continue
-            # Skip files that are too recent (may still be written)
-            if now - os.path.getmtime(data_path) < min_age_s:
-                continue
-            iter_str = os.path.basename(meta_path).split(".")[1]
-            mnc_dirs = glob.glob(os.path.join(run_dir, "mnc_*_0001/"))
-            if mnc_dirs:
-                existing = glob.glob(os.path.join(mnc_dirs[0], f"{prefix}.{iter_str}.*.nc"))
-                if existing:
-                    continue
-            results.append((data_path, prefix, iter_str))
-    return results
+    if fmt == "zarr":
+        return int(iter_str) in stored_iterations(run_dir, prefix)
+    mnc_dirs = glob.glob(os.path.join(run_dir, "mnc_*_0001/"))
+    if not mnc_dirs:
+        return False
+    return bool(glob.glob(os.path.join(mnc_dirs[0], f"{prefix}.{iter_str}.*.nc")))
 
 
 def main():
     parser = argparse.ArgumentParser(description="Convert binary diagnostics to NetCDF")
     parser.add_argument("simulation_dir", help="Path to simulation directory")
-    parser.add_argument("--poll", type=int, default=60)
+    parser.add_argument("--poll", type=int, default=60,
+                        help="Seconds between run discovery / directory scans (0 = single pass)")
     parser.add_argument("--start-date", default="2002-07-01")
     parser.add_argument("--dt", type=float, default=360.0)
+    parser.add_argument("--watch", choices=("auto", "inotify", "poll"), default="auto",
+                        help="inotify, polling, or inotify except on network filesystems")
+    parser.add_argument("--workers", type=int, default=min(8, len(os.sched_getaffinity(0))),
+                        help="Processes writing the tiles of one diagnostics file (default: CPUs allotted, max 8)")
+    parser.add_argument("--format", choices=("netcdf", "zarr"), default="netcdf",
+                        help="Per-tile NetCDF files, or one Zarr store per run")
     args = parser.parse_args()
 
-    Nx, Ny, Nr = 768, 424, 50
-    nPx, nPy = 8, 8
     simulation_dir = os.path.abspath(args.simulation_dir)
+    size = find_size(simulation_dir)
+    Nx, Ny, Nr = size["Nx"], size["Ny"], size["Nr"]
+    nPx, nPy = size["nPx"] * size["nSx"], size["nPy"] * size["nSy"]
     print(f"Watching simulation directory: {simulation_dir}")
-
+    print(f"Grid: {Nx}x{Ny}x{Nr}, {nPx}x{nPy} tiles, output: {args.format}")
+
+    # Files younger than min_age_s may still be written (polling mode only;
+    # with inotify a file is complete once its writer has closed it).
+    watcher = DiagWatcher(PREFIXES, mode=args.watch, min_age_s=120,
+                          poll_interval=max(args.poll, 1))
+    # Per-format log: a run converted to NetCDF still needs its Zarr store.
+    # plot_surface_fields reads both.
+    kind = "converted" if args.format == "netcdf" else f"converted.{args.format}"
+
+    # One pool for the whole session: worker start-up would otherwise
+    # dominate the conversion of small files
+    def start_pool():
+        if args.format == "netcdf" and args.workers > 1:
+            return ProcessPoolExecutor(max_workers=args.workers)
+        return None
+
+    pool = start_pool()
+    states = StateStore()
     while True:
         for run_dir in discover_runs(simulation_dir):
-            unconverted = find_unconverted(run_dir)
-            if unconverted:
-                run_name = os.path.basename(run_dir)
-                for data_path, prefix, iter_str in unconverted:
-                    meta_path = data_path.replace(".data", ".meta")
-                    meta = read_meta(meta_path)
-                    print(f"[{run_name}] Converting {prefix}.{iter_str}...")
-                    try:
-                        convert_one(data_path, meta, run_dir, Nx, Ny, Nr, nPx, nPy,
-                                    args.dt, args.start_date)
-                    except Exception as e:
-                        print(f"  Error: {e}")
+            watcher.add_dir(run_dir)
+
+        for run_dir, prefix, iter_str in watcher.wait(timeout=max(args.poll, 0)):
+            state = states[run_dir]
+            if state.done(kind, prefix, iter_str):
+                continue
+            if is_converted(run_dir, prefix, iter_str, args.format):
+                state.mark(kind, prefix, iter_str)
+                continue
+            run_name = os.path.basename(run_dir)
+            data_path = os.path.join(run_dir, f"{prefix}.{iter_str}.data")
+            meta = read_meta(data_path.replace(".data", ".meta"))
+            print(f"[{run_name}] Converting {prefix}.{iter_str}...")
+            try:
+                ok = convert_one(data_path, meta, run_dir, Nx, Ny, Nr, nPx, nPy,
+                                 args.dt, args.start_date, pool=pool,
+                                 workers=args.workers, fmt=args.format)
+            except BrokenProcessPool as e:
+                print(f"  Error: {e}; restarting the worker pool")
+                pool.shutdown(wait=False)
+                pool = start_pool()
+                ok = False
+            except Exception as e:
+                print(f"  Error: {e}")
+                ok = False
+            if ok:
+                state.mark(kind, prefix, iter_str)
+            else:
+                watcher.requeue(run_dir, prefix, iter_str, delay=max(args.poll, 1))
 
         if args.poll <= 0:
             break
-        time.sleep(args.poll)
+    if pool is not None:
+        pool.shutdown()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,95 @@
+"""
+diag_state.py
+=============
+Persistent record of converted and plotted diagnostics, per run directory.
+
+Every finished artifact is appended as one ``<prefix> <iter>`` line to
+``diag_state.<kind>.log`` in the run directory (kinds: ``converted`` for
+NetCDF tiles, ``converted.zarr`` for the Zarr store, ``plotted``).  Each
+kind has a single writer - the converter writes ``converted`` (or
+``converted.zarr``), the plotter writes ``plotted`` - so appends never interleave,
+even on network filesystems where O_APPEND is not atomic across hosts.
+
+The logs are loaded into sets once, so "is this done?" is a set lookup and a
+restarted sidecar resumes without globbing the tile directories.  Readers of
+another process's log (the plotter reading ``converted``) pick up new lines
+with ``refresh``, which only reads the bytes appended since the last call.
+Delete a log to force that step to be redone.
+
+Usage:
+    state = RunState(run_dir)
+    if not state.done("converted", "state3D", "0000000240"):
+        ...
+        state.mark("converted", "state3D", "0000000240")
+"""
+
+import os
+
+
+class RunState:
+    """Append-only ``(kind, prefix, iteration)`` records for one run directory."""
+
+    def __init__(self, run_dir):
+        self.run_dir = run_dir
+        self._done = {}       # kind -> {(prefix, iter_str)}
+        self._offset = {}     # kind -> bytes of the log already parsed
+
+    def path(self, kind):
+        return os.path.join(self.run_dir, f"diag_state.{kind}.log")
+
+    def refresh(self, kind):
+        """Read lines appended to the ``kind`` log since the last refresh."""
+        done = self._done.setdefault(kind, set())
+        offset = self._offset.get(kind, 0)
+        try:
+            size = os.path.getsize(self.path(kind))
+        except OSError:
+            return
+        if size < offset:
+            # Log was truncated or replaced: start over
+            done.clear()
+            offset = 0
+        if size == offset:
+            return
+        with open(self.path(kind), "rb") as f:
+            f.seek(offset)
+            chunk = f.read(size - offset)
+        # Only consume complete lines; a partial last line is re-read later
+        end = chunk.rfind(b"\n") + 1
+        for line in chunk[:end].decode(errors="replace").splitlines():
+            parts = line.split()
+            if len(parts) == 2:
+                done.add((parts[0], parts[1]))
+        self._offset[kind] = offset + end
+
+    def done(self, kind, prefix, iter_str):
+        if kind not in self._done:
+            self.refresh(kind)
+        return (prefix, iter_str) in self._done[kind]
+
+    def mark(self, kind, prefix, iter_str):
+        self.refresh(kind)
+        if (prefix, iter_str) in self._done[kind]:
+            return
+        line = f"{prefix} {iter_str}\n"
+        offset = self._offset.get(kind, 0)
+        if os.path.exists(self.path(kind)) and os.path.getsize(self.path(kind)) > offset:
+            # Partial line left by an interrupted writer: terminate it first
+            line = "\n" + line
+        with open(self.path(kind), "a") as f:
+            f.write(line)
+        self._done[kind].add((prefix, iter_str))
+        self._offset[kind] = os.path.getsize(self.path(kind))
+
+
+class StateStore:
+    """Lazily created ``RunState`` per run directory."""
+
+    def __init__(self):
+        self._runs = {}
+
+    def __getitem__(self, run_dir):
+        run_dir = os.path.abspath(run_dir)
+        if run_dir not in self._runs:
+            self._runs[run_dir] = RunState(run_dir)
+        return self._runs[run_dir]
@@ -0,0 +1,272 @@
+"""
+diag_watcher.py
+===============
+Report MITgcm diagnostics output (``<prefix>.<iter>.meta`` / ``.data`` pairs)
+as soon as it is complete, for the converter and plotting sidecars.
+
+Two mechanisms are used, chosen per watched directory:
+
+  inotify  Linux kernel notifications on local filesystems.  A pair is
+           reported ``settle_s`` seconds after the last write to either file
+           was closed, so new output is picked up within seconds and nothing
+           is globbed after the initial scan.
+  poll     For network filesystems (BeeGFS, Lustre, NFS, ...), where inotify
+           does not see writes made on other nodes.  Each directory is listed
+           once per ``poll_interval`` with ``os.scandir`` and a pair is
+           reported once both files are older than ``min_age_s``.
+
+``auto`` picks inotify unless the directory lives on a network filesystem or
+inotify is unavailable.  Every pair is reported once; callers that could not
+handle it yet (e.g. an incomplete flush) hand it back with ``requeue``.
+
+Usage:
+    watcher = DiagWatcher(("state3D", "state2D"), mode="auto", poll_interval=60)
+    watcher.add_dir(run_dir)
+    while True:
+        for run_dir, prefix, iter_str in watcher.wait(timeout=60):
+            ...
+"""
+
+import ctypes
+import errno
+import os
+import re
+import select
+import struct
+import time
+
+
+# Filesystems on which inotify misses writes from other hosts
+NETWORK_FS = {
+    "nfs", "nfs4", "beegfs", "lustre", "gpfs", "cifs", "smb3", "ceph",
+    "panfs", "wekafs", "9p", "fuse.sshfs", "fuse.gcsfuse",
+}
+
+# inotify(7) constants
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_Q_OVERFLOW = 0x00004000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+def filesystem_type(path):
+    """Filesystem type of the mount containing ``path`` (from /proc/mounts)."""
+    path = os.path.realpath(path)
+    best, fstype = "", None
+    try:
+        with open("/proc/mounts") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) < 3:
+                    continue
+                mnt = parts[1].replace("\\040", " ")
+                if (path == mnt or path.startswith(mnt.rstrip("/") + "/")) and len(mnt) > len(best):
+                    best, fstype = mnt, parts[2]
+    except OSError:
+        return None
+    return fstype
+
+
+class _Inotify:
+    """Minimal ctypes binding to the Linux inotify API."""
+
+    def __init__(self):
+        self._libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = self._libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+    def add_watch(self, path, mask):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        return wd
+
+    def read_events(self):
+        """Drain pending events as ``[(wd, mask, name), ...]``."""
+        events = []
+        while True:
+            try:
+                buf = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return events
+            pos = 0
+            while pos < len(buf):
+                wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(buf, pos)
+                pos += _EVENT_HEADER.size
+                name = buf[pos:pos + length].rstrip(b"\0").decode(errors="replace")
+                pos += length
+                events.append((wd, mask, name))
+
+    def close(self):
+        os.close(self.fd)
+
+
+class DiagWatcher:
+    """Watch run directories for complete ``<prefix>.<iter>.meta/.data`` pairs."""
+
+    def __init__(self, prefixes, mode="auto", min_age_s=120, settle_s=5, poll_interval=60):
+        if mode not in ("auto", "inotify", "poll"):
+            raise ValueError(f"Unknown watch mode {mode!r}")
+        self.prefixes = tuple(prefixes)
+        self.mode = mode
+        self.min_age_s = min_age_s
+        self.settle_s = settle_s
+        self.poll_interval = poll_interval
+        self._pattern = re.compile(
+            r"^(%s)\.(\d{10})\.(meta|data)$" % "|".join(map(re.escape, self.prefixes))
+        )
+
+        self._inotify = None
+        if mode != "poll":
+            try:
+                self._inotify = _Inotify()
+            except (OSError, AttributeError) as e:
+                if mode == "inotify":
+                    raise
+                print(f"  inotify unavailable ({e}), polling instead")
+
+        self._watched = {}      # wd -> directory (inotify)
+        self._dirs = set()      # all directories
+        self._poll_dirs = []    # directories scanned every poll_interval
+        self._next_scan = 0.0
+        self._pending = {}      # (dir, prefix, iter) -> earliest time to report
+        self._reported = set()
+
+    # ---- directories -------------------------------------------------------
+
+    def add_dir(self, path):
+        """Start watching ``path`` and queue the pairs already in it."""
+        path = os.path.abspath(path)
+        if path in self._dirs:
+            return
+        self._dirs.add(path)
+
+        use_inotify = self._inotify is not None
+        if use_inotify and self.mode == "auto" and filesystem_type(path) in NETWORK_FS:
+            use_inotify = False
+        if use_inotify:
+            try:
+                wd = self._inotify.add_watch(path, _IN_CLOSE_WRITE | _IN_MOVED_TO)
+                self._watched[wd] = path
+            except OSError as e:
+                if self.mode == "inotify" and e.errno != errno.ENOSPC:
+                    raise
+                print(f"  inotify watch failed for {path} ({e}), polling it instead")
+                use_inotify = False
+        if not use_inotify:
+            self._poll_dirs.append(path)
+
+        # Backlog (and anything written before the watch was in place)
+        self._scan(path, self.settle_s if use_inotify else self.min_age_s)
+
+    # ---- reporting ---------------------------------------------------------
+
+    def wait(self, timeout):
+        """Return the pairs that became complete, waiting at most ``timeout`` s.
+
+        Returns as soon as at least one pair is ready; ``[]`` on timeout.
+        Pairs are returned as ``(run_dir, prefix, iter_str)``, sorted.
+        """
+        deadline = time.monotonic() + max(timeout, 0)
+        while True:
+            if self._poll_dirs and time.monotonic() >= self._next_scan:
+                for d in self._poll_dirs:
+                    self._scan(d, self.min_age_s)
+                self._next_scan = time.monotonic() + self.poll_interval
+            if self._watched:
+                # Non-blocking drain, so wait(0) also sees new events
+                self._handle_events()
+
+            ready = self._take_ready()
+            if ready:
+                return ready
+
+            now = time.monotonic()
+            if now >= deadline:
+                return []
+            wake = deadline
+            if self._pending:
+                wake = min(wake, min(self._pending.values()))
+            if self._poll_dirs:
+                wake = min(wake, self._next_scan)
+            delay = max(wake - now, 0.0)
+
+            if self._watched:
+                select.select([self._inotify.fd], [], [], delay)
+            else:
+                time.sleep(delay)
+
+    def requeue(self, run_dir, prefix, iter_str, delay=None):
+        """Report a pair again after ``delay`` seconds (default: the settle/min-age time)."""
+        key = (os.path.abspath(run_dir), prefix, iter_str)
+        if delay is None:
+            delay = self.min_age_s if key[0] in self._poll_dirs else self.settle_s
+        self._reported.discard(key)
+        self._pending[key] = time.monotonic() + delay
+
+    def close(self):
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+    # ---- internals ---------------------------------------------------------
+
+    def _take_ready(self):
+        now = time.monotonic()
+        ready = []
+        for key, t in list(self._pending.items()):
+            if t > now:
+                continue
+            del self._pending[key]
+            d, prefix, it = key
+            base = os.path.join(d, f"{prefix}.{it}")
+            if os.path.exists(base + ".meta") and os.path.exists(base + ".data"):
+                self._reported.add(key)
+                ready.append(key)
+        return sorted(ready)
+
+    def _scan(self, d, age):
+        """List ``d`` once and queue unreported pairs ``age`` s after their last write."""
+        wall_to_mono = time.monotonic() - time.time()
+        found = {}
+        try:
+            entries = list(os.scandir(d))
+        except OSError:
+            return
+        for entry in entries:
+            m = self._pattern.match(entry.name)
+            if not m:
+                continue
+            try:
+                mtime = entry.stat().st_mtime
+            except OSError:
+                continue
+            found.setdefault((d, m.group(1), m.group(2)), []).append(mtime)
+        for key, mtimes in found.items():
+            if len(mtimes) < 2 or key in self._reported:
+                continue
+            # A pair still being written moves its deadline on; a later
+            # requeue deadline is kept
+            due = max(mtimes) + wall_to_mono + age
+            self._pending[key] = max(due, self._pending.get(key, due))
+
+    def _handle_events(self):
+        now = time.monotonic()
+        for wd, mask, name in self._inotify.read_events():
+            if mask & _IN_Q_OVERFLOW:
+                for d in self._watched.values():
+                    self._scan(d, self.settle_s)
+                continue
+            d = self._watched.get(wd)
+            m = self._pattern.match(name) if d else None
+            if not m:
+                continue
+            key = (d, m.group(1), m.group(2))
+            # A rewrite after reporting (e.g. a rerun) is reported again
+            self._reported.discard(key)
+            self._pending[key] = now + self.settle_s
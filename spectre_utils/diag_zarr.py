@@ -0,0 +1,116 @@
+"""
+diag_zarr.py
+============
+One consolidated Zarr store of diagnostics per run directory, as an
+alternative to per-tile NetCDF files (``--format zarr`` in
+convert_diagnostics_to_netcdf.py).
+
+``<run_dir>/diagnostics.zarr`` holds one group per diagnostics prefix
+(``state3D``, ``state2D``, ``Thermo``).  Each converted iteration is appended
+along ``T``; dimension and variable names are the same as in the per-tile
+NetCDF files, plus an ``iter`` coordinate along ``T``.
+
+Chunks are one time level and one full-depth column of an MPI tile
+(1, Nr, sNy, sNx), so a 3D field adds one chunk file per tile and iteration,
+as many objects as the per-tile NetCDF files it replaces rather than Nr times
+more.  Appending an iteration only writes new chunks; a surface map reads one
+chunk per tile and a point time series one chunk per time.
+The store uses Zarr format 2 with consolidated metadata, so readers open it
+with a single metadata read and never see an append that is still in progress.
+
+Usage:
+    append_iteration(run_dir, "state3D", "0000000240", fields, model_time, start, sNx, sNy)
+    ds = open_iteration(run_dir, "state3D", "0000000240")   # None if absent
+    sst = ds["THETA"].isel({"Zmd000050": 0}).values
+"""
+
+import os
+
+import numpy as np
+
+STORE_NAME = "diagnostics.zarr"
+
+_xr = None
+
+
+def _import_xr():
+    global _xr
+    if _xr is None:
+        import xarray as xr
+        _xr = xr
+
+
+def store_path(run_dir):
+    return os.path.join(run_dir, STORE_NAME)
+
+
+def _open_group(run_dir, prefix):
+    """Lazily opened ``prefix`` group of the run's store, or None."""
+    path = store_path(run_dir)
+    if not os.path.exists(os.path.join(path, prefix, ".zgroup")):
+        return None
+    _import_xr()
+    return _xr.open_zarr(path, group=prefix, chunks=None, consolidated=True)
+
+
+def stored_iterations(run_dir, prefix):
+    """Iterations of ``prefix`` already in the store, as a set of ints."""
+    ds = _open_group(run_dir, prefix)
+    if ds is None:
+        return set()
+    iters = set(int(i) for i in ds["iter"].values)
+    ds.close()
+    return iters
+
+
+def append_iteration(run_dir, prefix, iter_str, fields, model_time, start_date, sNx, sNy):
+    """Append one iteration's global fields to the ``prefix`` group.
+
+    ``fields`` maps a field name to a ``(Ny, Nx)`` or ``(Nr, Ny, Nx)`` array
+    (e.g. a view into the memory-mapped binary).  An iteration that is
+    already stored is not appended again.
+    """
+    _import_xr()
+    if int(iter_str) in stored_iterations(run_dir, prefix):
+        return
+
+    ds_vars = {}
+    coords = {"T": [np.datetime64(model_time, "ns")], "iter": ("T", [int(iter_str)])}
+    encoding = {}
+    for fname, arr in fields.items():
+        Ny, Nx = arr.shape[-2:]
+        if arr.ndim == 3:
+            Nr = arr.shape[0]
+            zdim = f"Zmd{Nr:06d}"
+            coords[zdim] = np.arange(Nr, dtype=float)
+            ds_vars[fname] = (["T", zdim, "Y", "X"], arr[np.newaxis])
+            encoding[fname] = {"chunks": (1, Nr, sNy, sNx), "dtype": "float32"}
+        else:
+            ds_vars[fname] = (["T", "Y", "X"], arr[np.newaxis])
+            encoding[fname] = {"chunks": (1, sNy, sNx), "dtype": "float32"}
+        coords["X"] = np.arange(1, Nx + 1, dtype=float)
+        coords["Y"] = np.arange(1, Ny + 1, dtype=float)
+    ds = _xr.Dataset(ds_vars, coords=coords)
+
+    path = store_path(run_dir)
+    if os.path.exists(os.path.join(path, prefix, ".zgroup")):
+        ds.to_zarr(path, group=prefix, mode="a", append_dim="T",
+                   consolidated=True, zarr_format=2)
+    else:
+        encoding["T"] = {"units": f"seconds since {start_date}", "dtype": "float64",
+                         "chunks": (1024,)}
+        encoding["iter"] = {"chunks": (1024,)}
+        ds.to_zarr(path, group=prefix, mode="a", encoding=encoding,
+                   consolidated=True, zarr_format=2)
+
+
+def open_iteration(run_dir, prefix, iter_str):
+    """The ``prefix`` group at iteration ``iter_str`` (lazy), or None if not stored."""
+    ds = _open_group(run_dir, prefix)
+    if ds is None:
+        return None
+    idx = np.flatnonzero(ds["iter"].values == int(iter_str))
+    if idx.size == 0:
+        ds.close()
+        return None
+    return ds.isel(T=int(idx[-1]))
@@ -1,4 +1,69 @@
+"""
+directorydb.py
+==============
+A small pymongo-like document store kept in a directory tree.
+
+``LocalMongo(base)[db][collection]`` maps to the directory
+``base/db/collection``.  A collection is an append-only log of JSON lines
+split into segments ``seg-00000001.jsonl``, ``seg-00000002.jsonl``, ...:
+
+  * ``insert_one`` appends the document as one line to the last (active)
+    segment; re-inserting an ``_id`` appends a new version that supersedes
+    the old one, ``delete_one`` appends a tombstone ``{"$delete": _id}``.
+    A partial last line left by a killed writer is skipped by readers and
+    cut off by the next writer before it appends.
+  * When the active segment reaches ``segment_bytes`` it is sealed: a
+    footer line ``{"$footer": {"entries": [[_id, offset], ...], ...}}``
+    listing the byte offset of every line (-1 for tombstones) is appended,
+    and the next insert starts a new segment.
+  * On open, the in-memory index (``_id`` -> segment and offset) is rebuilt
+    from the footers of the sealed segments, and only the active segment is
+    scanned line by line.  Readers in other processes pick up new lines and
+    segments on each query.
+  * Superseded versions and tombstones are garbage; once there is more
+    garbage than live documents, ``compact`` rewrites the live documents
+    into new segments and removes the old ones.
+
+Secondary indexes: ``create_index(field)`` keeps the live documents sorted
+by ``field`` (numbers before strings; documents lacking it, or with a list,
+dict, null or NaN value, are left out).  Each sealed segment stores the
+indexed values of its documents in ``seg-NNNNNNNN.idx``, so an index is
+built (when a query first needs it) without parsing the documents and then
+kept up to date; the indexed fields are listed in ``.indexes``.  Queries take ``{"$gt", "$gte", "$lt", "$lte", "$eq",
+"$ne", "$in"}`` conditions besides plain values.  The query planner serves a
+query from the index matching the fewest documents (``explain`` shows which)
+and reads only those documents, then checks the whole query on them;
+``find_range`` and ``find_top`` return documents sorted by an indexed field.
+``find_most_recent_matching(_set)`` walk the ``_scraped_at`` index from the
+newest value when there is one, which assumes the timestamps are all written
+in one ISO format so that their string order is chronological.
+
+Auto-generated ``_id`` values are "1", "2", ... and only ever increase, even
+after deletions.  Writers take an exclusive ``flock`` on ``.lock`` in the
+collection directory.  A collection still in the old layout (one
+``<_id>.json`` file per document) is migrated into segments the first time it
+is opened.
+
+Usage:
+    db_client = LocalMongo("monitoring")
+    coll = db_client["test"]["memb000"]
+    coll.insert_one({"time_tsnumber": 240, "dynstat_eta_max": 0.41})   # -> {"_id": "1"}
+    coll.find_one({"time_tsnumber": 240})
+    coll.create_index("time_tsnumber")
+    coll.find_range("time_tsnumber", 1000, 2000)            # sorted by time_tsnumber
+    coll.find_all({"time_tsnumber": {"$gt": 1000}, "job_id": "123"})
+    coll.find_top("_scraped_at", 5)                         # 5 most recent
+    coll.compact()
+"""
+
+import fcntl
 import json
+import operator
+import os
+import sys
+from bisect import bisect_left, insort
+from contextlib import contextmanager
+from itertools import islice
 from pathlib import Path
 from datetime import datetime
 
@@ -20,82 +85,699 @@ class LocalMongo:
 class Database:
     """Represents a MongoDB-like database (maps to a top-level directory)."""
 
+    # Open collections by path, so their in-memory indexes are reused
+    _collections = {}
+
     def __init__(self, path):
         self.path = Path(path)
         self.path.mkdir(parents=True, exist_ok=True)  # Ensure database directory exists
 
     def __getitem__(self, collection_name):
         """Get a collection (second-level directory)."""
-        return Collection(self.path / collection_name)
+        path = (self.path / collection_name).resolve()
+        coll = Database._collections.get(path)
+        if coll is None:
+            coll = Database._collections[path] = Collection(path)
+        return coll
 
     def list_collections(self):
         """List available collections in the database."""
         return [d.name for d in self.path.iterdir() if d.is_dir()]
 
 
+_decoder = json.JSONDecoder()
+
+_INF = float("inf")
+_RANGE_OPS = {"$gt": operator.gt, "$gte": operator.ge, "$lt": operator.lt, "$lte": operator.le}
+
+
+def _sort_key(value):
+    """``(rank, value)`` ordering indexed values, numbers first; None if not indexable."""
+    if isinstance(value, (int, float)) and value == value:
+        return (0, value)
+    if isinstance(value, str):
+        return (1, value)
+    return None
+
+
+def _is_operator(cond):
+    return isinstance(cond, dict) and cond and all(k.startswith("$") for k in cond)
+
+
+def _match_value(value, cond):
+    if not _is_operator(cond):
+        return value == cond
+    for op, arg in cond.items():
+        if op == "$eq":
+            ok = value == arg
+        elif op == "$ne":
+            ok = value != arg
+        elif op == "$in":
+            ok = value in arg
+        elif op in _RANGE_OPS:
+            # Only numbers are compared with numbers and strings with strings
+            a, b = _sort_key(value), _sort_key(arg)
+            ok = a is not None and b is not None and a[0] == b[0] and _RANGE_OPS[op](value, arg)
+        else:
+            raise ValueError(f"Unsupported query operator: {op}")
+        if not ok:
+            return False
+    return True
+
+
+def _matches(doc, query):
+    return all(_match_value(doc.get(k), v) for k, v in query.items())
+
+
+def _spans(cond):
+    """Index key ranges ``(lo, lo_incl, hi, hi_incl)`` holding every value matching ``cond``.
+
+    None if an index cannot serve ``cond`` (e.g. ``{field: None}`` also
+    matches documents lacking the field, which are not indexed).
+    """
+    if not _is_operator(cond):
+        key = _sort_key(cond)
+        return None if key is None else [(key, True, key, True)]
+    if "$in" in cond or "$eq" in cond:
+        keys = [_sort_key(v) for v in cond.get("$in", [])] if "$in" in cond else [_sort_key(cond["$eq"])]
+        return None if None in keys else [(key, True, key, True) for key in keys]
+    lo = hi = None
+    lo_incl = hi_incl = True
+    for op, arg in cond.items():
+        key = _sort_key(arg)
+        if op not in _RANGE_OPS or key is None:
+            continue  # e.g. $ne: left to the final check of each document
+        if op in ("$gt", "$gte") and (lo is None or key > lo or (key == lo and op == "$gt")):
+            lo, lo_incl = key, op == "$gte"
+        elif op in ("$lt", "$lte") and (hi is None or key < hi or (key == hi and op == "$lt")):
+            hi, hi_incl = key, op == "$lte"
+    if lo is None and hi is None:
+        return None
+    if lo is not None and hi is not None and lo[0] != hi[0]:
+        return []
+    return [(lo, lo_incl, hi, hi_incl)]
+
+
+class _FieldIndex:
+    """Live documents sorted by one field: ``(rank, value, segment, offset, _id)`` entries."""
+
+    def __init__(self):
+        self._entries = []
+        self._sorted = True
+        self.by_id = {}
+
+    @property
+    def entries(self):
+        if not self._sorted:
+            self._entries.sort()   # once after loading; nearly sorted for monitor data
+            self._sorted = True
+        return self._entries
+
+    def add(self, doc_id, location, value):
+        key = _sort_key(value)
+        if key is None:
+            return
+        entry = key + location + (doc_id,)
+        if self._sorted and self._entries and entry < self._entries[-1]:
+            insort(self._entries, entry)
+        else:
+            self._entries.append(entry)   # the usual case: increasing values
+        self.by_id[doc_id] = entry
+
+    def add_many(self, number, offsets, ids, values):
+        """Bulk ``add`` of the documents of one segment; the sort is deferred to the next read."""
+        new = [key + (number, offset, doc_id)
+               for key, offset, doc_id in zip(map(_sort_key, values), offsets, ids)
+               if key is not None and doc_id is not None]
+        self._entries.extend(new)
+        self._sorted = False
+        self.by_id.update((entry[4], entry) for entry in new)
+
+    def remove(self, doc_id):
+        entry = self.by_id.pop(doc_id, None)
+        if entry is not None:
+            entries = self.entries
+            del entries[bisect_left(entries, entry)]
+
+    def span(self, span):
+        """``(start, stop)`` of the entries in one range from ``_spans``."""
+        lo, lo_incl, hi, hi_incl = span
+        rank = (lo or hi)[0]
+        e = self.entries
+        if lo is None:
+            i = bisect_left(e, (rank,))
+        else:
+            i = bisect_left(e, lo if lo_incl else lo + (_INF,))
+        if hi is None:
+            j = bisect_left(e, (rank + 1,))
+        else:
+            j = bisect_left(e, hi + (_INF,) if hi_incl else hi)
+        return i, max(i, j)
+
+
+def _read_footer(path):
+    """The footer dict of a sealed segment, or None if it has none (yet)."""
+    with open(path, "rb") as f:
+        pos = f.seek(0, os.SEEK_END)
+        tail = b""
+        while pos > 0:
+            step = min(1 << 16, pos)
+            pos -= step
+            f.seek(pos)
+            tail = f.read(step) + tail
+            cut = tail.rfind(b"\n", 0, len(tail) - 1)
+            if cut >= 0:
+                tail = tail[cut + 1:]
+                break
+    if not tail.startswith(b'{"$footer"') or not tail.endswith(b"\n"):
+        return None
+    return json.loads(tail)["$footer"]
+
+
 class Collection:
-    """Represents a MongoDB-like collection (maps to a subdirectory)."""
+    """Represents a MongoDB-like collection (a directory of JSONL segments)."""
 
-    def __init__(self, path):
+    SEGMENT_BYTES = 16 << 20
+    COMPACT_MIN_GARBAGE = 1000
+
+    def __init__(self, path, segment_bytes=None):
         self.path = Path(path)
         self.path.mkdir(
             parents=True, exist_ok=True
         )  # Ensure collection directory exists
+        self.segment_bytes = segment_bytes or self.SEGMENT_BYTES
+        self._fields = []      # indexed fields, from .indexes
+        self._fields_mtime = None
+        self._reset()
+        self._migrate_legacy()
+        self._refresh()
+
+    # ---- segments and index ------------------------------------------------
+
+    def _reset(self):
+        self._index = {}       # _id -> (segment number, byte offset)
+        self._segments = {}    # segment number -> {"size": bytes indexed, "sealed": bool}
+        self._next_id = 1
+        self._garbage = 0      # superseded versions and tombstones
+        self._field_index = {}    # field -> _FieldIndex, each built on first use
+
+    def _segment_path(self, number):
+        return self.path / f"seg-{number:08d}.jsonl"
+
+    def _segment_index_path(self, number):
+        return self.path / f"seg-{number:08d}.idx"
+
+    def _segment_numbers(self):
+        return sorted(int(p.name[4:-6]) for p in self.path.glob("seg-*.jsonl"))
+
+    def _apply(self, doc_id, location, values=None):
+        """Index one log entry; ``location`` None is a tombstone.
+
+        ``values`` holds the document's values of the indexed fields, needed
+        once a field index is built.
+        """
+        if self._field_index:
+            if doc_id in self._index or location is None:
+                for index in self._field_index.values():
+                    index.remove(doc_id)
+            if location is not None and values:
+                for field, index in self._field_index.items():
+                    if field in values:
+                        index.add(doc_id, location, values[field])
+        if doc_id in self._index:
+            self._garbage += 1
+        if location is None:
+            self._garbage += 1
+            self._index.pop(doc_id, None)
+        else:
+            self._index[doc_id] = location
+        if isinstance(doc_id, str) and doc_id.isdigit():
+            self._next_id = max(self._next_id, int(doc_id) + 1)
+
+    def _scan(self, number, start=0, with_values=None):
+        """``(entries, end, sealed)`` of the complete lines of a segment from ``start``.
+
+        An entry is ``(_id, offset, values)``, with offset -1 for a tombstone
+        and ``values`` the indexed fields of the document, decoded only
+        ``with_values`` (by default, once a field index is built).
+        """
+        entries = []
+        if with_values is None:
+            with_values = bool(self._field_index)
+        fields = self._fields if with_values else ()
+        with open(self._segment_path(number), "rb") as f:
+            f.seek(start)
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        offset, sealed = 0, False
+        for line in data[:end].splitlines(keepends=True):
+            if line.startswith(b'{"$footer"'):
+                sealed = True
+                break
+            # _id (or $delete) is written first: decode just that value
+            if line.startswith(b'{"$delete": '):
+                entries.append((_decoder.raw_decode(line.decode(), 12)[0], -1, None))
+            elif fields:
+                doc = json.loads(line)
+                entries.append((doc["_id"], start + offset,
+                                {f: doc[f] for f in fields if f in doc}))
+            elif line.startswith(b'{"_id": '):
+                entries.append((_decoder.raw_decode(line.decode(), 8)[0], start + offset, None))
+            else:
+                entries.append((json.loads(line)["_id"], start + offset, None))
+            offset += len(line)
+        return entries, start + offset, sealed
+
+    def _load_segment(self, number):
+        seg = self._segments.setdefault(number, {"size": 0, "sealed": False})
+        footer = _read_footer(self._segment_path(number)) if seg["size"] == 0 else None
+        if footer is not None:
+            values = {}
+            if self._field_index:
+                for field, (offsets, column) in self._segment_columns(number).items():
+                    for offset, value in zip(offsets, column):
+                        values.setdefault(offset, {})[field] = value
+            entries = [(doc_id, offset, values.get(offset)) for doc_id, offset in footer["entries"]]
+            sealed = True
+            self._next_id = max(self._next_id, footer["next_id"])
+        else:
+            entries, seg["size"], sealed = self._scan(number, seg["size"])
+        for doc_id, offset, values in entries:
+            self._apply(doc_id, None if offset < 0 else (number, offset), values)
+        seg["sealed"] = sealed
+
+    def _segment_columns(self, number, sealed=True):
+        """``{field: [offsets, values]}`` of the documents of a segment holding each indexed field.
+
+        Read from the .idx file of a sealed segment when it has every field.
+        """
+        stored = {}
+        if sealed:
+            try:
+                stored = json.loads(self._segment_index_path(number).read_text())
+            except (OSError, ValueError):
+                pass
+        if any(field not in stored for field in self._fields):
+            entries, _, _ = self._scan(number, with_values=True)
+            for field in self._fields:
+                present = [(offset, values[field]) for _, offset, values in entries
+                           if values and field in values]
+                stored[field] = [list(column) for column in zip(*present)] or [[], []]
+        return {field: stored[field] for field in self._fields}
+
+    def _write_segment_values(self, number):
+        """Store the indexed values of a sealed segment in its .idx file."""
+        stored = self._segment_columns(number)
+        path = self._segment_index_path(number)
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(json.dumps(stored))
+        os.replace(tmp, path)
+
+    def _check_fields(self):
+        """Reload the indexed fields if .indexes changed; True if it did."""
+        path = self.path / ".indexes"
+        try:
+            mtime = path.stat().st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._fields_mtime:
+            return False
+        self._fields_mtime = mtime
+        self._fields = json.loads(path.read_text()) if mtime is not None else []
+        return True
+
+    def _refresh(self):
+        """Index the lines and segments added since the last call (by any process)."""
+        for _ in range(5):
+            try:
+                if self._check_fields():
+                    self._reset()  # an index was created or dropped
+                numbers = self._segment_numbers()
+                if any(n not in numbers for n in self._segments):
+                    self._reset()  # compacted by another process
+                for n in numbers:
+                    if not self._segments.get(n, {}).get("sealed"):
+                        self._load_segment(n)
+                return
+            except FileNotFoundError:
+                self._reset()  # a segment was removed while reading it: start over
+
+    @contextmanager
+    def _locked(self):
+        with open(self.path / ".lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self._refresh()
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _active_segment(self):
+        last = max(self._segments, default=0)
+        if last and not self._segments[last]["sealed"]:
+            return last
+        number = last + 1
+        self._segments[number] = {"size": 0, "sealed": False}
+        return number
+
+    def _append(self, obj):
+        """Append one log entry to the active segment (lock held)."""
+        number = self._active_segment()
+        if "$delete" not in obj:
+            obj = {"_id": obj["_id"], **obj}
+        line = (json.dumps(obj) + "\n").encode()
+        seg = self._segments[number]
+        with open(self._segment_path(number), "ab") as f:
+            offset = f.seek(0, os.SEEK_END)
+            if offset > seg["size"]:
+                # A writer was killed mid-line: drop the partial line (the
+                # refresh under the lock indexed every complete one)
+                f.truncate(seg["size"])
+                offset = seg["size"]
+            f.write(line)
+        seg["size"] = offset + len(line)
+        if "$delete" in obj:
+            self._apply(obj["$delete"], None)
+        else:
+            self._apply(obj["_id"], (number, offset),
+                        {f: obj[f] for f in self._fields if f in obj})
+        if seg["size"] >= self.segment_bytes:
+            self._seal(number)
+
+    def _seal(self, number):
+        entries, _, _ = self._scan(number)
+        footer = {"entries": [(doc_id, offset) for doc_id, offset, _ in entries],
+                  "next_id": self._next_id}
+        with open(self._segment_path(number), "ab") as f:
+            f.write((json.dumps({"$footer": footer}) + "\n").encode())
+            f.flush()
+            os.fsync(f.fileno())
+        self._segments[number]["sealed"] = True
+        if self._fields:
+            self._write_segment_values(number)
+
+    def _maybe_compact(self):
+        if self._garbage > max(self.COMPACT_MIN_GARBAGE, len(self._index)):
+            self._compact()
+
+    def _compact(self):
+        old = self._segment_numbers()
+        if not old:
+            return
+        docs = list(self._iter_docs(refresh=False))
+        # New segments are numbered after the old ones, which are removed
+        # only once every live document has been rewritten and sealed
+        for n in old:
+            self._segments[n]["sealed"] = True
+        self._index, self._garbage = {}, 0
+        self._field_index = {}
+        for doc in docs:
+            self._append(doc)
+        last = max(self._segments)
+        if last in old:
+            # No live documents: an empty sealed segment keeps next_id
+            last = self._active_segment()
+            self._segment_path(last).touch()
+        if not self._segments[last]["sealed"]:
+            self._seal(last)
+        for n in old:
+            self._segment_path(n).unlink()
+            self._segment_index_path(n).unlink(missing_ok=True)
+            del self._segments[n]
+
+    def compact(self):
+        """Rewrite the live documents into new segments, dropping the garbage."""
+        with self._locked():
+            self._compact()
+
+    def _migrate_legacy(self):
+        """Move the documents of the one-file-per-document layout into segments."""
+        files = list(self.path.glob("*.json"))
+        if not files:
+            return
+        def order(file):
+            return (0, int(file.stem), "") if file.stem.isdigit() else (1, 0, file.stem)
+        with self._locked():
+            files = sorted(self.path.glob("*.json"), key=order)
+            if not files:
+                return  # migrated by another process meanwhile
+            for file in files:
+                with open(file, "r") as f:
+                    doc = json.load(f)
+                doc.setdefault("_id", file.stem)
+                self._append(doc)
+            last = max(self._segments, default=0)
+            if last and not self._segments[last]["sealed"]:
+                self._seal(last)  # fsync before the originals go
+            for file in files:
+                file.unlink()
+        print(f"directorydb: migrated {len(files)} documents of {self.path} into segments",
+              file=sys.stderr)
+
+    def _read_docs(self, locations):
+        """Documents at ``(segment, offset)`` locations, in log order."""
+        by_segment = {}
+        for number, offset in sorted(locations):
+            by_segment.setdefault(number, []).append(offset)
+        for number, offsets in by_segment.items():
+            with open(self._segment_path(number), "rb") as f:
+                if len(offsets) > 1024:
+                    data = f.read()
+                    for offset in offsets:
+                        yield json.loads(data[offset:data.index(b"\n", offset)])
+                else:
+                    for offset in offsets:
+                        f.seek(offset)
+                        yield json.loads(f.readline())
+
+    def _iter_docs(self, refresh=True):
+        """Live documents in insertion order."""
+        if refresh:
+            self._refresh()
+        return self._read_docs(self._index.values())
+
+    # ---- query planning ----------------------------------------------------
+
+    def _field_indexes(self, fields):
+        """The indexes of ``fields`` (indexed ones only), built from the segments on first use."""
+        fields = [field for field in fields if field in self._fields]
+        for _ in range(5):
+            missing = [field for field in fields if field not in self._field_index]
+            if not missing:
+                break
+            try:
+                live = {location: doc_id for doc_id, location in self._index.items()}
+                indexes = {field: _FieldIndex() for field in missing}
+                for number, seg in self._segments.items():
+                    columns = self._segment_columns(number, seg["sealed"])
+                    for field, index in indexes.items():
+                        offsets, values = columns[field]
+                        ids = [live.get((number, offset)) for offset in offsets]
+                        index.add_many(number, offsets, ids, values)
+                self._field_index.update(indexes)
+            except FileNotFoundError:
+                self._reset()  # compacted by another process meanwhile
+                self._refresh()
+        return {field: self._field_index[field] for field in fields if field in self._field_index}
+
+    def _plan(self, query):
+        """``(n, field, ranges)`` of the index matching the fewest documents, or None."""
+        best = None
+        indexes = self._field_indexes(query)
+        for field, cond in query.items():
+            index = indexes.get(field)
+            spans = _spans(cond) if index is not None else None
+            if spans is None:
+                continue
+            ranges = [index.span(span) for span in spans]
+            n = sum(stop - start for start, stop in ranges)
+            if best is None or n < best[0]:
+                best = (n, field, ranges)
+        return best
+
+    def _planned_entries(self, plan):
+        _, field, ranges = plan
+        entries = self._field_index[field].entries
+        return [entry for start, stop in ranges for entry in entries[start:stop]]
+
+    def _retry_reads(self, read, *args):
+        """Documents of the generator ``read(*args)``, surviving a compaction meanwhile.
+
+        If another process compacted the segments away mid-read, the index
+        is rebuilt and the read starts over, skipping ``_id``s already returned.
+        """
+        seen = set()
+        for attempt in range(5):
+            try:
+                for doc in read(*args):
+                    if doc["_id"] not in seen:
+                        seen.add(doc["_id"])
+                        yield doc
+                return
+            except FileNotFoundError:
+                if attempt == 4:
+                    raise
+                self._reset()
+                self._refresh()
+
+    def _find(self, query):
+        return self._retry_reads(self._find_once, query)
+
+    def _sorted(self, field, query, descending=False):
+        return self._retry_reads(self._sorted_once, field, query, descending)
+
+    def _find_once(self, query):
+        """Documents matching ``query`` in log order, read through an index when one fits."""
+        self._refresh()
+        if "_id" in query and not _is_operator(query["_id"]):
+            location = self._index.get(query["_id"])
+            locations = [] if location is None else [location]
+        else:
+            plan = self._plan(query)
+            if plan is None:
+                locations = self._index.values()
+            else:
+                locations = {entry[2:4] for entry in self._planned_entries(plan)}
+        return (doc for doc in self._read_docs(locations) if _matches(doc, query))
+
+    def _sorted_once(self, field, query, descending=False):
+        """Documents matching ``query`` and holding ``field``, sorted by ``field``."""
+        self._refresh()
+        index = self._field_indexes([field]).get(field)
+        if index is None:
+            docs = [doc for doc in self._find_once(query) if _sort_key(doc.get(field)) is not None]
+            docs.sort(key=lambda doc: _sort_key(doc[field]), reverse=descending)
+            yield from docs
+            return
+        plan = self._plan(query)
+        if plan is None:
+            entries = index.entries
+        else:
+            # Sort the (few) planned documents by their entry in the field's index
+            entries = sorted(index.by_id[entry[4]] for entry in self._planned_entries(plan)
+                             if entry[4] in index.by_id)
+        # Read in growing chunks: few reads for a top-k, bulk reads for a range
+        entries = iter(reversed(entries) if descending else entries)
+        size = 16
+        while True:
+            chunk = list(islice(entries, size))
+            if not chunk:
+                return
+            locations = sorted(entry[2:4] for entry in chunk)
+            docs = dict(zip(locations, self._read_docs(locations)))
+            for entry in chunk:
+                doc = docs[entry[2:4]]
+                if _matches(doc, query):
+                    yield doc
+            size = min(size * 4, 4096)
+
+    # ---- pymongo-like API --------------------------------------------------
+
+    def __len__(self):
+        self._refresh()
+        return len(self._index)
+
+    def create_index(self, field):
+        """Keep a sorted, persisted index of ``field`` (no-op if it exists)."""
+        self._refresh()
+        if field in self._fields:
+            return field
+        with self._locked():
+            if field not in self._fields:
+                path = self.path / ".indexes"
+                tmp = path.with_name(path.name + ".tmp")
+                tmp.write_text(json.dumps(self._fields + [field]))
+                os.replace(tmp, path)
+                self._refresh()
+                for number, seg in self._segments.items():
+                    if seg["sealed"]:
+                        self._write_segment_values(number)
+        return field
+
+    def drop_index(self, field):
+        """Stop indexing ``field``."""
+        with self._locked():
+            if field in self._fields:
+                path = self.path / ".indexes"
+                tmp = path.with_name(path.name + ".tmp")
+                tmp.write_text(json.dumps([f for f in self._fields if f != field]))
+                os.replace(tmp, path)
+                self._refresh()
+
+    def index_information(self):
+        """The indexed fields."""
+        self._refresh()
+        return list(self._fields)
+
+    def explain(self, query):
+        """How ``query`` would be served: the index used and the documents read."""
+        self._refresh()
+        if "_id" in query and not _is_operator(query["_id"]):
+            return {"index": "_id", "candidates": int(query["_id"] in self._index)}
+        plan = self._plan(query)
+        if plan is None:
+            return {"index": None, "candidates": len(self._index)}
+        return {"index": plan[1], "candidates": plan[0]}
 
     def insert_one(self, doc):
-        """Insert a single document (store as a JSON file)."""
-        doc_id = doc.get(
-            "_id", str(len(list(self.path.iterdir())) + 1)
-        )  # Auto-generate ID if not given
-        doc["_id"] = doc_id  # Ensure _id exists
-        with open(self.path / f"{doc_id}.json", "w") as f:
-            json.dump(doc, f)
-        return {"_id": doc_id}
+        """Insert a single document (append it to the active segment)."""
+        with self._locked():
+            if "_id" not in doc:
+                doc["_id"] = str(self._next_id)  # Auto-generate ID if not given
+            self._append(doc)
+            self._maybe_compact()
+        return {"_id": doc["_id"]}
 
     def find_one(self, query):
         """Find a document that matches ALL key-value pairs in the query."""
-        for file in self.path.glob("*.json"):
-            with open(file, "r") as f:
-                doc = json.load(f)
-                # Check if all key-value pairs in the query exist in the document
-                if all(doc.get(k) == v for k, v in query.items()):
-                    return doc  # Return the first matching document
-        return None  # No match found
+        return next(self._find(query), None)  # None if no match found
 
     def find_all(self, query):
         """Find all documents that match ALL key-value pairs in the query."""
-        matching_docs = []
-        for file in self.path.glob("*.json"):
-            with open(file, "r") as f:
-                doc = json.load(f)
-                # Check if all key-value pairs in the query exist in the document
-                if all(doc.get(k) == v for k, v in query.items()):
-                    matching_docs.append(doc)
-
-        return matching_docs  # Return all matching documents (empty list if no match)
+        return list(self._find(query))
+
+    def find_range(self, field, lo=None, hi=None, query={}):
+        """Documents with ``lo <= doc[field] <= hi`` (None = open end) matching ``query``, sorted by ``field``."""
+        cond = {}
+        if lo is not None:
+            cond["$gte"] = lo
+        if hi is not None:
+            cond["$lte"] = hi
+        query = dict(query, **{field: cond}) if cond else query
+        return list(self._sorted(field, query))
+
+    def find_top(self, field, k, query={}, largest=True):
+        """The ``k`` documents matching ``query`` with the largest (or smallest) ``field``."""
+        return list(islice(self._sorted(field, query, descending=largest), k))
 
     def find_most_recent_matching(self, query):
         """Find the most recent document that matches ALL key-value pairs in the query."""
+        self._refresh()
+        if "_scraped_at" in self._fields:
+            # Newest first: the first parsable timestamp is the most recent
+            for doc in self._sorted("_scraped_at", query, descending=True):
+                if not isinstance(doc["_scraped_at"], str):
+                    break
+                try:
+                    datetime.fromisoformat(doc["_scraped_at"])
+                    return doc
+                except ValueError:
+                    continue  # Skip invalid date formats
+            return None
+
         most_recent_doc = None
         most_recent_time = datetime.min  # Start with the earliest possible datetime
 
-        for file in self.path.glob("*.json"):
-            with open(file, "r") as f:
-                doc = json.load(f)
-
-                # Check if the document matches the query
-                if not all(doc.get(k) == v for k, v in query.items()):
-                    continue  # Skip if it doesn't match
-
-                # Parse 'scraped_at' if it exists
-                if "_scraped_at" in doc:
-                    try:
-                        scraped_time = datetime.fromisoformat(doc["_scraped_at"])
-                        if scraped_time > most_recent_time:
-                            most_recent_time = scraped_time
-                            most_recent_doc = doc
-                    except ValueError:
-                        continue  # Skip invalid date formats
+        for doc in self._find(query):
+            # Parse 'scraped_at' if it exists
+            if "_scraped_at" in doc:
+                try:
+                    scraped_time = datetime.fromisoformat(doc["_scraped_at"])
+                    if scraped_time > most_recent_time:
+                        most_recent_time = scraped_time
+                        most_recent_doc = doc
+                except ValueError:
+                    continue  # Skip invalid date formats
 
         return most_recent_doc  # Return the most recent matching document (or None if no match)
 
@@ -103,50 +785,58 @@ class Collection:
         """Find the set of documents with the most recent '_scraped_at' timestamp."""
         most_recent_docs = []
         most_recent_time = datetime.min
-        for file in self.path.glob("*.json"):
-            with open(file, "r") as f:
-                doc = json.load(f)
-                # Check if the document matches the query
-                if not all(doc.get(k) == v for k, v in query.items()):
-                    continue  # Skip if it doesn't match
-
-                if "_scraped_at" in doc:
-                    # _scraped_at is stored as an ISO string
-                    # e.g., "2025-03-14 16:15:30 UTC"
-                    scraped_at_str = doc["_scraped_at"].replace(" UTC", "")
-                    scraped_time = datetime.strptime(
-                        scraped_at_str, "%Y-%m-%d %H:%M:%S"
-                    )
-                    # If later _scraped_at found, then update most_recent_time and most_recent_docs
-                    if scraped_time > most_recent_time:
-                        most_recent_time = scraped_time
-                        most_recent_docs = [doc]
-                    # If same _scraped_at found, then just append to most_recent_docs
-                    elif scraped_time == most_recent_time:
-                        most_recent_docs.append(doc)
+        self._refresh()
+        if "_scraped_at" in self._fields:
+            # Newest first: stop at the first timestamp older than the newest
+            for doc in self._sorted("_scraped_at", query, descending=True):
+                if not isinstance(doc["_scraped_at"], str):
+                    break
+                scraped_time = datetime.strptime(
+                    doc["_scraped_at"].replace(" UTC", ""), "%Y-%m-%d %H:%M:%S"
+                )
+                if scraped_time < most_recent_time:
+                    break
+                most_recent_time = scraped_time
+                most_recent_docs.append(doc)
+            return most_recent_docs
+
+        for doc in self._find(query):
+            if "_scraped_at" in doc:
+                # _scraped_at is stored as an ISO string
+                # e.g., "2025-03-14 16:15:30 UTC"
+                scraped_at_str = doc["_scraped_at"].replace(" UTC", "")
+                scraped_time = datetime.strptime(
+                    scraped_at_str, "%Y-%m-%d %H:%M:%S"
+                )
+                # If later _scraped_at found, then update most_recent_time and most_recent_docs
+                if scraped_time > most_recent_time:
+                    most_recent_time = scraped_time
+                    most_recent_docs = [doc]
+                # If same _scraped_at found, then just append to most_recent_docs
+                elif scraped_time == most_recent_time:
+                    most_recent_docs.append(doc)
         return most_recent_docs
 
     def find(self):
         """Return all documents in the collection."""
-        documents = []
-        for file in self.path.glob("*.json"):
-            with open(file, "r") as f:
-                documents.append(json.load(f))
-        return documents
+        return list(self._retry_reads(self._iter_docs))
 
     def delete_one(self, query):
         """Delete a document by a simple key-value pair."""
-        for file in self.path.glob("*.json"):
-            with open(file, "r") as f:
-                doc = json.load(f)
-                if all(doc.get(k) == v for k, v in query.items()):
-                    file.unlink()  # Delete the file
-                    return {"deleted_count": 1}
-        return {"deleted_count": 0}
+        doc = self.find_one(query)
+        if doc is None:
+            return {"deleted_count": 0}
+        with self._locked():
+            if doc["_id"] not in self._index:
+                return {"deleted_count": 0}  # deleted by another process meanwhile
+            self._append({"$delete": doc["_id"]})
+            self._maybe_compact()
+        return {"deleted_count": 1}
 
     def list_documents(self):
-        """List all document filenames in the collection."""
-        return [file.name for file in self.path.glob("*.json")]
+        """List the ``_id`` of every document in the collection."""
+        self._refresh()
+        return list(self._index)
 
 
 # Example Usage
@@ -169,4 +859,3 @@ if __name__ == "__main__":
     # List collections and documents
     print("Collections in DB:", db.list_collections())
     print("Documents in Collection:", collection.list_documents())
-
@@ -9,63 +9,86 @@ Features:
 - Surface field viewer per member
 - SLURM job status overview
 
+``/data?since=<member>:<tsnumber>,...`` returns, for each listed member, only
+the samples after that time step; members not listed get their full history
+(a bare ``since=<tsnumber>`` applies to all members).  The page keeps the
+history per member and appends what each poll returns.
+
+Member traces are min/max decimated to ``--max-points`` samples (``points=N``
+overrides, 0 = all).  Dragging on a chart requests ``from=<iso>&to=<iso>`` for
+that time window, which is full resolution once it holds fewer samples.
+
+STDOUTs are read by a background thread every ``--ingest-interval`` seconds,
+never inside a request.  For the current data version it keeps prebuilt the
+default ``/data`` response and, per member, the increments after each of its
+last ``SINCE_VERSIONS`` time steps, which are what the page polls with.
+Requests are served by a ThreadingHTTPServer by joining those bytes; only
+points/window queries and older since= steps are built from the parsed
+records (capped at the version's record counts).  Responses carry an ETag, so
+a browser polling unchanged data gets a 304.
+
+Parsed records are checkpointed to ``STDOUT.0000.moncache.npz`` next to each
+member's STDOUT, so a restart loads them and resumes tailing from the saved
+offset; ``--no-cache`` disables this.
+
 Usage:
-    python ensemble_dashboard.py <ensemble_dir> [--port 8051] [--poll 30]
+    python ensemble_dashboard.py <ensemble_dir> [--port 8051] [--poll 30] [--max-points 1000]
+                                 [--ingest-interval 10]
 
     ensemble_dir: path to the ensemble/ directory containing member_NNN/ dirs
 """
 
 import os
 import sys
-import re
 import json
 import argparse
 import glob
-from http.server import HTTPServer, BaseHTTPRequestHandler
-from datetime import datetime, timedelta
+import hashlib
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from datetime import datetime
+from urllib.parse import urlparse, parse_qs
+
+from spectre_utils.mon_scan import MonScanner, split_records
+from spectre_utils.monitor_records import MonitorCache, MonitorRecords, TraceWindow, query_window
 
-# Reuse the incremental parser from monitor_dashboard
-MON_PATTERN = re.compile(r'%MON\s+(\S+)\s+=\s+(\S+)')
 
 
 class MemberWatcher:
-    """Incrementally parse STDOUT for one ensemble member."""
+    """Incrementally parse STDOUT for one ensemble member.
 
-    def __init__(self, member_id, stdout_path):
+    ``poll`` is called by the ingest thread only; it reads and parses without
+    holding ``lock`` and takes it just to append, so request threads reading
+    ``records`` under ``lock`` never wait on the filesystem.  With ``cache``,
+    the parse state is checkpointed next to the STDOUT and restored on start-up.
+    """
+
+    def __init__(self, member_id, stdout_path, cache=True):
         self.member_id = member_id
         self.path = stdout_path
-        self.records = []
+        self.records = MonitorRecords()
+        self.lock = threading.Lock()
         self._offset = 0
         self._current = {}
+        self._cache = MonitorCache(stdout_path) if cache else None
+        if self._cache:
+            self.records, self._offset, self._current = (
+                self._cache.load() or (self.records, self._offset, self._current))
+        self._scanner = MonScanner(stdout_path, self._offset)
 
     def poll(self):
-        try:
-            size = os.path.getsize(self.path)
-        except OSError:
-            return False
-        if size <= self._offset:
-            return False
-        new_records = 0
-        with open(self.path, "r") as f:
-            f.seek(self._offset)
-            for line in f:
-                m = MON_PATTERN.search(line)
-                if not m:
-                    continue
-                name, val_str = m.group(1), m.group(2)
-                try:
-                    val = int(val_str)
-                except ValueError:
-                    try:
-                        val = float(val_str.replace("D", "E"))
-                    except ValueError:
-                        continue
-                if name == "time_tsnumber" and self._current:
-                    self.records.append(self._current)
-                    self._current = {}
-                    new_records += 1
-                self._current[name] = val
-            self._offset = f.tell()
+        batches = []
+        for names, values in self._scanner.read():
+            columns, n, int_keys, self._current = split_records(names, values, self._current)
+            batches.append((columns, n, int_keys))
+        self._offset = self._scanner.offset
+        new_records = sum(n for _, n, _ in batches)
+        with self.lock:
+            for batch in batches:
+                self.records.extend(*batch)
+        if new_records and self._cache:
+            self._cache.save(self.records, self._offset, self._current)
         return new_records > 0
 
 
@@ -87,13 +110,20 @@ PANELS = [
 STAT_SUFFIXES = ["_max", "_mean", "_min"]
 
 
-def member_records_to_traces(records, start_date):
-    """Convert monitor records to Chart.js-compatible traces."""
-    t0 = datetime.strptime(start_date, "%Y-%m-%d")
-    times = [(t0 + timedelta(seconds=r.get("time_secondsf", 0))).isoformat() for r in records]
-    all_keys = set()
-    for r in records:
-        all_keys.update(r.keys())
+def member_records_to_traces(records, start_date, since=None, points=None, window=None,
+                             stop=None):
+    """Convert monitor records (after time step ``since``) to Chart.js-compatible traces.
+
+    Traces are decimated to ``points`` samples; ``window`` = (lo, hi) model
+    seconds restricts them to a time range, ``stop`` to the first rows.
+    """
+    start, stop = 0, len(records) if stop is None else stop
+    if window is not None:
+        lo, hi = records.between("time_secondsf", *window)
+        start, stop = lo, min(hi, stop)
+    if since is not None:
+        start = max(start, records.after("time_tsnumber", since))
+    traces_of = TraceWindow(records, start_date, start, stop, points)
 
     panels_data = []
     for panel in PANELS:
@@ -101,17 +131,17 @@ def member_records_to_traces(records, start_date):
         is_raw = panel.get("raw", False)
         if is_raw:
             for var in panel["vars"]:
-                if var not in all_keys:
+                if not records.has_data(var):
                     continue
-                values = [r.get(var) for r in records]
+                times, values = traces_of.xy(var)
                 traces.append({"name": var.split("_", 1)[-1], "x": times, "y": values})
         else:
             for base_var in panel["vars"]:
                 for suffix in STAT_SUFFIXES:
                     key = base_var + suffix
-                    if key not in all_keys:
+                    if not records.has_data(key):
                         continue
-                    values = [r.get(key) for r in records]
+                    times, values = traces_of.xy(key)
                     label = suffix.replace("_", "").capitalize()
                     traces.append({"name": label, "x": times, "y": values})
         if traces:
@@ -134,6 +164,7 @@ DASHBOARD_HTML = """<!DOCTYPE html>
 <title>Ensemble Monitor</title>
 <script src="https://cdn.jsdelivr.net/npm/chart.js@4/dist/chart.umd.min.js"></script>
 <script src="https://cdn.jsdelivr.net/npm/chartjs-adapter-date-fns@3/dist/chartjs-adapter-date-fns.bundle.min.js"></script>
+<script src="https://cdn.jsdelivr.net/npm/chartjs-plugin-zoom@2/dist/chartjs-plugin-zoom.min.js"></script>
 <style>
   * { box-sizing: border-box; }
   body { font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', sans-serif;
@@ -199,7 +230,7 @@ DASHBOARD_HTML = """<!DOCTYPE html>
 </div>
 
 <div class="section">
-  <h2>Monitor Time Series</h2>
+  <h2>Monitor Time Series <span style="font-weight:normal; font-size:11px; color:#888;">drag to zoom in at full resolution, double-click to reset</span></h2>
   <div class="grid" id="grid"></div>
 </div>
 
@@ -231,6 +262,7 @@ DASHBOARD_HTML = """<!DOCTYPE html>
 
 <script>
 const POLL = POLL_INTERVAL * 1000;
+const MAX_POINTS = MAX_POINTS_PER_TRACE;  // server decimates member traces to this many samples
 const COLORS = ['#2563eb','#dc2626','#16a34a','#9333ea','#ea580c','#0891b2',
   '#4f46e5','#059669','#d97706','#7c3aed','#db2777','#0d9488',
   '#6366f1','#65a30d','#c026d3','#0284c7','#e11d48','#14b8a6'];
@@ -283,16 +315,77 @@ function selectRange() {
   refreshCharts();
 }
 
+// --- Member history: full on the first poll, then only newer samples ---
+let memberData = {};  // member -> {n_steps, layout, panels, ...}
+function sinceParam() {
+  const parts = Object.keys(memberData).filter(m => !memberData[m].stale)
+    .map(m => m + ':' + memberData[m].n_steps);
+  return parts.length ? '?since=' + parts.join(',') : '';
+}
+function mergeMembers(members) {
+  Object.entries(members).forEach(([mid, m]) => {
+    const held = memberData[mid];
+    if (m.since === null) { memberData[mid] = m; return; }
+    if (!held || held.layout !== m.layout) {
+      // Traces were added: the next poll fetches this member in full
+      if (held) held.stale = true;
+      return;
+    }
+    m.panels.forEach((p, pi) => {
+      if (pi >= held.panels.length) return;
+      p.traces.forEach((tr, ti) => {
+        const t = held.panels[pi].traces[ti];
+        if (!t) return;
+        tr.x.forEach((x, i) => { t.x.push(x); t.y.push(tr.y[i]); });
+      });
+    });
+    held.n_records = m.n_records; held.n_steps = m.n_steps; held.model_days = m.model_days;
+    // Appended samples are not decimated: re-fetch once a trace holds too many
+    if (held.panels.some(p => p.traces.some(t => t.x.length > 2 * MAX_POINTS))) held.stale = true;
+  });
+}
+
 // --- Charts ---
 let lastData = null;
+let zoomed = false;  // a chart shows a full-resolution window; polls don't rebuild charts
 function refreshCharts() {
   if (lastData) createCharts(lastData);
 }
+function memberTrace(panels, pi) {
+  // Only show 'mean' trace per member to avoid clutter (or first trace for raw panels)
+  if (!panels || pi >= panels.length) return null;
+  const traces = panels[pi].traces;
+  return traces.find(t => t.name.toLowerCase().includes('mean')) || traces[0];
+}
+function localIso(ms) {
+  const d = new Date(ms), p = (n) => String(n).padStart(2, '0');
+  return d.getFullYear() + '-' + p(d.getMonth() + 1) + '-' + p(d.getDate()) + 'T' +
+         p(d.getHours()) + ':' + p(d.getMinutes()) + ':' + p(d.getSeconds());
+}
+async function loadWindow(chart, pi) {
+  // Replace the zoomed chart's member traces with the records of the visible window
+  zoomed = true;
+  const q = '?from=' + localIso(chart.scales.x.min) + '&to=' + localIso(chart.scales.x.max);
+  try {
+    const r = await fetch('/data' + q);
+    const d = await r.json();
+    chart.data.datasets.forEach(ds => {
+      const trace = memberTrace((d.members[ds.label] || {}).panels, pi);
+      if (trace) ds.data = trace.x.map((t, i) => ({x: t, y: trace.y[i]}));
+    });
+    chart.update('none');
+  } catch (e) {}
+}
+function resetZoom() {
+  zoomed = false;
+  refreshCharts();
+}
 
 function createCharts(data) {
   const grid = document.getElementById('grid');
   grid.innerHTML = '';
   charts = [];
+  zoomed = false;
 
   // Build unified panel list from first available member
   const memberKeys = Object.keys(data.members).filter(m => selectedMembers.has(m));
@@ -308,11 +401,7 @@ function createCharts(data) {
 
     const datasets = [];
     memberKeys.forEach((mkey, mi) => {
-      const mPanels = data.members[mkey].panels;
-      if (pi >= mPanels.length) return;
-      const mTraces = mPanels[pi].traces;
-      // Only show 'mean' trace per member to avoid clutter (or first trace for raw panels)
-      const trace = mTraces.find(t => t.name.toLowerCase().includes('mean')) || mTraces[0];
+      const trace = memberTrace(data.members[mkey].panels, pi);
       if (!trace) return;
       datasets.push({
         label: mkey,
@@ -332,6 +421,8 @@ function createCharts(data) {
         plugins: {
           title: { display: true, text: panel.title, font: { size: 12 } },
           legend: { display: false },
+          zoom: { zoom: { drag: { enabled: true }, mode: 'x',
+                          onZoomComplete: ({ chart }) => loadWindow(chart, pi) } },
         },
         scales: {
           x: { type: 'time', ticks: { font: { size: 9 } } },
@@ -340,6 +431,7 @@ function createCharts(data) {
         interaction: { mode: 'index', intersect: false },
       }
     }));
+    canvas.addEventListener('dblclick', resetZoom);
   });
 }
 
@@ -423,8 +515,10 @@ async function pollMemberPlots() {
 // --- Main poll ---
 async function poll() {
   try {
-    const r = await fetch('/data');
+    const r = await fetch('/data' + sinceParam());
     const d = await r.json();
+    mergeMembers(d.members);
+    d.members = memberData;
     lastData = d;
 
     // Update summary
@@ -448,7 +542,7 @@ async function poll() {
     renderConvergence(d.convergence);
 
     // Charts
-    createCharts(d);
+    if (!zoomed) createCharts(d);
   } catch (e) {
     document.getElementById('status').textContent = 'error: ' + e.message;
   }
@@ -479,6 +573,142 @@ def scan_member_plots(plots_dir):
     return plots
 
 
+# ---------------------------------------------------------------------------
+# Background ingest
+# ---------------------------------------------------------------------------
+
+# Past data versions for which the ingest thread keeps each member's
+# since= increment prebuilt (a tab polling every 30 s lags ~3 versions)
+SINCE_VERSIONS = 8
+
+
+def member_payload(records, start_date, stop, since=None, points=None, window=None):
+    """The /data entry of one member for its first ``stop`` records (caller holds the lock)."""
+    return {
+        "n_records": stop,
+        "n_steps": records.value("time_tsnumber", stop - 1, 0),
+        "model_days": records.value("time_secondsf", stop - 1, 0) / 86400.0,
+        "since": since,
+        "layout": records.layout,
+        "panels": member_records_to_traces(records, start_date, since, points, window, stop),
+    }
+
+
+def member_json(watcher, start_date, stop, since=None, points=None, window=None):
+    with watcher.lock:
+        payload = member_payload(watcher.records, start_date, stop, since, points, window)
+    return json.dumps(payload).encode()
+
+
+class Snapshot:
+    """One data version, as published by the ingest thread.
+
+    ``members`` maps each member with records to ``n_records`` (its records
+    in this version), ``full`` (its default /data entry), ``since`` (entries
+    after each of its last ``SINCE_VERSIONS`` ``n_steps`` values, as the
+    page sends them back) and the JSON bytes of each.  ``body`` is the
+    default /data response.  Nothing in it changes after publication.
+    """
+
+    def __init__(self, version, n_members, convergence, members):
+        self.version = version
+        self.n_members = n_members
+        self.convergence = convergence
+        self.members = members
+        self.generated = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.body = self.assemble({mid: m["full"] for mid, m in members.items()})
+
+    def assemble(self, entries):
+        """The /data body around the member entries ``{member_id: JSON bytes}``."""
+        head = json.dumps({
+            "n_members": self.n_members,
+            "n_active": len(self.members),
+            "generated": self.generated,
+            "convergence": self.convergence,
+        })
+        members = b", ".join(json.dumps(mid).encode() + b": " + entry
+                             for mid, entry in sorted(entries.items()))
+        return head[:-1].encode() + b', "members": {' + members + b"}}"
+
+
+class IngestThread(threading.Thread):
+    """Poll all members on a fixed schedule and keep the /data responses prebuilt.
+
+    ``snapshot`` is the current ``Snapshot``; its ``version`` increases
+    whenever a member has new records or the convergence log changes.  Only
+    the members with new records are re-encoded.  It is replaced in one
+    assignment, so request threads read it without locking.
+    """
+
+    def __init__(self, ensemble_dir, watchers, start_date, max_points, interval):
+        super().__init__(daemon=True)
+        self.ensemble_dir = ensemble_dir
+        self.watchers = watchers
+        self.start_date = start_date
+        self.max_points = max_points
+        self.interval = interval
+        self.convergence = None
+        self.snapshot = None
+        self._conv_mtime = None
+
+    def _read_convergence(self):
+        """Reload convergence.json if it changed; True if it did."""
+        conv_path = os.path.join(self.ensemble_dir, "convergence.json")
+        try:
+            mtime = os.path.getmtime(conv_path)
+        except OSError:
+            return False
+        if mtime == self._conv_mtime:
+            return False
+        try:
+            with open(conv_path, "r") as f:
+                self.convergence = json.load(f)
+        except Exception:
+            return False
+        self._conv_mtime = mtime
+        return True
+
+    def _member(self, w, held):
+        """Prebuilt entries of one member with new records, or None if it has none."""
+        with w.lock:
+            n = len(w.records)
+            n_steps = w.records.value("time_tsnumber", n - 1, 0)
+        if n == 0:
+            return None
+        steps = list(held["since"]) if held else []
+        steps = [ts for ts in steps if ts != n_steps][-(SINCE_VERSIONS - 1):] + [n_steps]
+        return {
+            "n_records": n,
+            "full": member_json(w, self.start_date, n, points=self.max_points),
+            "since": {ts: member_json(w, self.start_date, n, ts, self.max_points)
+                      for ts in steps},
+        }
+
+    def refresh(self):
+        changed = {mid: w.poll() for mid, w in self.watchers.items()}
+        conv_changed = self._read_convergence()
+        old = self.snapshot
+        if old is not None and not conv_changed and not any(changed.values()):
+            return
+        members = {}
+        for mid, w in sorted(self.watchers.items()):
+            held = old.members.get(mid) if old else None
+            if held is None or changed[mid]:
+                held = self._member(w, held)
+            if held is not None:
+                members[mid] = held
+        self.snapshot = Snapshot(old.version + 1 if old else 1, len(self.watchers),
+                                 self.convergence, members)
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Ingest error: {e}")
+
+
 # ---------------------------------------------------------------------------
 # HTTP server
 # ---------------------------------------------------------------------------
@@ -486,16 +716,17 @@ def scan_member_plots(plots_dir):
 class EnsembleHandler(BaseHTTPRequestHandler):
     ensemble_dir = None
     watchers = {}  # member_id → MemberWatcher
+    ingest = None  # IngestThread
     start_date = "2002-07-01"
     poll_interval = 30
-    _data_cache = None
-    _cache_time = 0
+    max_points = 1000   # samples per member trace unless points= is given (0 = all)
 
     def do_GET(self):
         path = self.path.split("?")[0]
 
         if path == "/" or path == "/index.html":
-            html = DASHBOARD_HTML.replace("POLL_INTERVAL", str(self.poll_interval))
+            html = (DASHBOARD_HTML.replace("POLL_INTERVAL", str(self.poll_interval))
+                    .replace("MAX_POINTS_PER_TRACE", str(self.max_points or "Infinity")))
             self._respond(200, "text/html", html.encode())
 
         elif path == "/data":
@@ -529,51 +760,66 @@ class EnsembleHandler(BaseHTTPRequestHandler):
         else:
             self._respond(404, "text/plain", b"Not found")
 
-    def _respond(self, code, content_type, body):
+    def _respond(self, code, content_type, body, etag=None):
         self.send_response(code)
         self.send_header("Content-Type", content_type)
         if "json" in content_type:
             self.send_header("Cache-Control", "no-cache")
+        if etag:
+            self.send_header("ETag", etag)
         self.end_headers()
         self.wfile.write(body)
 
-    def _serve_data(self):
-        # Poll all watchers
-        for w in self.watchers.values():
-            w.poll()
-
-        # Build response
-        members_data = {}
-        n_active = 0
-        for mid, w in sorted(self.watchers.items()):
-            if len(w.records) > 0:
-                n_active += 1
-                last = w.records[-1]
-                panels = member_records_to_traces(w.records, self.start_date)
-                members_data[mid] = {
-                    "n_records": len(w.records),
-                    "model_days": last.get("time_secondsf", 0) / 86400.0,
-                    "panels": panels,
-                }
-
-        # Read convergence log
-        convergence = None
-        conv_path = os.path.join(self.ensemble_dir, "convergence.json")
-        if os.path.exists(conv_path):
+    def _get_since(self):
+        """Parse since= into ({member_id: tsnumber}, default tsnumber or None)."""
+        since, default = {}, None
+        param = parse_qs(urlparse(self.path).query).get("since", [""])[0]
+        for item in filter(None, param.split(",")):
             try:
-                with open(conv_path, "r") as f:
-                    convergence = json.load(f)
-            except Exception:
-                pass
-
-        result = {
-            "n_members": len(self.watchers),
-            "n_active": n_active,
-            "generated": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "convergence": convergence,
-            "members": members_data,
-        }
-        self._respond(200, "application/json", json.dumps(result).encode())
+                if ":" in item:
+                    mid, ts = item.split(":", 1)
+                    since[mid] = int(ts)
+                else:
+                    default = int(item)
+            except ValueError:
+                continue
+        return since, default
+
+    def _serve_data(self):
+        query = urlparse(self.path).query
+        params = parse_qs(query)
+        try:
+            points = max(int(params["points"][0]), 0) if "points" in params else self.max_points
+        except ValueError:
+            points = self.max_points
+        since, window = self._get_since(), query_window(params, self.start_date)
+
+        # The ETag names the data version and the query: a repeated poll with
+        # nothing new ingested since is answered with 304 Not Modified.  The
+        # body is built from the same snapshot, capped at its record counts.
+        snap = self.ingest.snapshot
+        etag = f'"{snap.version}-{hashlib.sha1(query.encode()).hexdigest()[:12]}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        if since == ({}, None) and window is None and points == self.max_points:
+            body = snap.body
+        else:
+            entries = {}
+            for mid, m in snap.members.items():
+                member_since = since[0].get(mid, since[1])
+                entry = None
+                if window is None and points == self.max_points:
+                    entry = m["full"] if member_since is None else m["since"].get(member_since)
+                if entry is None:
+                    # Older since=, points= or a window: build from the records
+                    entry = member_json(self.watchers[mid], self.start_date, m["n_records"],
+                                        member_since, points, window)
+                entries[mid] = entry
+            body = snap.assemble(entries)
+        self._respond(200, "application/json", body, etag=etag)
 
     def log_message(self, format, *args):
         pass
@@ -589,6 +835,12 @@ def main():
     parser.add_argument("--port", "-p", type=int, default=8051)
     parser.add_argument("--poll", type=int, default=30)
     parser.add_argument("--start-date", default="2002-07-01")
+    parser.add_argument("--max-points", type=int, default=1000,
+                        help="Samples per member trace sent to the browser (min/max decimated; 0 = all)")
+    parser.add_argument("--ingest-interval", type=float, default=10,
+                        help="Seconds between background reads of the member STDOUTs")
+    parser.add_argument("--no-cache", dest="cache", action="store_false",
+                        help="Don't checkpoint parsed records to <STDOUT>.moncache.npz")
     args = parser.parse_args()
 
     ensemble_dir = os.path.abspath(args.ensemble_dir)
@@ -601,11 +853,13 @@ def main():
         stdout_path = os.path.join(d, "run", "STDOUT.0000")
         if not os.path.exists(stdout_path):
             stdout_path = os.path.join(d, "STDOUT.0000")
-        watchers[mid] = MemberWatcher(mid, stdout_path)
+        watchers[mid] = MemberWatcher(mid, stdout_path, cache=args.cache)
 
-    # Initial poll
-    for w in watchers.values():
-        w.poll()
+    # Initial poll, then keep polling in the background
+    ingest = IngestThread(ensemble_dir, watchers, args.start_date, args.max_points,
+                          args.ingest_interval)
+    ingest.refresh()
+    ingest.start()
 
     n_with_data = sum(1 for w in watchers.values() if len(w.records) > 0)
     print(f"Ensemble dir: {ensemble_dir}")
@@ -613,11 +867,13 @@ def main():
 
     EnsembleHandler.ensemble_dir = ensemble_dir
     EnsembleHandler.watchers = watchers
+    EnsembleHandler.ingest = ingest
     EnsembleHandler.start_date = args.start_date
     EnsembleHandler.poll_interval = args.poll
+    EnsembleHandler.max_points = args.max_points
 
     hostname = os.uname().nodename
-    server = HTTPServer(("127.0.0.1", args.port), EnsembleHandler)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), EnsembleHandler)
     print(f"Dashboard live at http://{hostname}:{args.port}")
     try:
         server.serve_forever()
@@ -0,0 +1,168 @@
+"""
+ensemble_ops.py
+===============
+Batched operations on bred-vector ensembles.
+
+Wet-mask RMS
+    ``WetMask`` holds one boolean ocean mask per IC field, derived once from
+    the control ICs (land is exactly 0 there).  RMS values are computed with a
+    single ``einsum`` over the mask, so no masked copy of the field is made.
+
+Orthogonalisation
+    Independently rescaled bred vectors tend to collapse onto the leading
+    growing mode.  ``orthogonalize_members`` makes the member perturbations
+    ``p_m = IC_m - IC_control`` mutually orthogonal (Gram-Schmidt in member
+    order) and rescales each back to the target temperature RMS.
+
+    It works out-of-core on the member IC files:
+
+      1. stream all members block by block and accumulate one small
+         ``(n_members, n_members)`` Gram matrix per field;
+      2. solve for the orthogonalising transform in member space
+         (Cholesky QR, with one re-orthogonalisation step);
+      3. stream the blocks again and overwrite each member IC with
+         ``IC_control + (A @ P)_m``.
+
+    Memory is bounded by ``n_members * block`` values per pass, independent of
+    the grid size.  The inner product gives every field equal weight
+    (each field's Gram matrix is normalised by its trace), and the same linear
+    combination is applied to all fields of a member, so the T/S/U/V/Eta
+    balance of each bred vector is preserved.
+
+Usage:
+    wet = WetMask.from_control(control_ics)
+    theta_rms = wet.rms("Theta", bred_theta)
+    diags = orthogonalize_members(paths, control_ics, wet, target_rms)
+"""
+
+import numpy as np
+
+
+# Values per member held in memory at once by the blocked passes
+# (n_members * BLOCK_VALUES float64 per buffer).
+BLOCK_VALUES = 1 << 17
+
+
+# ---------------------------------------------------------------------------
+# Wet-mask RMS
+# ---------------------------------------------------------------------------
+
+class WetMask:
+    """Per-field ocean masks and wet-point counts."""
+
+    def __init__(self, masks):
+        self.masks = {name: np.asarray(m, dtype=bool) for name, m in masks.items()}
+        self.counts = {name: int(np.count_nonzero(m)) for name, m in self.masks.items()}
+
+    @classmethod
+    def from_control(cls, control):
+        """Mask every field of ``{field: array}`` where the control value is non-zero."""
+        return cls({name: np.asarray(arr) != 0 for name, arr in control.items()})
+
+    def rms(self, name, arr):
+        """RMS of ``arr`` over the wet points of field ``name``."""
+        n = self.counts[name]
+        if n == 0:
+            return 0.0
+        x = np.asarray(arr).reshape(-1)
+        ss = np.einsum("i,i,i->", x, x, self.masks[name].reshape(-1), dtype=np.float64)
+        return float(np.sqrt(ss / n))
+
+
+# ---------------------------------------------------------------------------
+# Blocked Gram-Schmidt over member IC files
+# ---------------------------------------------------------------------------
+
+def _open_members(files, mode):
+    return [np.memmap(p, dtype=">f4", mode=mode) for p in files]
+
+
+def _load_block(buf, members, ctrl, s, e, mask=None):
+    """Fill ``buf[:, :e-s]`` with the perturbations of all members."""
+    b = buf[:, :e - s]
+    for k, mm in enumerate(members):
+        np.subtract(mm[s:e], ctrl[s:e], out=b[k])
+    if mask is not None:
+        b *= mask[s:e]
+    return b
+
+
+def member_grams(paths, control, wet, block=BLOCK_VALUES):
+    """Gram matrices ``G[f][i, j] = <p_i, p_j>`` over the wet points of each field.
+
+    ``paths`` maps field -> list of member IC files (same member order for
+    every field); ``control`` maps field -> control IC array.
+    """
+    grams = {}
+    for name, files in paths.items():
+        ctrl = np.asarray(control[name]).reshape(-1)
+        mask = wet.masks[name].reshape(-1)
+        members = _open_members(files, "r")
+        n_mem, size = len(members), ctrl.size
+        buf = np.empty((n_mem, min(block, size)))
+        G = np.zeros((n_mem, n_mem))
+        for s in range(0, size, block):
+            b = _load_block(buf, members, ctrl, s, min(s + block, size), mask)
+            G += b @ b.T
+        grams[name] = G
+    return grams
+
+
+def orthogonalizing_transform(grams):
+    """Lower-triangular ``T`` such that the rows of ``T @ P`` are orthonormal.
+
+    The combined inner product is the sum of the per-field Gram matrices,
+    each normalised by its trace.  Lower-triangular means member 1 keeps its
+    direction, member 2 is made orthogonal to member 1, and so on - the same
+    result as classical Gram-Schmidt in member order.  Raises
+    ``np.linalg.LinAlgError`` if the perturbations are linearly dependent.
+    """
+    G = sum(g / np.trace(g) for g in grams.values() if np.trace(g) > 0)
+    L = np.linalg.cholesky(G)
+    T = np.linalg.inv(L)
+    # Cholesky QR loses orthogonality as cond(G) grows; one more pass on the
+    # already-orthogonalised Gram matrix restores it (CholeskyQR2).
+    L2 = np.linalg.cholesky(T @ G @ T.T)
+    return np.linalg.solve(L2, T)
+
+
+def apply_transform(paths, control, A, block=BLOCK_VALUES):
+    """Overwrite each member IC file with ``control + (A @ P)_m``, block by block."""
+    for name, files in paths.items():
+        ctrl = np.asarray(control[name]).reshape(-1)
+        members = _open_members(files, "r+")
+        n_mem, size = len(members), ctrl.size
+        buf = np.empty((n_mem, min(block, size)))
+        for s in range(0, size, block):
+            e = min(s + block, size)
+            new = A @ _load_block(buf, members, ctrl, s, e)
+            for k, mm in enumerate(members):
+                mm[s:e] = ctrl[s:e] + new[k]
+        for mm in members:
+            mm.flush()
+
+
+def orthogonalize_members(paths, control, wet, target_rms, scale_field="Theta",
+                          block=BLOCK_VALUES):
+    """Orthogonalise the member perturbations in place and rescale to ``target_rms``.
+
+    Each member is rescaled so the wet-point RMS of its ``scale_field``
+    perturbation equals ``target_rms``.  Returns one dict per member (in the
+    order of ``paths``) with the new per-field RMS, keyed ``<field>_rms``.
+    """
+    grams = member_grams(paths, control, wet, block)
+    T = orthogonalizing_transform(grams)
+
+    def field_rms(M, name):
+        ss = np.einsum("ij,jk,ik->i", M, grams[name], M)
+        return np.sqrt(np.maximum(ss, 0) / max(wet.counts[name], 1))
+
+    scale_rms = field_rms(T, scale_field)
+    A = (target_rms / scale_rms)[:, np.newaxis] * T
+    apply_transform(paths, control, A, block)
+
+    rms = {name: field_rms(A, name) for name in grams}
+    return [
+        {f"{name}_rms": float(rms[name][k]) for name in grams}
+        for k in range(A.shape[0])
+    ]
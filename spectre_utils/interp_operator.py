@@ -0,0 +1,147 @@
+"""
+interp_operator.py
+==================
+Precomputed bilinear interpolation from a regular lat-lon grid (ERA5) to the
+points of the curvilinear model grid.
+
+``scipy.interpolate.RegularGridInterpolator`` re-locates every target point
+in the source grid each time it is called.  The target points never change
+between records, so the bilinear weights are computed once and stored as a
+sparse ``(n_points, n_lat * n_lon)`` matrix.  Interpolating a block of
+records is then a single sparse matrix - dense matrix product.
+
+Operators are cached on disk as ``bilinear_<hash>.npz`` where the hash covers
+the source axes and the target coordinates, so a grid change invalidates the
+cache automatically.
+
+Usage:
+    op = BilinearOperator.cached(era5_lat, era5_lon, yC, xC, cache_dir)
+    out = op.apply(chunk)   # (nt, n_lat, n_lon) -> (nt, Ny, Nx)
+"""
+
+import hashlib
+import os
+
+import numpy as np
+import scipy.sparse as sp
+
+
+class BilinearOperator:
+    """Sparse bilinear interpolation weights from a regular grid to fixed points.
+
+    Matches ``RegularGridInterpolator(method="linear", bounds_error=False,
+    fill_value=None)``: points outside the source grid are linearly
+    extrapolated from the nearest edge cell.
+    """
+
+    def __init__(self, weights, out_shape):
+        self.weights = weights.tocsr()
+        self.out_shape = tuple(out_shape)
+
+    @classmethod
+    def build(cls, src_lat, src_lon, dst_lat, dst_lon):
+        """Compute weights for target points ``(dst_lat, dst_lon)``.
+
+        ``src_lat`` and ``src_lon`` must be strictly increasing 1-D axes; the
+        source field is expected in ``(lat, lon)`` order.
+        """
+        src_lat = np.asarray(src_lat, dtype=np.float64)
+        src_lon = np.asarray(src_lon, dtype=np.float64)
+        dst_lat = np.asarray(dst_lat, dtype=np.float64)
+        dst_lon = np.asarray(dst_lon, dtype=np.float64)
+        out_shape = dst_lat.shape
+        nlat, nlon = len(src_lat), len(src_lon)
+
+        j, wy = _axis_weights(src_lat, dst_lat.ravel())
+        i, wx = _axis_weights(src_lon, dst_lon.ravel())
+
+        npts = j.size
+        rows = np.repeat(np.arange(npts), 4)
+        cols = np.stack([
+            j * nlon + i,
+            j * nlon + i + 1,
+            (j + 1) * nlon + i,
+            (j + 1) * nlon + i + 1,
+        ], axis=1).ravel()
+        vals = np.stack([
+            (1.0 - wy) * (1.0 - wx),
+            (1.0 - wy) * wx,
+            wy * (1.0 - wx),
+            wy * wx,
+        ], axis=1).ravel()
+
+        weights = sp.csr_matrix((vals, (rows, cols)), shape=(npts, nlat * nlon))
+        return cls(weights, out_shape)
+
+    @classmethod
+    def cached(cls, src_lat, src_lon, dst_lat, dst_lon, cache_dir):
+        """Load the operator from ``cache_dir`` or build and save it."""
+        key = grid_hash(src_lat, src_lon, dst_lat, dst_lon)
+        path = os.path.join(cache_dir, f"bilinear_{key}.npz")
+        if os.path.exists(path):
+            print(f"  Loading interpolation operator {path}")
+            return cls.load(path)
+
+        print(f"  Building interpolation operator -> {path}")
+        op = cls.build(src_lat, src_lon, dst_lat, dst_lon)
+        op.save(path)
+        return op
+
+    def save(self, path):
+        # Write to a temporary name first so a killed job never leaves a
+        # truncated cache file behind.
+        tmp = f"{path}.tmp"
+        w = self.weights
+        with open(tmp, "wb") as f:
+            np.savez(
+                f, data=w.data, indices=w.indices, indptr=w.indptr,
+                shape=np.asarray(w.shape), out_shape=np.asarray(self.out_shape),
+            )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as z:
+            weights = sp.csr_matrix(
+                (z["data"], z["indices"], z["indptr"]), shape=tuple(z["shape"]),
+            )
+            out_shape = tuple(int(n) for n in z["out_shape"])
+        return cls(weights, out_shape)
+
+    def apply(self, data):
+        """Interpolate a block of source fields.
+
+        ``data`` has shape ``(nt, n_lat, n_lon)`` (or ``(n_lat, n_lon)`` for a
+        single record).  Returns float64 of shape ``(nt, *out_shape)``.
+        """
+        data = np.asarray(data)
+        single = data.ndim == 2
+        if single:
+            data = data[np.newaxis]
+        nt = data.shape[0]
+        flat = data.reshape(nt, -1)
+        out = np.asarray(self.weights @ flat.T).T
+        out = out.reshape((nt,) + self.out_shape)
+        return out[0] if single else out
+
+
+def _axis_weights(axis, x):
+    """Left-cell index and fractional offset of ``x`` along a sorted ``axis``.
+
+    Indices are clamped to the first/last cell, offsets are not, which gives
+    linear extrapolation outside the axis range.
+    """
+    idx = np.searchsorted(axis, x, side="right") - 1
+    idx = np.clip(idx, 0, len(axis) - 2)
+    w = (x - axis[idx]) / (axis[idx + 1] - axis[idx])
+    return idx, w
+
+
+def grid_hash(src_lat, src_lon, dst_lat, dst_lon):
+    """Short hex digest identifying a (source axes, target points) pair."""
+    h = hashlib.sha1()
+    for a in (src_lat, src_lon, dst_lat, dst_lon):
+        a = np.ascontiguousarray(a, dtype=np.float64)
+        h.update(str(a.shape).encode())
+        h.update(a.tobytes())
+    return h.hexdigest()[:16]
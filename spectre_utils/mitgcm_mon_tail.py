@@ -9,6 +9,7 @@ Usage:
 import argparse, json, os, re, sys, time
 from collections import OrderedDict
 from spectre_utils import directorydb
+from spectre_utils.mon_scan import MonScanner
 from datetime import datetime
 
 DBROOT=os.getenv("MON_DBROOT","monitoring")
@@ -16,7 +17,6 @@ ENSEMBLE_NAME=os.getenv("ENSEMBLE_NAME","test")
 JOBID = os.getenv("JOBID",-1)
 MEMBERID = os.getenv("MEMBERID","memb000")
 
-MON_RE = re.compile(r".*%MON\s+([A-Za-z0-9_]+)\s*=\s*(.+?)\s*$")
 INT_RE = re.compile(r"[+-]?\d+$")
 FLOAT_RE = re.compile(r"[+-]?(?:\d+\.?\d*|\.\d+)(?:[eEdD][+-]?\d+)?$")
 
@@ -24,6 +24,8 @@ FLOAT_RE = re.compile(r"[+-]?(?:\d+\.?\d*|\.\d+)(?:[eEdD][+-]?\d+)?$")
 DBCLIENT = directorydb.LocalMongo(DBROOT)
 DB = DBCLIENT[ENSEMBLE_NAME]
 COLLECTION = DB[MEMBERID]
+for field in ("time_tsnumber", "_scraped_at", "job_id"):
+    COLLECTION.create_index(field)
 
 def coerce_value(s: str):
     s = s.strip().rstrip(",")
@@ -66,50 +68,42 @@ def tail_file(path, from_start=False, out_path=None, poll_interval=0.25):
         print(f"ERROR: File not found: {path}", file=sys.stderr)
         sys.exit(2)
     outfh = open(out_path, "a") if out_path else None
+    scanner = MonScanner(path, 0 if from_start else os.path.getsize(path))
+    current_ts = None
+    current_block = OrderedDict()
     try:
-        with open(path, "r", errors="ignore") as f:
-            if not from_start:
-                f.seek(0, os.SEEK_END)
-            current_ts = None
-            current_block = OrderedDict()
-            while True:
-                pos = f.tell()
-                line = f.readline()
-                if not line:
-                    # Handle truncate/rotate: if file size < pos, seek to start
-                    try:
-                        size = os.path.getsize(path)
-                        if size < pos:
-                            f.seek(0, os.SEEK_SET)
-                            current_ts = None
+        while True:
+            # Handle truncate/rotate: if file size < offset, restart from the top
+            if scanner.truncated():
+                scanner.offset = 0
+                current_ts = None
+                current_block = OrderedDict()
+            idle = True
+            for names, values in scanner.read():
+                idle = False
+                for name, raw in zip(names, values):
+                    key, val = name.decode(errors="ignore"), coerce_value(raw.decode(errors="ignore"))
+                    if key == "time_tsnumber":
+                        new_ts = int(val)
+                        if current_ts is not None and current_block:
+                            emit_block(current_ts, current_block, outfh)
                             current_block = OrderedDict()
-                    except FileNotFoundError:
-                        pass
-                    time.sleep(poll_interval)
-                    continue
-                m = MON_RE.match(line)
-                if not m:
-                    continue
-                key, val = m.group(1), coerce_value(m.group(2))
-                if key == "time_tsnumber":
-                    new_ts = int(val)
-                    if current_ts is not None and current_block:
-                        emit_block(current_ts, current_block, outfh)
-                        current_block = OrderedDict()
-                    current_ts = new_ts
-                    current_block[key] = val
-                else:
-                    if current_ts is None:
-                        # ignore metrics until first time_tsnumber arrives
-                        continue
-                    if key in current_block:
-                        existing = current_block[key]
-                        if isinstance(existing, list):
-                            existing.append(val)
-                        else:
-                            current_block[key] = [existing, val]
-                    else:
+                        current_ts = new_ts
                         current_block[key] = val
+                    else:
+                        if current_ts is None:
+                            # ignore metrics until first time_tsnumber arrives
+                            continue
+                        if key in current_block:
+                            existing = current_block[key]
+                            if isinstance(existing, list):
+                                existing.append(val)
+                            else:
+                                current_block[key] = [existing, val]
+                        else:
+                            current_block[key] = val
+            if idle:
+                time.sleep(poll_interval)
     finally:
         if outfh is not None:
             outfh.close()
@@ -5,25 +5,40 @@ Convert ERA5 NetCDF atmospheric forcing into big-endian float32 binary files
 on the **model curvilinear grid**.
 
 All fields are bilinearly interpolated from the ERA5 0.25° regular grid to
-model cell-centre positions.  Wind components (uwind, vwind) are additionally
-rotated from geographic (east, north) to model-grid (i, j) directions.
+model cell-centre positions with a precomputed sparse operator (see
+interp_operator.py) applied to a whole TIME_CHUNK block at a time.  Wind
+components (uwind, vwind) are additionally rotated from geographic
+(east, north) to model-grid (i, j) directions.
 
 Because the output is already on the model grid, EXF interpolation must be
 disabled in data.exf (remove *_nlon / *_nlat / *_lon0 / *_lat0 / *_lon_inc /
 *_lat_inc entries from EXF_NML_04 for every field) and
 rotateStressOnAgrid = .FALSE.
+
+Every output is preallocated and filled one (variable, TIME_CHUNK block)
+task at a time, each task writing at its own record offset.  With
+``--workers N`` the tasks run on a process pool; the bytes written are the
+same as the serial run.  Each task holds roughly 2.5 GB at peak, so size N
+to the node memory rather than the core count.
+
+Completed blocks are recorded in a ``<name>.bin.manifest.json`` sidecar
+(see block_manifest.py), so a rerun after a killed job or an extended end
+date only computes missing or stale blocks and patches them in place.
+
+Usage:
+    python mk_exf_conditions.py config.yaml [--workers N]
 """
 
 import os
 import sys
-from spectre_utils import common
+from spectre_utils.block_manifest import (
+    BlockManifest, settings_hash, source_signature, write_block,
+)
+from spectre_utils.interp_operator import BilinearOperator, grid_hash
 import yaml
-from metpy.calc import specific_humidity_from_dewpoint
-from metpy.units import units
 from datetime import datetime
 import numpy as np
 import xarray as xr
-from scipy.interpolate import RegularGridInterpolator
 
 TIME_CHUNK = 744
 
@@ -84,78 +99,231 @@ def _open_var(working_directory, prefix, mitgcm_name, years, t1, t2):
 # Interpolation
 # ---------------------------------------------------------------------------
 
-def interp_scalar_chunk(era5_lat, era5_lon, data_2d, pts, Ny, Nx):
-    """Bilinear interpolation of a single 2-D ERA5 field to model grid points."""
-    interp = RegularGridInterpolator(
-        (era5_lat, era5_lon), data_2d, method="linear",
-        bounds_error=False, fill_value=None,
-    )
-    return interp(pts).reshape(Ny, Nx).astype(np.float32)
-
-
-def interp_and_rotate_wind_chunk(era5_lat, era5_lon, u_2d, v_2d,
-                                  pts, Ny, Nx, angleCS, angleSN):
-    """Interpolate u/v and rotate from geographic to model-grid axes."""
-    iu = RegularGridInterpolator(
-        (era5_lat, era5_lon), u_2d, method="linear",
-        bounds_error=False, fill_value=None,
-    )
-    iv = RegularGridInterpolator(
-        (era5_lat, era5_lon), v_2d, method="linear",
-        bounds_error=False, fill_value=None,
-    )
-    u_g = iu(pts).reshape(Ny, Nx)
-    v_g = iv(pts).reshape(Ny, Nx)
+def rotate_to_model_grid(u_g, v_g, angleCS, angleSN):
+    """Rotate interpolated (east, north) winds to model-grid (i, j) axes."""
     u_m = (u_g * angleCS + v_g * angleSN).astype(np.float32)
     v_m = (-u_g * angleSN + v_g * angleCS).astype(np.float32)
     return u_m, v_m
 
 
 # ---------------------------------------------------------------------------
-# Writers
+# Humidity
 # ---------------------------------------------------------------------------
 
-def write_scalar_on_model_grid(ds, varname, output_path,
-                                era5_lat, era5_lon, pts, Ny, Nx,
-                                scale_factor=None):
-    n_times = ds.sizes["valid_time"]
-    with open(output_path, "wb") as f:
-        for i in range(0, n_times, TIME_CHUNK):
-            chunk = ds[varname].isel(valid_time=slice(i, i + TIME_CHUNK)).values
-            if scale_factor is not None:
-                chunk = chunk * scale_factor
-            for k in range(chunk.shape[0]):
-                out = interp_scalar_chunk(era5_lat, era5_lon, chunk[k], pts, Ny, Nx)
-                out.astype(">f4").tofile(f)
-            pct = 100.0 * min(i + chunk.shape[0], n_times) / n_times
-            print(f"    {pct:.0f}%")
-
-
-def write_wind_on_model_grid(ds_u, ds_v, out_u_path, out_v_path,
-                              era5_lat, era5_lon, pts, Ny, Nx,
-                              angleCS, angleSN):
-    n_times = ds_u.sizes["valid_time"]
-    with open(out_u_path, "wb") as fu, open(out_v_path, "wb") as fv:
-        for i in range(0, n_times, TIME_CHUNK):
-            u_chunk = ds_u["uwind"].isel(valid_time=slice(i, i + TIME_CHUNK)).values
-            v_chunk = ds_v["vwind"].isel(valid_time=slice(i, i + TIME_CHUNK)).values
-            for k in range(u_chunk.shape[0]):
-                u_m, v_m = interp_and_rotate_wind_chunk(
-                    era5_lat, era5_lon, u_chunk[k], v_chunk[k],
-                    pts, Ny, Nx, angleCS, angleSN,
-                )
-                u_m.astype(">f4").tofile(fu)
-                v_m.astype(">f4").tofile(fv)
-            pct = 100.0 * min(i + u_chunk.shape[0], n_times) / n_times
-            print(f"    {pct:.0f}%")
+# Constants from metpy.constants (MetPy 1.7) so results track
+# metpy.calc.specific_humidity_from_dewpoint(phase="liquid").
+_CP_L = 4219.4                  # J kg-1 K-1, liquid water
+_CP_V = 1860.078011865639       # J kg-1 K-1, water vapour
+_RV = 461.52311572606084        # J kg-1 K-1
+_LV = 2500840.0                 # J kg-1, latent heat at T0
+_T0 = 273.16                    # K, triple point
+_E0 = 611.2                     # Pa, saturation vapour pressure at T0
+_EPSILON = 0.6219569100577033   # Mw / Md
+
+# Ambaum (2020) Eq. 13 with L(T) = Lv - (cpl - cpv)(T - T0), written in
+# x = T0 / T:  es = E0 * exp(_HP * ln(x) + _A - _B * x)
+_HP = (_CP_L - _CP_V) / _RV
+_A = (_LV / _T0 + (_CP_L - _CP_V)) / _RV
+_B = (_LV + (_CP_L - _CP_V) * _T0) / (_RV * _T0)
+
+# Records per pass in specific_humidity_from_dewpoint; bounds the scratch
+# buffer to a slab instead of a full TIME_CHUNK.
+AQH_SLAB = 48
+
+
+def specific_humidity_from_dewpoint(sp_pa, d2m_k, out=None, dtype=np.float32):
+    """Specific humidity [kg/kg] from surface pressure [Pa] and dewpoint [K].
+
+    Same formula as ``metpy.calc.specific_humidity_from_dewpoint`` over
+    liquid water, q = eps * es / (p - (1 - eps) * es), without pint.  Works
+    slab by slab along the leading (time) axis with one scratch slab; ``out``
+    may be ``d2m_k`` itself to compute in place.  Points where es >= p are
+    NaN, as in MetPy.
+    """
+    sp_pa = np.asarray(sp_pa)
+    d2m_k = np.asarray(d2m_k)
+    if out is None:
+        out = np.empty(d2m_k.shape, dtype=dtype)
+    if out.ndim < 1:
+        raise ValueError("specific_humidity_from_dewpoint expects arrays with a leading axis")
+
+    n = out.shape[0]
+    scratch = np.empty((min(AQH_SLAB, n),) + out.shape[1:], dtype=out.dtype)
+    for k in range(0, n, AQH_SLAB):
+        o = out[k:k + AQH_SLAB]
+        x = scratch[:o.shape[0]]
+        p = sp_pa[k:k + AQH_SLAB]
+
+        np.divide(_T0, d2m_k[k:k + AQH_SLAB], out=o)   # x = T0 / T
+        np.log(o, out=x)
+        x *= _HP
+        o *= -_B
+        o += x
+        o += _A
+        np.exp(o, out=o)
+        o *= _E0                                       # es [Pa]
+
+        np.multiply(o, -(1.0 - _EPSILON), out=x)
+        x += p                                         # p - (1 - eps) es
+        undefined = o >= p
+        o *= _EPSILON
+        o /= x
+        o[undefined] = np.nan
+    return out
+
+
+# ---------------------------------------------------------------------------
+# Block computation
+# ---------------------------------------------------------------------------
+
+# Per-process state for block tasks, filled by _init_worker.  In serial mode
+# it lives in the main process; with --workers each pool process has its own.
+_WORKER = {}
+
+
+def _init_worker(settings, serial_dask=False):
+    """Store shared settings and reset the per-process dataset cache."""
+    if serial_dask:
+        # Each pool process already owns a core; keep dask from spawning
+        # its own thread pool on top of that.
+        import dask
+        dask.config.set(scheduler="synchronous")
+    _WORKER.clear()
+    _WORKER.update(settings)
+    _WORKER["datasets"] = {}
+
+
+def _dataset(mitgcm_name):
+    """Open (once per process) the ERA5 dataset for ``mitgcm_name``."""
+    cache = _WORKER["datasets"]
+    if mitgcm_name not in cache:
+        cache[mitgcm_name] = _open_var(
+            _WORKER["working_directory"], _WORKER["prefix"], mitgcm_name,
+            _WORKER["years"], _WORKER["t1"], _WORKER["t2"],
+        )
+    return cache[mitgcm_name]
+
+
+def _close_datasets():
+    for ds in _WORKER.get("datasets", {}).values():
+        ds.close()
+    _WORKER["datasets"] = {}
+
+
+def _read_block(mitgcm_name, i):
+    ds = _dataset(mitgcm_name)
+    return ds[mitgcm_name].isel(valid_time=slice(i, i + TIME_CHUNK)).values
+
+
+def compute_block(job, i):
+    """Interpolate records ``[i, i + TIME_CHUNK)`` of ``job`` to the model grid.
+
+    Returns one float32 ``(nt, Ny, Nx)`` array per output path of the job.
+    """
+    op = _WORKER["op"]
+    kind = job["kind"]
+    if kind == "scalar":
+        chunk = _read_block(job["name"], i)
+        if job.get("scale_factor") is not None:
+            chunk = chunk * job["scale_factor"]
+        return [op.apply(chunk).astype(np.float32)]
+    if kind == "wind":
+        u_m, v_m = rotate_to_model_grid(
+            op.apply(_read_block("uwind", i)), op.apply(_read_block("vwind", i)),
+            _WORKER["angleCS"], _WORKER["angleSN"],
+        )
+        return [u_m, v_m]
+    if kind == "aqh":
+        # d2m and sp are read once; aqh is computed in place in the float32
+        # d2m buffer and goes straight into the interpolation.
+        d2m_k = np.asarray(_read_block("d2m", i), dtype=np.float32)
+        sp_pa = _read_block("sp", i)
+        if not d2m_k.flags.writeable:
+            d2m_k = d2m_k.copy()
+        aqh_era = specific_humidity_from_dewpoint(sp_pa, d2m_k, out=d2m_k)
+        return [op.apply(aqh_era).astype(np.float32)]
+    raise ValueError(f"Unknown EXF job kind: {kind}")
+
+
+def run_block(job, i):
+    """Compute one time block of ``job`` and write it at its record offset."""
+    for path, block in zip(job["paths"], compute_block(job, i)):
+        write_block(path, i, block)
+    return job["name"], i
+
+
+# ---------------------------------------------------------------------------
+# Job planning
+# ---------------------------------------------------------------------------
+
+def plan_jobs(atm_vars, computed_vars, simulation_input_dir):
+    """List the output jobs: one per scalar, one for the wind pair, one per computed var.
+
+    Each job is a dict with ``name``, ``kind``, ``sources`` (ERA5 variables
+    read), ``paths`` (output .bin files) and an optional ``scale_factor``.
+    """
+    jobs = []
+    written = set()
+    for var in atm_vars:
+        mitgcm_name = var["mitgcm_name"]
+        if mitgcm_name in written or mitgcm_name in WIND_VARS:
+            continue
+        written.add(mitgcm_name)
+        jobs.append({
+            "name": mitgcm_name,
+            "kind": "scalar",
+            "sources": [mitgcm_name],
+            "paths": [os.path.join(simulation_input_dir, f"{mitgcm_name}.bin")],
+            "scale_factor": var.get("scale_factor"),
+        })
+
+    jobs.append({
+        "name": "uwind+vwind",
+        "kind": "wind",
+        "sources": ["uwind", "vwind"],
+        "paths": [
+            os.path.join(simulation_input_dir, "uwind.bin"),
+            os.path.join(simulation_input_dir, "vwind.bin"),
+        ],
+    })
+
+    for cv in computed_vars:
+        mitgcm_name = cv["mitgcm_name"]
+        jobs.append({
+            "name": mitgcm_name,
+            "kind": "aqh",
+            "kernel": "numpy-f32",
+            "sources": ["d2m", "sp"],
+            "paths": [os.path.join(simulation_input_dir, f"{mitgcm_name}.bin")],
+        })
+    return jobs
+
+
+def block_sources(job, times, i, working_directory, prefix):
+    """Signature of the ERA5 files that records ``[i, i + TIME_CHUNK)`` read from."""
+    block_years = np.unique(times[i:i + TIME_CHUNK].astype("datetime64[Y]").astype(int) + 1970)
+    paths = [
+        f"{working_directory}/{prefix}_{src}_{year}.nc"
+        for src in job["sources"] for year in block_years
+    ]
+    return source_signature(paths)
 
 
 # ---------------------------------------------------------------------------
 # Main
 # ---------------------------------------------------------------------------
 
+def parse_args():
+    import argparse
+    parser = argparse.ArgumentParser(description="Interpolate ERA5 forcing to EXF binaries on the model grid.")
+    parser.add_argument("config_file", type=str, help="Path to the configuration file.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Process-pool size; each (variable, time block) is one task")
+    return parser.parse_args()
+
+
 def main():
-    args = common.cli()
+    args = parse_args()
     with open(args.config_file, "r") as f:
         config = yaml.safe_load(f)
 
@@ -187,69 +355,92 @@ def main():
     # ERA5 grid (after latitude flip: south-to-north)
     era5_lat = np.linspace(20.0, 60.0, 161)
     era5_lon = np.linspace(-90.0, -10.0, 321)
-    pts = np.column_stack([yC.ravel(), xC.ravel()])
-
-    # --- Process scalar variables ---
-    written = set()
-    for var in atm_vars:
-        mitgcm_name = var["mitgcm_name"]
-        if mitgcm_name in written or mitgcm_name in WIND_VARS:
-            continue
-        written.add(mitgcm_name)
-
-        print(f"Processing {mitgcm_name}...")
-        scale_factor = var.get("scale_factor")
-        ds = _open_var(working_directory, prefix, mitgcm_name, years, t1, t2)
-        output_path = os.path.join(simulation_input_dir, f"{mitgcm_name}.bin")
-        write_scalar_on_model_grid(
-            ds, mitgcm_name, output_path,
-            era5_lat, era5_lon, pts, Ny, Nx,
-            scale_factor=scale_factor,
-        )
-        ds.close()
-
-    # --- Process wind vector (interpolate + rotate) ---
-    print("Processing uwind + vwind (vector interpolation + rotation)...")
-    ds_u = _open_var(working_directory, prefix, "uwind", years, t1, t2)
-    ds_v = _open_var(working_directory, prefix, "vwind", years, t1, t2)
-    write_wind_on_model_grid(
-        ds_u, ds_v,
-        os.path.join(simulation_input_dir, "uwind.bin"),
-        os.path.join(simulation_input_dir, "vwind.bin"),
-        era5_lat, era5_lon, pts, Ny, Nx,
-        angleCS, angleSN,
-    )
-    ds_u.close()
-    ds_v.close()
-
-    # --- Computed variables (aqh from d2m + sp) ---
-    for cv in computed_vars:
-        mitgcm_name = cv["mitgcm_name"]
-        print(f"Computing {mitgcm_name}...")
-        ds_d2m = _open_var(working_directory, prefix, "d2m", years, t1, t2)
-        ds_sp = _open_var(working_directory, prefix, "sp", years, t1, t2)
-        n_times = ds_d2m.sizes["valid_time"]
-
-        output_path = os.path.join(simulation_input_dir, f"{mitgcm_name}.bin")
-        with open(output_path, "wb") as f:
-            for i in range(0, n_times, TIME_CHUNK):
-                d2m_k = ds_d2m["d2m"].isel(valid_time=slice(i, i + TIME_CHUNK)).values
-                sp_pa = ds_sp["sp"].isel(valid_time=slice(i, i + TIME_CHUNK)).values
-                aqh_era = np.array(
-                    specific_humidity_from_dewpoint(
-                        sp_pa * units.Pa, (d2m_k - 273.15) * units.degC
-                    )
-                )
-                for k in range(aqh_era.shape[0]):
-                    out = interp_scalar_chunk(
-                        era5_lat, era5_lon, aqh_era[k], pts, Ny, Nx,
-                    )
-                    out.astype(">f4").tofile(f)
-                pct = 100.0 * min(i + aqh_era.shape[0], n_times) / n_times
-                print(f"    {pct:.0f}%")
-
-        ds_d2m.close()
-        ds_sp.close()
+    op = BilinearOperator.cached(era5_lat, era5_lon, yC, xC, simulation_input_dir)
+
+    settings = {
+        "working_directory": working_directory,
+        "prefix": prefix,
+        "years": years,
+        "t1": t1,
+        "t2": t2,
+        "op": op,
+        "angleCS": angleCS,
+        "angleSN": angleSN,
+    }
+    _init_worker(settings)
+
+    # --- Plan (job, time block) tasks against each output's manifest ---
+    # t2 is left out of the settings hash so extending the end date keeps
+    # every block that is already complete.
+    grid_key = grid_hash(era5_lat, era5_lon, yC, xC)
+    jobs = plan_jobs(atm_vars, computed_vars, simulation_input_dir)
+    tasks = []
+    for job in jobs:
+        times = _dataset(job["sources"][0])["valid_time"].values
+        n_times = len(times)
+        for src in job["sources"][1:]:
+            if _dataset(src).sizes["valid_time"] != n_times:
+                print(f"Record count mismatch between {job['sources']} for {job['name']}",
+                      file=sys.stderr)
+                sys.exit(1)
+        job["n_times"] = n_times
+        job_settings = {
+            "kind": job["kind"],
+            "sources": job["sources"],
+            "scale_factor": job.get("scale_factor"),
+            "t1": t1,
+            "time_chunk": TIME_CHUNK,
+            "grid": grid_key,
+        }
+        if job["kind"] == "aqh":
+            # Only aqh blocks depend on the humidity kernel
+            job_settings["kernel"] = job["kernel"]
+        job_hash = settings_hash(job_settings)
+        job["manifests"] = [BlockManifest(p, job_hash, Ny * Nx * 4) for p in job["paths"]]
+        for m in job["manifests"]:
+            m.prepare(n_times)
+
+        n_blocks = n_stale = 0
+        for i in range(0, n_times, TIME_CHUNK):
+            n = min(TIME_CHUNK, n_times - i)
+            sources = block_sources(job, times, i, working_directory, prefix)
+            n_blocks += 1
+            if all(m.is_complete(i, n, sources) for m in job["manifests"]):
+                continue
+            n_stale += 1
+            tasks.append((job, i, n, sources))
+        print(f"  {job['name']}: {n_times} records, {n_stale}/{n_blocks} blocks to compute -> "
+              f"{', '.join(os.path.basename(p) for p in job['paths'])}")
+    _close_datasets()
+
+    # --- Run tasks; every block lands at its own byte offset ---
+    n_tasks = len(tasks)
+    if n_tasks == 0:
+        print("All EXF blocks are up to date.")
+    elif args.workers > 1:
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+        print(f"Processing {n_tasks} blocks on {args.workers} workers...")
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                                 initargs=(settings, True)) as pool:
+            futures = {
+                pool.submit(run_block, job, i): (job, i, n, sources)
+                for job, i, n, sources in tasks
+            }
+            for done, fut in enumerate(as_completed(futures), start=1):
+                fut.result()
+                job, i, n, sources = futures[fut]
+                for m in job["manifests"]:
+                    m.mark_complete(i, n, sources)
+                print(f"    {job['name']} records {i}+ done ({done}/{n_tasks})")
+    else:
+        print(f"Processing {n_tasks} blocks serially...")
+        for done, (job, i, n, sources) in enumerate(tasks, start=1):
+            run_block(job, i)
+            for m in job["manifests"]:
+                m.mark_complete(i, n, sources)
+            pct = 100.0 * (i + n) / job["n_times"]
+            print(f"    {job['name']} {pct:.0f}% ({done}/{n_tasks})")
+        _close_datasets()
 
     print("Done — all EXF fields written on model grid.")
 
@@ -26,8 +26,8 @@ import numpy as np
 import xarray as xr
 import yaml
 from datetime import datetime
-from scipy.interpolate import RegularGridInterpolator
 from spectre_utils import common
+from spectre_utils.interp_operator import BilinearOperator
 
 TIME_CHUNK = 744
 
@@ -62,17 +62,6 @@ def compute_rotation_angles(xC, yC):
     return np.cos(angle), np.sin(angle)
 
 
-def build_interpolators(era5_lat, era5_lon, u_data, v_data):
-    """Build RegularGridInterpolator objects for u and v."""
-    interp_u = RegularGridInterpolator(
-        (era5_lat, era5_lon), u_data, method="linear", bounds_error=False, fill_value=None
-    )
-    interp_v = RegularGridInterpolator(
-        (era5_lat, era5_lon), v_data, method="linear", bounds_error=False, fill_value=None
-    )
-    return interp_u, interp_v
-
-
 def main():
     args = common.cli()
     with open(args.config_file, "r") as f:
@@ -103,8 +92,8 @@ def main():
     era5_lat = np.linspace(20.0, 60.0, NY_ERA)  # south-to-north
     era5_lon = np.linspace(-90.0, -10.0, NX_ERA)
 
-    # Model grid points for interpolation (flattened, then reshaped after)
-    pts = np.column_stack([yC.ravel(), xC.ravel()])
+    # Bilinear weights ERA5 -> model grid, built once and cached in input/
+    op = BilinearOperator.cached(era5_lat, era5_lon, yC, xC, input_dir)
 
     # ERA5 binary paths
     uwind_path = os.path.join(input_dir, "uwind.bin")
@@ -133,18 +122,13 @@ def main():
             u_era = np.fromfile(fu_in, dtype=">f4", count=n * rec_size).reshape(n, NY_ERA, NX_ERA)
             v_era = np.fromfile(fv_in, dtype=">f4", count=n * rec_size).reshape(n, NY_ERA, NX_ERA)
 
-            u_out = np.empty((n, Ny, Nx), dtype=np.float32)
-            v_out = np.empty((n, Ny, Nx), dtype=np.float32)
-
-            for k in range(n):
-                # Bilinear interpolation to model grid
-                interp_u, interp_v = build_interpolators(era5_lat, era5_lon, u_era[k], v_era[k])
-                u_interp = interp_u(pts).reshape(Ny, Nx)
-                v_interp = interp_v(pts).reshape(Ny, Nx)
+            # Bilinear interpolation of the whole block to model grid
+            u_interp = op.apply(u_era)
+            v_interp = op.apply(v_era)
 
-                # Rotate from geographic (east, north) to model grid (i, j)
-                u_out[k] = u_interp * angleCS + v_interp * angleSN
-                v_out[k] = -u_interp * angleSN + v_interp * angleCS
+            # Rotate from geographic (east, north) to model grid (i, j)
+            u_out = (u_interp * angleCS + v_interp * angleSN).astype(np.float32)
+            v_out = (-u_interp * angleSN + v_interp * angleCS).astype(np.float32)
 
             u_out.astype(">f4").tofile(fu_out)
             v_out.astype(">f4").tofile(fv_out)
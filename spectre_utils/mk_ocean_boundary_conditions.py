@@ -1,31 +1,88 @@
 import yaml
 import os
-import xarray as xr
+import re
+import glob
+import netCDF4
 import numpy as np
 from spectre_utils import common
-import xgcm
-
-
-def get_ocean_state(working_directory):
-
-    # TO DO : when we have multiple nc files per var, we'll need to use open_mfdataset
-    S = xr.open_mfdataset(f"{working_directory}/glorysv12_S_glorys12_raw.*.nc")['vosaline']
-    T = xr.open_mfdataset(f"{working_directory}/glorysv12_T_glorys12_raw.*.nc")['votemper']
-    U = xr.open_mfdataset(f"{working_directory}/glorysv12_U_glorys12_raw.*.nc")['vozocrtx']
-    V = xr.open_mfdataset(f"{working_directory}/glorysv12_V_glorys12_raw.*.nc")['vomecrty']
-    Eta = xr.open_mfdataset(f"{working_directory}/glorysv12_grid2D_glorys12_raw.*.nc")['sossheig']
-
-    U = U.fillna(0)
-    V = V.fillna(0)
-    T = T.fillna(0)
-    S = S.fillna(0)
-    Eta = Eta.fillna(0)
-
-    return U, V, T, S, Eta
+from spectre_utils.block_manifest import (
+    BlockManifest, settings_hash, source_signature, write_block,
+)
+
+# OBC variable -> (GLORYS file tag, NetCDF variable name)
+OBC_VARS = {
+    "U": ("U", "vozocrtx"),
+    "V": ("V", "vomecrty"),
+    "T": ("T", "votemper"),
+    "S": ("S", "vosaline"),
+    "Eta": ("grid2D", "sossheig"),
+}
+
+BOUNDARIES = ("south", "north", "west", "east")
+
+
+def source_files(working_directory, prefix, tag):
+    """GLORYS chunk files ``{prefix}_{tag}_glorys12_raw.<n>.nc`` as ``{n: path}``."""
+    pattern = re.compile(r"\.(\d+)\.nc$")
+    files = {}
+    for fp in glob.glob(f"{working_directory}/{prefix}_{tag}_glorys12_raw.*.nc"):
+        m = pattern.search(fp)
+        if m:
+            files[int(m.group(1))] = fp
+    return dict(sorted(files.items()))
+
+
+def boundary_selections(var, i0, i1, j0, j1, nx, ny):
+    """Index per horizontal dimension for each open boundary of ``var``.
+
+    U sits on the eastern cell face, so along the south/north boundaries it is
+    one point narrower than the tracer points (C-grid stagger).  Negative
+    indices are resolved against ``nx``/``ny``.
+    """
+    i0, i1 = (i % nx if i < 0 else i for i in (i0, i1))
+    j0, j1 = (j % ny if j < 0 else j for j in (j0, j1))
+    di = 1 if var == "U" else 0
+    return {
+        "south": dict(y=j0, x=slice(i0, i1 - di)),
+        "north": dict(y=j1, x=slice(i0, i1 - di)),
+        "west": dict(y=slice(j0, j1), x=i0),
+        "east": dict(y=slice(j0, j1), x=i1),
+    }
+
+
+def boundary_shape(sizes, selection):
+    """Per-record shape of one boundary, from the ``{dim: size}`` of the variable.
+
+    Integer-indexed dimensions are dropped and slices are clipped to the
+    dimension size, as in the hyperslab read; ``time_counter`` is left out.
+    """
+    shape = []
+    for dim, size in sizes.items():
+        if dim == "time_counter":
+            continue
+        sel = selection.get(dim, slice(None))
+        if isinstance(sel, slice):
+            shape.append(len(range(*sel.indices(size))))
+    return tuple(shape)
+
+
+def read_boundaries(nc_var, selections, bnds):
+    """Hyperslab-read boundaries ``bnds`` of an open netCDF4 variable.
+
+    Only the boundary rows/columns are read from disk.  Missing values
+    (land) become 0, matching ``fillna(0)`` on the decoded field.
+    """
+    slabs = {}
+    for bnd in bnds:
+        sel = selections[bnd]
+        key = tuple(sel.get(dim, slice(None)) for dim in nc_var.dimensions)
+        slab = np.ma.filled(nc_var[key], np.nan)
+        slabs[bnd] = np.nan_to_num(slab, nan=0.0, copy=False)
+    return slabs
 
 
 def main():
-    
+
     args = common.cli()
 
     # Load configuration from YAML file
@@ -40,118 +97,84 @@ def main():
     if not os.path.exists(simulation_input_dir):
         os.makedirs(simulation_input_dir)
 
-
+    prefix = config.get("ocean", {}).get("prefix", "glorysv12")
     i0 = config.get("domain",{}).get("longitude",{}).get("start",2)
     i1 = config.get("domain",{}).get("longitude",{}).get("end",-2)
     j0 = config.get("domain",{}).get("latitude",{}).get("start",2)
     j1 = config.get("domain",{}).get("latitude",{}).get("end",-2)
-    
-    U, V, T, S, Eta = get_ocean_state(working_directory)
-    print(U.coords)
 
-    # Write each component to a big-endian single precision binary file
+    # Each source file is one time block of every {var}.{boundary}.bin.  A
+    # sidecar manifest per output records which blocks are already written
+    # (see block_manifest.py), so reruns only process new or modified files.
+    # Files are visited once, in chunk (time) order; only the four boundary
+    # slabs are read, so memory is bounded by one file's boundary slabs.
+    files = {}
+    counts = {}
+    selections = {}
+    manifests = {}
+    for var, (tag, ncvar) in OBC_VARS.items():
+        files[var] = source_files(working_directory, prefix, tag)
+        if not files[var]:
+            raise FileNotFoundError(f"No {prefix}_{tag} files found in {working_directory}")
+
+        # Record counts per file and the per-record shape of each boundary,
+        # from the NetCDF headers only.
+        counts[var] = {}
+        for n, fp in files[var].items():
+            with netCDF4.Dataset(fp) as nc:
+                counts[var][n] = len(nc.dimensions["time_counter"])
+        with netCDF4.Dataset(next(iter(files[var].values()))) as nc:
+            nc_var = nc.variables[ncvar]
+            sizes = dict(zip(nc_var.dimensions, nc_var.shape))
+            selections[var] = boundary_selections(var, i0, i1, j0, j1, sizes["x"], sizes["y"])
+            rec_shapes = {
+                bnd: boundary_shape(sizes, sel) for bnd, sel in selections[var].items()
+            }
+        n_records = sum(counts[var].values())
+
+        for bnd in BOUNDARIES:
+            bnd_hash = settings_hash({
+                "var": var, "boundary": bnd, "ncvar": ncvar,
+                "i0": i0, "i1": i1, "j0": j0, "j1": j1,
+            })
+            path = os.path.join(simulation_input_dir, f"{var}.{bnd}.bin")
+            m = BlockManifest(path, bnd_hash, int(np.prod(rec_shapes[bnd])) * 4)
+            m.prepare(n_records)
+            manifests[(var, bnd)] = m
+            print(f"{var}_{bnd} shape: {(n_records,) + tuple(rec_shapes[bnd])}")
+
+    offsets = {
+        var: dict(zip(counts[var], np.cumsum([0] + list(counts[var].values())[:-1])))
+        for var in OBC_VARS
+    }
+    chunks = sorted(set().union(*(files[var] for var in OBC_VARS)))
 
-    # South
     print("========================================")
-    print(" Writing south boundary conditions ")
+    print(f" Writing boundary conditions from {len(chunks)} source chunks ")
     print("")
-    u = U.isel(y=j0,x=slice(i0,i1-1),drop=True)
-    v = V.isel(y=j0,x=slice(i0,i1),drop=True)
-    t = T.isel(y=j0,x=slice(i0,i1),drop=True)
-    s = S.isel(y=j0,x=slice(i0,i1),drop=True)
-    eta = Eta.isel(y=j0,x=slice(i0,i1),drop=True)
-
-    with open(os.path.join(simulation_input_dir, 'U.south.bin'), 'wb') as f:
-        (u.values).astype('>f4').tofile(f)
-    print(f"U_south shape: {u.shape}")
-    with open(os.path.join(simulation_input_dir, 'V.south.bin'), 'wb') as f:
-        (v.values).astype('>f4').tofile(f)
-    print(f"V_south shape: {v.shape}")
-    with open(os.path.join(simulation_input_dir, 'T.south.bin'), 'wb') as f:
-        (t.values).astype('>f4').tofile(f)
-    print(f"T_south shape: {t.shape}")
-    with open(os.path.join(simulation_input_dir, 'S.south.bin'), 'wb') as f:
-        (s.values).astype('>f4').tofile(f)
-    print(f"S_south shape: {s.shape}")
-    with open(os.path.join(simulation_input_dir, 'Eta.south.bin'), 'wb') as f:
-        (eta.values).astype('>f4').tofile(f)
-    print(f"Eta_south shape: {eta.shape}")
-
-    # North
-    print("========================================")
-    print(" Writing north boundary conditions ")
-    print("")
-    u = U.isel(y=j1,x=slice(i0,i1-1),drop=True)
-    v = V.isel(y=j1,x=slice(i0,i1),drop=True)
-    t = T.isel(y=j1,x=slice(i0,i1),drop=True)
-    s = S.isel(y=j1,x=slice(i0,i1),drop=True)
-    eta = Eta.isel(y=j1,x=slice(i0,i1),drop=True)
-
-    with open(os.path.join(simulation_input_dir, 'U.north.bin'), 'wb') as f:
-        (u.values).astype('>f4').tofile(f)
-        print(f"U_north shape: {u.shape}")
-    with open(os.path.join(simulation_input_dir, 'V.north.bin'), 'wb') as f:
-        (v.values).astype('>f4').tofile(f)
-        print(f"V_north shape: {v.shape}")
-    with open(os.path.join(simulation_input_dir, 'T.north.bin'), 'wb') as f:
-        (t.values).astype('>f4').tofile(f)
-        print(f"T_north shape: {t.shape}")
-    with open(os.path.join(simulation_input_dir, 'S.north.bin'), 'wb') as f:
-        (s.values).astype('>f4').tofile(f)
-        print(f"S_north shape: {s.shape}")
-    with open(os.path.join(simulation_input_dir, 'Eta.north.bin'), 'wb') as f:
-        (eta.values).astype('>f4').tofile(f)
-        print(f"Eta_north shape: {eta.shape}")
-
-    # West
-    print("========================================")
-    print(" Writing west boundary conditions ")
-    print("")
-    u   = U.isel(y=slice(j0,j1),x=i0,drop=True)
-    v   = V.isel(y=slice(j0,j1),x=i0,drop=True)
-    t   = T.isel(y=slice(j0,j1),x=i0,drop=True)
-    s   = S.isel(y=slice(j0,j1),x=i0,drop=True)
-    eta = Eta.isel(y=slice(j0,j1),x=i0,drop=True)
-
-    with open(os.path.join(simulation_input_dir, 'U.west.bin'), 'wb') as f:
-        (u.values).astype('>f4').tofile(f)
-        print(f"U_west shape: {u.shape}")
-    with open(os.path.join(simulation_input_dir, 'V.west.bin'), 'wb') as f:
-        (v.values).astype('>f4').tofile(f)
-        print(f"V_west shape: {v.shape}")
-    with open(os.path.join(simulation_input_dir, 'T.west.bin'), 'wb') as f:
-        (t.values).astype('>f4').tofile(f)
-        print(f"T_west shape: {t.shape}")
-    with open(os.path.join(simulation_input_dir, 'S.west.bin'), 'wb') as f:
-        (s.values).astype('>f4').tofile(f)
-        print(f"S_west shape: {s.shape}")
-    with open(os.path.join(simulation_input_dir, 'Eta.west.bin'), 'wb') as f:
-        (eta.values).astype('>f4').tofile(f)
-
-    # East
-    print("========================================")
-    print(" Writing east boundary conditions ")
-    print("")
-    u   = U.isel(y=slice(j0,j1),x=i1,drop=True)
-    v   = V.isel(y=slice(j0,j1),x=i1,drop=True)
-    t   = T.isel(y=slice(j0,j1),x=i1,drop=True)
-    s   = S.isel(y=slice(j0,j1),x=i1,drop=True)
-    eta = Eta.isel(y=slice(j0,j1),x=i1,drop=True)
-
-    with open(os.path.join(simulation_input_dir, 'U.east.bin'), 'wb') as f:
-        (u.values).astype('>f4').tofile(f)
-        print(f"U_east shape: {u.shape}")
-    with open(os.path.join(simulation_input_dir, 'V.east.bin'), 'wb') as f:
-        (v.values).astype('>f4').tofile(f)
-        print(f"V_east shape: {v.shape}")
-    with open(os.path.join(simulation_input_dir, 'T.east.bin'), 'wb') as f:
-        (t.values).astype('>f4').tofile(f)
-        print(f"T_east shape: {t.shape}")
-    with open(os.path.join(simulation_input_dir, 'S.east.bin'), 'wb') as f:
-        (s.values).astype('>f4').tofile(f)
-        print(f"S_east shape: {s.shape}")
-    with open(os.path.join(simulation_input_dir, 'Eta.east.bin'), 'wb') as f:
-        (eta.values).astype('>f4').tofile(f)
-      
+    n_read = 0
+    for n in chunks:
+        for var, (tag, ncvar) in OBC_VARS.items():
+            if n not in files[var]:
+                continue
+            fp = files[var][n]
+            first, count = int(offsets[var][n]), counts[var][n]
+            sources = source_signature([fp])
+            stale = [
+                bnd for bnd in BOUNDARIES
+                if not manifests[(var, bnd)].is_complete(first, count, sources)
+            ]
+            if not stale:
+                continue
+            with netCDF4.Dataset(fp) as nc:
+                slabs = read_boundaries(nc.variables[ncvar], selections[var], stale)
+            for bnd, slab in slabs.items():
+                m = manifests[(var, bnd)]
+                write_block(m.bin_path, first, slab)
+                m.mark_complete(first, count, sources)
+            n_read += 1
+        print(f"  chunk {n} done")
+    print(f"  {n_read} source files read")
+
 if __name__ == "__main__":
     main()
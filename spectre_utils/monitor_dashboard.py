@@ -6,13 +6,26 @@ Live-updating MITgcm monitor dashboard with multi-run support.
 Watches a simulation directory for run subdirectories containing STDOUT.0000.
 Each discovered run is selectable from a dropdown in the browser.
 
+``/data?run=<run>`` returns the full monitor history; with ``&since=<tsnumber>``
+only the samples after that time step are returned (``"since"`` is set in the
+response), and the page appends them to its charts.  The page fetches the full
+history again when the response's ``layout`` differs from what it holds.
+
+Traces are min/max decimated to ``--max-points`` samples each (``&points=N``
+overrides, 0 = all), so the page stays responsive on long runs.  Dragging on a
+chart zooms in: the page then requests ``&from=<iso>&to=<iso>``, decimated the
+same way, which is full resolution once the window holds fewer samples.
+
+Parsed records are checkpointed to ``<run>/STDOUT.0000.moncache.npz`` (every
+5 minutes while a run grows), so a restart resumes from the saved offset
+rather than re-parsing each STDOUT; ``--no-cache`` disables this.
+
 Usage:
-    python monitor_dashboard.py <simulation_dir> [--port 8050] [--poll 30]
+    python monitor_dashboard.py <simulation_dir> [--port 8050] [--poll 30] [--max-points 2000]
 
     simulation_dir: e.g. simulations/glorysv12-curvilinear/
 """
 
-import re
 import sys
 import json
 import argparse
@@ -22,6 +35,11 @@ from http.server import HTTPServer, BaseHTTPRequestHandler
 from datetime import datetime, timedelta
 from urllib.parse import urlparse, parse_qs
 
+import numpy as np
+
+from spectre_utils.mon_scan import MonScanner, split_records
+from spectre_utils.monitor_records import MonitorCache, MonitorRecords, TraceWindow, query_window
+
 # ---------------------------------------------------------------------------
 # Human-readable panel definitions
 # ---------------------------------------------------------------------------
@@ -76,45 +94,36 @@ RAW_LABELS = {
 # ---------------------------------------------------------------------------
 
 class StdoutWatcher:
-    _pattern = re.compile(r'%MON\s+(\S+)\s+=\s+(\S+)')
+    """Incrementally parse %MON records from one STDOUT.
 
-    def __init__(self, path):
+    With ``cache``, the parse state is checkpointed next to the STDOUT (see
+    monitor_records.MonitorCache) and restored on start-up.
+    """
+    def __init__(self, path, cache=True):
         self.path = path
-        self.records = []
+        self.records = MonitorRecords()
         self._offset = 0
         self._current = {}
+        self._cache = MonitorCache(path) if cache else None
+        if self._cache:
+            self.records, self._offset, self._current = (
+                self._cache.load() or (self.records, self._offset, self._current))
+        self._scanner = MonScanner(path, self._offset)
         self._json_cache = None
+        self._slurm = None      # (slurm_info, wall_start), refreshed with new records
 
     def poll(self):
-        try:
-            size = os.path.getsize(self.path)
-        except OSError:
-            return False
-        if size <= self._offset:
-            return False
         new_records = 0
-        with open(self.path, "r") as f:
-            f.seek(self._offset)
-            for line in f:
-                m = self._pattern.search(line)
-                if not m:
-                    continue
-                name, val_str = m.group(1), m.group(2)
-                try:
-                    val = int(val_str)
-                except ValueError:
-                    try:
-                        val = float(val_str.replace("D", "E"))
-                    except ValueError:
-                        continue
-                if name == "time_tsnumber" and self._current:
-                    self.records.append(self._current)
-                    self._current = {}
-                    new_records += 1
-                self._current[name] = val
-            self._offset = f.tell()
+        for names, values in self._scanner.read():
+            columns, n, int_keys, self._current = split_records(names, values, self._current)
+            self.records.extend(columns, n, int_keys)
+            new_records += n
+        self._offset = self._scanner.offset
         if new_records > 0:
             self._json_cache = None
+            self._slurm = None
+            if self._cache:
+                self._cache.save(self.records, self._offset, self._current)
         return new_records > 0
 
 
@@ -177,13 +186,20 @@ def get_slurm_info(run_dir):
 # JSON builders
 # ---------------------------------------------------------------------------
 
-def records_to_json(records, start_date, slurm_info=None, wall_start=None):
-    t0 = datetime.strptime(start_date, "%Y-%m-%d")
-    times = [(t0 + timedelta(seconds=r.get("time_secondsf", 0))).isoformat() for r in records]
-
-    all_keys = set()
-    for r in records:
-        all_keys.update(r.keys())
+def records_to_json(records, start_date, slurm_info=None, wall_start=None, since=None,
+                    points=None, window=None):
+    """Dashboard JSON for all records, or only those after time step ``since``.
+
+    Each trace is decimated to at most ``points`` samples (None/0 = all).
+    ``window`` = (lo, hi) in model seconds restricts the records to that
+    time range, for the full-resolution view of a zoomed chart.
+    """
+    start, stop = 0, len(records)
+    if window is not None:
+        start, stop = records.between("time_secondsf", *window)
+    if since is not None:
+        start = max(start, records.after("time_tsnumber", since))
+    traces_of = TraceWindow(records, start_date, start, stop, points)
 
     panels_data = []
     for panel in PANELS:
@@ -191,11 +207,9 @@ def records_to_json(records, start_date, slurm_info=None, wall_start=None):
         is_raw = panel.get("raw", False)
         if is_raw:
             for var in panel["vars"]:
-                if var not in all_keys:
-                    continue
-                values = [r.get(var) for r in records]
-                if all(v is None for v in values):
+                if not records.has_data(var):
                     continue
+                times, values = traces_of.xy(var)
                 label = RAW_LABELS.get(var, var)
                 traces.append({"name": label, "x": times, "y": values,
                                "mode": "lines", "visible": True})
@@ -203,11 +217,9 @@ def records_to_json(records, start_date, slurm_info=None, wall_start=None):
             for base_var in panel["vars"]:
                 for suffix in STAT_SUFFIXES:
                     key = base_var + suffix
-                    if key not in all_keys:
-                        continue
-                    values = [r.get(key) for r in records]
-                    if all(v is None for v in values):
+                    if not records.has_data(key):
                         continue
+                    times, values = traces_of.xy(key)
                     label = suffix.replace("_", "").capitalize()
                     if len(panel["vars"]) > 1:
                         short = base_var.split("_", 1)[-1]
@@ -216,18 +228,16 @@ def records_to_json(records, start_date, slurm_info=None, wall_start=None):
                     visible = True if suffix in ("_max", "_mean", "_min") else "legendonly"
                     traces.append({"name": label, "x": times, "y": values,
                                    "mode": "lines", "line": {"dash": dash}, "visible": visible})
-                if base_var in all_keys:
-                    values = [r.get(base_var) for r in records]
-                    if not all(v is None for v in values):
-                        traces.append({"name": base_var, "x": times, "y": values, "mode": "lines"})
+                if records.has_data(base_var):
+                    times, values = traces_of.xy(base_var)
+                    traces.append({"name": base_var, "x": times, "y": values, "mode": "lines"})
         if traces:
             panels_data.append({
                 "title": f"{panel['title']} ({panel['unit']})" if panel["unit"] else panel["title"],
                 "unit": panel["unit"], "traces": traces,
             })
 
-    last = records[-1] if records else {}
-    model_days = last.get("time_secondsf", 0) / 86400.0
+    model_days = records.value("time_secondsf", -1, 0) / 86400.0
     throughput = None
     if wall_start and model_days > 0:
         wall_hours = (datetime.now() - wall_start).total_seconds() / 3600.0
@@ -235,9 +245,11 @@ def records_to_json(records, start_date, slurm_info=None, wall_start=None):
             throughput = round(model_days / wall_hours, 2)
 
     result = {
-        "n_steps": last.get("time_tsnumber", 0),
+        "n_steps": records.value("time_tsnumber", -1, 0),
         "model_days": model_days,
         "n_records": len(records),
+        "since": since,
+        "layout": records.layout,
         "generated": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         "throughput": throughput,
         "panels": panels_data,
@@ -270,6 +282,7 @@ DASHBOARD_HTML = """<!DOCTYPE html>
 <title>MITgcm Live Monitor</title>
 <script src="https://cdn.jsdelivr.net/npm/chart.js@4/dist/chart.umd.min.js"></script>
 <script src="https://cdn.jsdelivr.net/npm/chartjs-adapter-date-fns@3/dist/chartjs-adapter-date-fns.bundle.min.js"></script>
+<script src="https://cdn.jsdelivr.net/npm/chartjs-plugin-zoom@2/dist/chartjs-plugin-zoom.min.js"></script>
 <style>
   * { box-sizing: border-box; }
   body { font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', sans-serif;
@@ -344,14 +357,18 @@ DASHBOARD_HTML = """<!DOCTYPE html>
   </div>
 </div>
 
-<div class="footer">Polling every <span id="poll_s">POLL_INTERVAL</span>s</div>
+<div class="footer">Polling every <span id="poll_s">POLL_INTERVAL</span>s &middot; drag on a chart to zoom in at full resolution, double-click to reset</div>
 <script>
 const POLL = POLL_INTERVAL * 1000;
+const MAX_POINTS = MAX_POINTS_PER_TRACE;  // server decimates traces to this many samples
 const COLORS = ['#2563eb','#dc2626','#16a34a','#9333ea','#ea580c','#0891b2'];
 let charts = [];
 let plotsData = {};
 let currentField = 'SST';
 let currentRun = '';
+let lastTs = null;   // last time step held by the charts; polls ask only for newer samples
+let layout = null;
+let zoomed = new Set();  // charts showing a full-resolution window; polls leave them alone
 
 // --- Run selector ---
 async function loadRuns() {
@@ -376,6 +393,7 @@ async function loadRuns() {
 function switchRun() {
   currentRun = document.getElementById('run-select').value;
   charts = []; // force chart rebuild
+  lastTs = null; layout = null; zoomed.clear();
   document.getElementById('grid').innerHTML = '';
   document.getElementById('csv-link').href = '/csv?run=' + encodeURIComponent(currentRun);
   poll();
@@ -388,10 +406,39 @@ function makeDash(suffix) {
   if (suffix.includes('max') || suffix.includes('min')) return [6, 3];
   return [2, 2];
 }
+function localIso(ms) {
+  const d = new Date(ms), p = (n) => String(n).padStart(2, '0');
+  return d.getFullYear() + '-' + p(d.getMonth() + 1) + '-' + p(d.getDate()) + 'T' +
+         p(d.getHours()) + ':' + p(d.getMinutes()) + ':' + p(d.getSeconds());
+}
+async function loadWindow(chart) {
+  // Replace the zoomed chart's data with the records of the visible window
+  const pi = charts.indexOf(chart);
+  if (pi < 0) return;
+  zoomed.add(pi);
+  const q = '&from=' + localIso(chart.scales.x.min) + '&to=' + localIso(chart.scales.x.max);
+  try {
+    const r = await fetch('/data?run=' + encodeURIComponent(currentRun) + q);
+    const d = await r.json();
+    if (pi >= d.panels.length || !zoomed.has(pi)) return;
+    d.panels[pi].traces.forEach((tr, ti) => {
+      if (ti < chart.data.datasets.length)
+        chart.data.datasets[ti].data = tr.x.map((t, i) => ({ x: t, y: tr.y[i] }));
+    });
+    chart.update('none');
+  } catch (e) {}
+}
+function resetZoom(chart) {
+  chart.resetZoom();
+  zoomed.delete(charts.indexOf(chart));
+  lastTs = null;  // refetch the decimated full history
+  poll();
+}
 function createCharts(panels) {
   const grid = document.getElementById('grid');
   grid.innerHTML = '';
   charts = [];
+  zoomed.clear();
   panels.forEach((p, pi) => {
     const box = document.createElement('div');
     box.className = 'chart-box';
@@ -414,6 +461,8 @@ function createCharts(panels) {
         plugins: {
           title: { display: true, text: p.title, font: { size: 13 } },
           legend: { position: 'bottom', labels: { boxWidth: 14, font: { size: 10 } } },
+          zoom: { zoom: { drag: { enabled: true }, mode: 'x',
+                          onZoomComplete: ({ chart }) => loadWindow(chart) } },
         },
         scales: {
           x: { type: 'time', time: { tooltipFormat: 'MMM d HH:mm' }, ticks: { font: { size: 10 } } },
@@ -422,11 +471,12 @@ function createCharts(panels) {
         interaction: { mode: 'index', intersect: false },
       }
     }));
+    canvas.addEventListener('dblclick', () => resetZoom(charts[pi]));
   });
 }
 function updateCharts(panels) {
   panels.forEach((p, pi) => {
-    if (pi >= charts.length) return;
+    if (pi >= charts.length || zoomed.has(pi)) return;
     const chart = charts[pi];
     p.traces.forEach((tr, ti) => {
       if (ti < chart.data.datasets.length)
@@ -435,6 +485,18 @@ function updateCharts(panels) {
     chart.update('none');
   });
 }
+function appendCharts(panels) {
+  panels.forEach((p, pi) => {
+    if (pi >= charts.length || zoomed.has(pi)) return;
+    const chart = charts[pi];
+    p.traces.forEach((tr, ti) => {
+      if (ti >= chart.data.datasets.length) return;
+      const data = chart.data.datasets[ti].data;
+      tr.x.forEach((t, i) => data.push({ x: t, y: tr.y[i] }));
+    });
+    chart.update('none');
+  });
+}
 
 // --- Surface field viewer ---
 document.getElementById('field-select').addEventListener('change', (e) => {
@@ -474,8 +536,16 @@ function renderFieldImage(idx) {
 // --- Polling ---
 async function poll() {
   try {
-    const r = await fetch('/data?run=' + encodeURIComponent(currentRun));
+    const run = currentRun;
+    const since = (lastTs !== null && charts.length) ? '&since=' + lastTs : '';
+    const r = await fetch('/data?run=' + encodeURIComponent(run) + since);
     const d = await r.json();
+    if (run !== currentRun) return;
+    if (d.since !== null && d.layout !== layout) {
+      // Traces were added since the charts were built: fetch the full history
+      lastTs = null;
+      return poll();
+    }
     document.getElementById('s_steps').textContent = d.n_steps.toLocaleString();
     document.getElementById('s_days').textContent = d.model_days.toFixed(1);
     document.getElementById('s_throughput').textContent = d.throughput ? d.throughput.toFixed(1) : '\\u2014';
@@ -487,8 +557,12 @@ async function poll() {
       document.getElementById('s_node').textContent = d.slurm.node || '\\u2014';
       document.getElementById('s_elapsed').textContent = d.slurm.elapsed || '\\u2014';
     }
-    if (charts.length !== d.panels.length) { createCharts(d.panels); }
+    if (d.since !== null) { appendCharts(d.panels); }
+    else if (charts.length !== d.panels.length) { createCharts(d.panels); }
     else { updateCharts(d.panels); }
+    if (d.n_records > 0) { lastTs = d.n_steps; layout = d.layout; }
+    // Appended samples are not decimated: re-fetch once a chart holds too many
+    if (charts.some(c => c.data.datasets.some(ds => ds.data.length > 2 * MAX_POINTS))) lastTs = null;
   } catch (e) {
     document.getElementById('status').textContent = 'error: ' + e.message;
   }
@@ -520,6 +594,8 @@ class DashboardHandler(BaseHTTPRequestHandler):
     watchers = {}       # run_name → StdoutWatcher
     start_date = "2002-07-01"
     poll_interval = 30
+    max_points = 2000   # samples per trace unless points= is given (0 = all)
+    cache = True        # checkpoint parsed records next to each STDOUT
 
     def _get_run(self):
         """Extract run= query param, default to latest."""
@@ -531,12 +607,32 @@ class DashboardHandler(BaseHTTPRequestHandler):
             run = runs[-1] if runs else None
         return run
 
+    def _get_since(self):
+        """The since= query param as an int time step, or None."""
+        since = parse_qs(urlparse(self.path).query).get("since", [None])[0]
+        try:
+            return int(since) if since else None
+        except ValueError:
+            return None
+
+    def _get_points(self):
+        """The points= query param (samples per trace, 0 = all), or the default."""
+        points = parse_qs(urlparse(self.path).query).get("points", [None])[0]
+        try:
+            return max(int(points), 0) if points else self.max_points
+        except ValueError:
+            return self.max_points
+
+    def _get_window(self):
+        """The from=/to= query params (ISO model times) as model seconds, or None."""
+        return query_window(parse_qs(urlparse(self.path).query), self.start_date)
+
     def _get_watcher(self, run_name):
         """Get or create a watcher for the given run."""
         if run_name not in self.watchers:
             stdout_path = os.path.join(self.simulation_dir, run_name, "STDOUT.0000")
             if os.path.exists(stdout_path):
-                w = StdoutWatcher(stdout_path)
+                w = StdoutWatcher(stdout_path, cache=self.cache)
                 w.poll()
                 self.watchers[run_name] = w
         return self.watchers.get(run_name)
@@ -553,7 +649,8 @@ class DashboardHandler(BaseHTTPRequestHandler):
         path = self.path.split("?")[0]
 
         if path == "/" or path == "/index.html":
-            html = DASHBOARD_HTML.replace("POLL_INTERVAL", str(self.poll_interval))
+            html = (DASHBOARD_HTML.replace("POLL_INTERVAL", str(self.poll_interval))
+                    .replace("MAX_POINTS_PER_TRACE", str(self.max_points or "Infinity")))
             self._respond(200, "text/html; charset=utf-8", html.encode())
 
         elif path == "/runs":
@@ -570,7 +667,7 @@ class DashboardHandler(BaseHTTPRequestHandler):
                 self._respond(200, "application/json", json.dumps({"n_steps": 0, "model_days": 0, "n_records": 0, "generated": "", "panels": []}).encode())
                 return
             w.poll()
-            if w._json_cache is None:
+            if w._slurm is None:
                 run_path = os.path.join(self.simulation_dir, run)
                 slurm_info = get_slurm_info(run_path)
                 wall_start = None
@@ -579,8 +676,16 @@ class DashboardHandler(BaseHTTPRequestHandler):
                         wall_start = datetime.strptime(slurm_info["start"], "%Y-%m-%dT%H:%M:%S")
                     except ValueError:
                         pass
-                w._json_cache = records_to_json(w.records, self.start_date,
-                                                 slurm_info=slurm_info, wall_start=wall_start)
+                w._slurm = (slurm_info, wall_start)
+            since, points, window = self._get_since(), self._get_points(), self._get_window()
+            if since is not None or window is not None or points != self.max_points:
+                body = records_to_json(w.records, self.start_date, *w._slurm, since=since,
+                                       points=points, window=window)
+                self._respond(200, "application/json", body.encode())
+                return
+            if w._json_cache is None:
+                w._json_cache = records_to_json(w.records, self.start_date, *w._slurm,
+                                                points=self.max_points)
             self._respond(200, "application/json", w._json_cache.encode())
 
         elif path.startswith("/plots"):
@@ -646,20 +751,17 @@ th{{background:#f5f5f5}}a{{color:#2563eb}}img{{border-radius:4px}}</style></head
 
     def _build_csv(self, records, run_name):
         """Build CSV string from monitor records."""
-        if not records:
+        if not len(records):
             return ""
-        # Collect all keys across all records
-        all_keys = set()
-        for r in records:
-            all_keys.update(r.keys())
+        keys = sorted(records.keys())
         # Add model_date column
         t0 = datetime.strptime(self.start_date, "%Y-%m-%d")
-        cols = ["model_date"] + sorted(all_keys)
-        lines = [",".join(cols)]
-        for r in records:
-            date = (t0 + timedelta(seconds=r.get("time_secondsf", 0))).strftime("%Y-%m-%d %H:%M")
-            vals = [date] + [str(r.get(k, "")) for k in sorted(all_keys)]
-            lines.append(",".join(vals))
+        seconds = records.column("time_secondsf")
+        lines = [",".join(["model_date"] + keys)]
+        for row in range(len(records)):
+            secs = 0 if np.isnan(seconds[row]) else float(seconds[row])
+            date = (t0 + timedelta(seconds=secs)).strftime("%Y-%m-%d %H:%M")
+            lines.append(",".join([date] + records.row_strings(keys, row)))
         return "\n".join(lines)
 
     def log_message(self, format, *args):
@@ -676,6 +778,10 @@ def main():
     parser.add_argument("--port", "-p", type=int, default=8050)
     parser.add_argument("--poll", type=int, default=30)
     parser.add_argument("--start-date", default="2002-07-01")
+    parser.add_argument("--max-points", type=int, default=2000,
+                        help="Samples per trace sent to the browser (min/max decimated; 0 = all)")
+    parser.add_argument("--no-cache", dest="cache", action="store_false",
+                        help="Don't checkpoint parsed records to <STDOUT>.moncache.npz")
     args = parser.parse_args()
 
     simulation_dir = os.path.abspath(args.simulation_dir)
@@ -690,6 +796,8 @@ def main():
     DashboardHandler.simulation_dir = simulation_dir
     DashboardHandler.start_date = args.start_date
     DashboardHandler.poll_interval = args.poll
+    DashboardHandler.max_points = args.max_points
+    DashboardHandler.cache = args.cache
 
     hostname = os.uname().nodename
     server = HTTPServer(("127.0.0.1", args.port), DashboardHandler)
@@ -0,0 +1,340 @@
+"""
+monitor_records.py
+==================
+Columnar store of MITgcm ``%MON`` records for the monitor dashboards.
+
+One ``%MON`` block (everything between two ``time_tsnumber`` lines) is one
+record.  Instead of a list of dicts, each ``%MON`` key is a growable float64
+NumPy column; a key missing from a record is NaN in that row.  Keys that
+appear later in a run get a column back-filled with NaN.  Columns grow by
+doubling, so appending is amortised O(1) and a trace is a slice of a column
+rather than a loop over every record.
+
+Integer-valued keys (``time_tsnumber``) are stored as float64 too, which is
+exact up to 2**53; ``value`` and ``row_strings`` give them back as ints.
+
+``after("time_tsnumber", ts)`` is the first row past time step ``ts``, so the
+dashboards can serve only the samples a client has not seen yet.  ``layout``
+counts the keys holding data; it changes when a trace appears, which tells a
+client holding earlier samples that it has to fetch the full history again.
+
+Long traces are decimated before they are sent: ``minmax_rows`` splits the
+rows into equal buckets and keeps the minimum and maximum of each, so a
+trace of any length becomes at most ``n_points`` samples with every spike
+still visible.  ``between("time_secondsf", lo, hi)`` selects the rows of a
+zoomed time window, which is then decimated (or sent whole) in the same way.
+
+``MonitorCache`` checkpoints a watcher's parsed columns, byte offset and
+partial record to ``<STDOUT>.moncache.npz``, so a restarted dashboard loads
+the history and resumes tailing instead of re-parsing the whole STDOUT.  The
+checkpoint stores a fingerprint of the STDOUT's first bytes and of the bytes
+just before the offset; it is ignored when the file is shorter than the
+offset (truncated) or the fingerprint differs (replaced by another run).
+
+Usage:
+    records = MonitorRecords()
+    records.append({"time_tsnumber": 240, "time_secondsf": 86400.0, "dynstat_eta_max": 0.41})
+    eta = records.column("dynstat_eta_max")      # float64 view, NaN where missing
+    records.value("time_tsnumber", -1)           # 240
+    new = records.column("dynstat_eta_max")[records.after("time_tsnumber", 120):]
+    rows = minmax_rows(eta, 2000)                # None if eta has <= 2000 samples
+    x, y = TraceWindow(records, "2002-07-01", n_points=2000).xy("dynstat_eta_max")
+
+    cache = MonitorCache("run/STDOUT.0000")
+    records, offset, current = cache.load() or (MonitorRecords(), 0, {})
+    ...
+    cache.save(records, offset, current)         # at most every 5 min
+"""
+
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+
+
+class MonitorRecords:
+    """Append-only table of ``%MON`` records with one float64 column per key."""
+
+    def __init__(self, capacity=1024):
+        self._capacity = capacity
+        self._n = 0
+        self._cols = {}        # key -> float64 array of length _capacity
+        self._int_keys = set()
+        self._valid = set()    # keys with at least one non-NaN value
+
+    def __len__(self):
+        return self._n
+
+    def keys(self):
+        return self._cols.keys()
+
+    def __contains__(self, key):
+        return key in self._cols
+
+    def _reserve(self, n):
+        """Grow every column (by doubling) to hold at least ``n`` rows."""
+        if n <= self._capacity:
+            return
+        while self._capacity < n:
+            self._capacity *= 2
+        for key, col in self._cols.items():
+            grown = np.full(self._capacity, np.nan)
+            grown[:self._n] = col[:self._n]
+            self._cols[key] = grown
+
+    def append(self, record):
+        """Append one record (dict of key -> int/float)."""
+        self._reserve(self._n + 1)
+        row = self._n
+        for key, val in record.items():
+            col = self._cols.get(key)
+            if col is None:
+                col = self._cols[key] = np.full(self._capacity, np.nan)
+                if isinstance(val, int):
+                    self._int_keys.add(key)
+            col[row] = val
+            if key not in self._valid and val == val:
+                self._valid.add(key)
+        self._n += 1
+
+    def extend(self, columns, n, int_keys=()):
+        """Append ``n`` records given as columns (key -> float array of length ``n``).
+
+        ``int_keys`` marks keys holding integers, as ``append`` infers from
+        the value type (see mon_scan.split_records).
+        """
+        if n == 0:
+            return
+        self._reserve(self._n + n)
+        for key, values in columns.items():
+            col = self._cols.get(key)
+            if col is None:
+                col = self._cols[key] = np.full(self._capacity, np.nan)
+                if key in int_keys:
+                    self._int_keys.add(key)
+            col[self._n:self._n + n] = values
+            if key not in self._valid and not np.isnan(values).all():
+                self._valid.add(key)
+        self._n += n
+
+    def has_data(self, key):
+        """True if ``key`` has a value (not NaN) in any record."""
+        return key in self._valid
+
+    @property
+    def layout(self):
+        """Changes whenever a key gets its first value."""
+        return len(self._valid)
+
+    def after(self, key, value):
+        """First row whose ``key`` exceeds ``value`` (``key`` must not decrease)."""
+        col = self._cols.get(key)
+        if col is None:
+            return 0
+        return int(np.searchsorted(col[:self._n], value, side="right"))
+
+    def between(self, key, lo, hi):
+        """``(start, stop)`` rows with ``lo <= key <= hi`` (``key`` must not decrease)."""
+        col = self._cols.get(key)
+        if col is None:
+            return 0, self._n
+        col = col[:self._n]
+        return (int(np.searchsorted(col, lo, side="left")),
+                int(np.searchsorted(col, hi, side="right")))
+
+    def column(self, key):
+        """View of the ``key`` column (all NaN if the key was never seen)."""
+        col = self._cols.get(key)
+        if col is None:
+            return np.full(self._n, np.nan)
+        return col[:self._n]
+
+    def value(self, key, row, default=None):
+        """One cell as a Python int/float, or ``default`` if missing."""
+        col = self._cols.get(key)
+        if col is None or not -self._n <= row < self._n:
+            return default
+        val = col[row % self._n]
+        if np.isnan(val):
+            return default
+        return int(val) if key in self._int_keys else float(val)
+
+    def save(self, path, **meta):
+        """Write the columns and ``meta`` (JSON-serialisable) to an .npz file."""
+        arrays = {f"col.{key}": self.column(key) for key in self._cols}
+        meta = dict(meta, n=self._n, int_keys=sorted(self._int_keys))
+        arrays["meta"] = np.array(json.dumps(meta))
+        # Per-process temp name: two dashboards may checkpoint the same STDOUT
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                np.savez(f, **arrays)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    @classmethod
+    def load(cls, path):
+        """``(records, meta)`` from a file written by ``save``."""
+        with np.load(path, allow_pickle=False) as z:
+            meta = json.loads(str(z["meta"]))
+            n = meta.pop("n")
+            records = cls(capacity=max(n, 1024))
+            for name in z.files:
+                if not name.startswith("col."):
+                    continue
+                key = name[4:]
+                col = records._cols[key] = np.full(records._capacity, np.nan)
+                col[:n] = z[name]
+                if not np.isnan(col[:n]).all():
+                    records._valid.add(key)
+        records._n = n
+        records._int_keys = set(meta.pop("int_keys"))
+        return records, meta
+
+    def row_strings(self, keys, row):
+        """Cells of one row formatted like ``str(value)``, "" where missing."""
+        return [("" if v is None else str(v)) for v in (self.value(k, row) for k in keys)]
+
+
+def json_values(col):
+    """Column as a JSON-ready list, with None (null) for missing values."""
+    missing = np.isnan(col)
+    if not missing.any():
+        return col.tolist()
+    out = col.astype(object)
+    out[missing] = None
+    return out.tolist()
+
+
+def minmax_rows(values, n_points):
+    """Rows keeping the min and max of ``(n_points - 2) // 2`` equal buckets, in order.
+
+    Returns None when ``values`` already has at most ``n_points`` samples.
+    The first and last rows are always kept (so ``n_points`` should be at
+    least 4); NaN only wins a bucket that has no other values, so gaps stay
+    visible.
+    """
+    n = len(values)
+    if not n_points or n <= n_points:
+        return None
+    n_buckets = max((n_points - 2) // 2, 1)
+    width = -(-n // n_buckets)
+    n_buckets = -(-n // width)
+    padded = np.full(n_buckets * width, np.nan)
+    padded[:n] = values
+    buckets = padded.reshape(n_buckets, width)
+    base = np.arange(n_buckets) * width
+    lo = base + np.argmin(np.where(np.isnan(buckets), np.inf, buckets), axis=1)
+    hi = base + np.argmax(np.where(np.isnan(buckets), -np.inf, buckets), axis=1)
+    rows = np.unique(np.concatenate([lo, hi, [0, n - 1]]))
+    return rows[rows < n]
+
+
+def query_window(params, start_date):
+    """``from=``/``to=`` ISO model times of parsed query ``params`` as model seconds.
+
+    Returns ``(lo, hi)`` (open ends are infinite), or None if neither is given
+    or a time does not parse.
+    """
+    if "from" not in params and "to" not in params:
+        return None
+    t0 = datetime.strptime(start_date, "%Y-%m-%d")
+    try:
+        lo = (datetime.fromisoformat(params["from"][0]) - t0).total_seconds() if "from" in params else -np.inf
+        hi = (datetime.fromisoformat(params["to"][0]) - t0).total_seconds() if "to" in params else np.inf
+    except ValueError:
+        return None
+    return lo, hi
+
+
+def iso_times(seconds, start_date):
+    """ISO timestamps ``start_date`` + ``seconds`` (missing = 0 s), to the second."""
+    offsets = np.round(np.nan_to_num(seconds)).astype("timedelta64[s]")
+    return np.datetime_as_string(np.datetime64(start_date, "s") + offsets, unit="s").tolist()
+
+
+class TraceWindow:
+    """Rows ``[start, stop)`` of a MonitorRecords, served as decimated traces."""
+
+    def __init__(self, records, start_date, start=0, stop=None, n_points=None):
+        self.records = records
+        self.start_date = start_date
+        self.rows = slice(start, len(records) if stop is None else stop)
+        self.n_points = n_points
+        self._times = None     # ISO times of every row, shared by undecimated traces
+
+    def xy(self, key):
+        """ISO times and JSON values of ``key``, at most ``n_points`` of them."""
+        y = self.records.column(key)[self.rows]
+        seconds = self.records.column("time_secondsf")[self.rows]
+        rows = minmax_rows(y, self.n_points)
+        if rows is not None:
+            return iso_times(seconds[rows], self.start_date), json_values(y[rows])
+        if self._times is None:
+            self._times = iso_times(seconds, self.start_date)
+        return self._times, json_values(y)
+
+
+# ---------------------------------------------------------------------------
+# Parsed-record checkpoints
+# ---------------------------------------------------------------------------
+
+def stdout_fingerprint(path, offset, nbytes=4096):
+    """Hash of the first bytes of ``path`` and of those just before ``offset``.
+
+    None if the file is missing or shorter than ``offset``.
+    """
+    try:
+        if os.path.getsize(path) < offset:
+            return None
+        h = hashlib.sha1()
+        with open(path, "rb") as f:
+            h.update(f.read(min(nbytes, offset)))
+            f.seek(max(offset - nbytes, 0))
+            h.update(f.read(min(nbytes, offset)))
+        return h.hexdigest()
+    except OSError:
+        return None
+
+
+class MonitorCache:
+    """Checkpoint of a watcher's parse state in ``<stdout_path>.moncache.npz``."""
+
+    VERSION = 1
+
+    def __init__(self, stdout_path, interval=300):
+        self.stdout_path = stdout_path
+        self.path = stdout_path + ".moncache.npz"
+        self.interval = interval
+        self._saved = 0.0
+
+    def load(self):
+        """``(records, offset, current)`` from the checkpoint, or None if absent or stale."""
+        try:
+            records, meta = MonitorRecords.load(self.path)
+        except Exception:
+            return None  # missing, truncated or otherwise unreadable: re-parse
+        if meta.get("version") != self.VERSION:
+            return None
+        if stdout_fingerprint(self.stdout_path, meta["offset"]) != meta["fingerprint"]:
+            return None
+        return records, meta["offset"], meta["current"]
+
+    def save(self, records, offset, current, force=False):
+        """Write the checkpoint, at most every ``interval`` seconds unless ``force``."""
+        if not force and time.time() - self._saved < self.interval:
+            return
+        self._saved = time.time()
+        fingerprint = stdout_fingerprint(self.stdout_path, offset)
+        if fingerprint is None:
+            return
+        try:
+            records.save(self.path, version=self.VERSION, offset=offset, current=current,
+                         fingerprint=fingerprint)
+        except OSError:
+            pass  # read-only run directory: just don't checkpoint
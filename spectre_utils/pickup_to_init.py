@@ -50,82 +50,117 @@ def parse_pickup_meta(meta_path: Path) -> dict:
     return {"nx": nx, "ny": ny, "dtype": dtype, "nrecords": nrecords, "fields": fields}
 
 
+class PickupReader:
+    """Zero-copy access to the fields of an MITgcm pickup .data file.
+
+    The .meta is parsed once into a field -> (offset, shape) table and
+    the .data file is memory-mapped, so ``field()`` returns a read-only view
+    and only the pages of the requested field are ever read from disk.
+
+    Without a .meta, pass ``nx``, ``ny``, ``nr``, ``fields`` and ``dtype``
+    explicitly.
+    """
+
+    # Pickup fields with a single level; everything else has nr levels.
+    FIELDS_2D = ("EtaN", "dEtaHdt", "EtaH")
+
+    def __init__(self, pickup_prefix, nx=None, ny=None, nr=None, fields=None, dtype=None):
+        self.meta_path = Path(str(pickup_prefix) + ".meta")
+        self.data_path = Path(str(pickup_prefix) + ".data")
+        if not self.data_path.exists():
+            raise FileNotFoundError(f"Data file not found: {self.data_path}")
+
+        nrecords = None
+        if fields is None:
+            if not self.meta_path.exists():
+                raise FileNotFoundError(f"Meta file not found: {self.meta_path}")
+            meta = parse_pickup_meta(self.meta_path)
+            nx, ny, dtype = meta["nx"], meta["ny"], meta["dtype"]
+            fields, nrecords = meta["fields"], meta["nrecords"]
+
+        n2d = sum(1 for fld in fields if fld in self.FIELDS_2D)
+        n3d = len(fields) - n2d
+        if nr is None:
+            if nrecords is None or n3d == 0:
+                raise ValueError(f"Cannot infer nr for {self.data_path}")
+            nr = (nrecords - n2d) // n3d
+
+        self.nx, self.ny, self.nr = nx, ny, nr
+        self.dtype = np.dtype(dtype)
+        self.fields = list(fields)
+
+        # field -> (first value, shape); offsets are in values, not bytes,
+        # because the whole file is mapped as one array of ``dtype``.
+        self.offsets = {}
+        start = 0
+        for fld in self.fields:
+            shape = (ny, nx) if fld in self.FIELDS_2D else (nr, ny, nx)
+            self.offsets[fld] = (start, shape)
+            start += int(np.prod(shape))
+
+        expected = start * self.dtype.itemsize
+        actual = self.data_path.stat().st_size
+        if actual < expected:
+            raise ValueError(
+                f"{self.data_path} is {actual} bytes, layout needs {expected} "
+                f"({nx}x{ny}x{nr}, fields {self.fields})"
+            )
+        self._data = np.memmap(self.data_path, dtype=self.dtype, mode="r", shape=(start,))
+
+    def __contains__(self, name):
+        return name in self.offsets
+
+    def field(self, name):
+        """Read-only memmap view of ``name`` shaped (nr, ny, nx) or (ny, nx)."""
+        start, shape = self.offsets[name]
+        return self._data[start:start + int(np.prod(shape))].reshape(shape)
+
+    def byte_offset(self, name):
+        return self.offsets[name][0] * self.dtype.itemsize
+
+
 def pickup_to_init(pickup_prefix: str, output_dir: str, nx: int, ny: int, nr: int):
     """Read a pickup file and write individual init .bin files."""
-    meta_path = Path(pickup_prefix + ".meta")
-    data_path = Path(pickup_prefix + ".data")
     out = Path(output_dir)
 
-    if not meta_path.exists():
-        raise FileNotFoundError(f"Meta file not found: {meta_path}")
-    if not data_path.exists():
-        raise FileNotFoundError(f"Data file not found: {data_path}")
+    pickup = PickupReader(pickup_prefix, nr=nr)
+    if (pickup.nx, pickup.ny) != (nx, ny):
+        raise ValueError(
+            f"Pickup grid {pickup.nx} x {pickup.ny} does not match requested {nx} x {ny}"
+        )
 
-    meta = parse_pickup_meta(meta_path)
-    dtype = meta["dtype"]
-    fields = meta["fields"]
-    rec_size = nx * ny
-
-    print(f"Pickup: {data_path}")
+    print(f"Pickup: {pickup.data_path}")
     print(f"  Grid: {nx} x {ny} x {nr}")
-    print(f"  Precision: {dtype}")
-    print(f"  Fields: {fields}")
-    print(f"  Total records: {meta['nrecords']}")
+    print(f"  Precision: {pickup.dtype}")
+    print(f"  Fields: {pickup.fields}")
+    byte_offsets = {fld: pickup.byte_offset(fld) for fld in pickup.fields}
+    print(f"  Byte offsets: {byte_offsets}")
 
-    # Map pickup field names to init file names and their depth (nr for 3D, 1 for 2D)
+    # Map pickup field names to init file names
     field_map = {
-        "Uvel": ("U.init.bin", nr),
-        "Vvel": ("V.init.bin", nr),
-        "Theta": ("T.init.bin", nr),
-        "Salt": ("S.init.bin", nr),
-        "EtaN": ("Eta.init.bin", 1),
+        "Uvel": "U.init.bin",
+        "Vvel": "V.init.bin",
+        "Theta": "T.init.bin",
+        "Salt": "S.init.bin",
+        "EtaN": "Eta.init.bin",
     }
 
-    # Compute byte offsets for each field in the pickup
-    bytes_per_val = np.dtype(dtype).itemsize
-    rec_bytes = rec_size * bytes_per_val
-
-    # Build offset table: walk through fields in order
-    offsets = {}
-    current_rec = 0
-    for fld in fields:
-        # 3D fields have nr levels, 2D fields have 1 level
-        if fld in ("EtaN", "dEtaHdt", "EtaH"):
-            nlevels = 1
-        else:
-            nlevels = nr
-        offsets[fld] = (current_rec, nlevels)
-        current_rec += nlevels
-
-    print(f"  Computed record layout: {offsets}")
-
     # Read and write the fields we need
     out.mkdir(parents=True, exist_ok=True)
-    with open(data_path, "rb") as f:
-        for fld_name, (init_name, nlevels) in field_map.items():
-            if fld_name not in offsets:
-                print(f"  WARNING: field '{fld_name}' not found in pickup, skipping")
-                continue
-
-            start_rec, expected_levels = offsets[fld_name]
-            assert expected_levels == nlevels, (
-                f"Level mismatch for {fld_name}: expected {nlevels}, got {expected_levels}"
-            )
-
-            # Seek to field start and read
-            f.seek(start_rec * rec_bytes)
-            data = np.fromfile(f, dtype=dtype, count=rec_size * nlevels)
-            data = data.reshape((nlevels, ny, nx))
-
-            # Convert to float32 for init files
-            # Remove existing symlink if present (setup step creates symlinks
-            # to input/ which may be dangling in this container context)
-            init_path = out / init_name
-            if init_path.is_symlink() or init_path.exists():
-                init_path.unlink()
-            data.astype(">f4").tofile(init_path)
-            size_mb = init_path.stat().st_size / 1e6
-            print(f"  Wrote {init_path} ({size_mb:.1f} MB)")
+    for fld_name, init_name in field_map.items():
+        if fld_name not in pickup:
+            print(f"  WARNING: field '{fld_name}' not found in pickup, skipping")
+            continue
+
+        # Convert to float32 for init files
+        # Remove existing symlink if present (setup step creates symlinks
+        # to input/ which may be dangling in this container context)
+        init_path = out / init_name
+        if init_path.is_symlink() or init_path.exists():
+            init_path.unlink()
+        pickup.field(fld_name).astype(">f4").tofile(init_path)
+        size_mb = init_path.stat().st_size / 1e6
+        print(f"  Wrote {init_path} ({size_mb:.1f} MB)")
 
     print("Done.")
 
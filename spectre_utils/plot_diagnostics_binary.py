@@ -6,7 +6,21 @@ Sidecar plotter for MITgcm binary diagnostics output.
 
 Watches an experiment directory (e.g. repeat-year-50/) for new state3D/state2D
 binary files and renders surface field plots (SST, SSS, SSH, KE) into each
-run's plots/ subdirectory.
+run's plots/ subdirectory.  New files are detected with inotify where possible
+and by polling on network filesystems (see diag_watcher.py).  Plotted files
+are recorded in ``diag_state.plotted.log`` in each run directory (see
+diag_state.py), so a restart does not revisit them.
+
+Each field's figure, mesh and colorbar are built once per process; a new
+timestep only swaps the mesh data and title before saving.  --raster skips
+matplotlib per frame altogether (see surface_raster.py).  With --workers N
+the timesteps are rendered by N processes, e.g. to work through the backlog
+of a whole ensemble.
+
+Timesteps are scheduled newest first across all runs (see PlotScheduler), so
+the latest day of every member is plotted before any older history, and at
+most --queue-size timesteps are handed to the workers at once so new output
+overtakes a running backlog.  --no-backlog plots only the last --live-days.
 
 Designed to run on the login node alongside SLURM jobs.
 
@@ -18,18 +32,30 @@ Usage:
     # Or watch a single run:
     uv run python spectre_utils/plot_diagnostics_binary.py \
         simulations/glorysv12-curvilinear repeat-year-50 --run 001 --poll 0
+
+    # Plot the backlog of all runs on 16 processes:
+    uv run python spectre_utils/plot_diagnostics_binary.py \
+        simulations/glorysv12-curvilinear repeat-year-50 --poll 0 --workers 16
 """
 
 import argparse
+import heapq
 import os
 import re
 import sys
 import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor
+from concurrent.futures import wait as wait_futures
 from datetime import datetime, timedelta
 from pathlib import Path
 
 import numpy as np
 
+from spectre_utils.diag_state import StateStore
+from spectre_utils.diag_watcher import DiagWatcher
+from spectre_utils.surface_raster import RasterRenderer
+from spectre_utils.tile_layout import find_size
+
 _plt = None
 
 
@@ -82,25 +108,25 @@ def parse_diag_meta(meta_path):
     }
 
 
-def read_surface_field(data_path, meta, field_name):
-    """Read the surface (k=0) slice of a named field from binary diagnostics."""
-    if field_name not in meta["fields"]:
-        return None
+def read_surface_fields(data_path, meta, field_names):
+    """Surface slices of several fields from one memory map of the file.
 
-    nx, ny, nz = meta["nx"], meta["ny"], meta["nz"]
-    dtype = meta["dtype"]
+    Returns ``{name: (ny, nx) float array}`` for the names present in the
+    file; only the k=0 record of each field is read.
+    """
+    nx, ny = meta["nx"], meta["ny"]
+    nlev = meta["nz"] if meta["ndims"] == 3 else 1
+    raw = np.memmap(data_path, dtype=meta["dtype"], mode="r")
     rec_size = nx * ny
-    field_idx = meta["fields"].index(field_name)
-
-    if meta["ndims"] == 3:
-        # 3D file: each field has nz levels
-        offset = field_idx * nz * rec_size
-    else:
-        # 2D file: each field is one record
-        offset = field_idx * rec_size
-
-    data = np.fromfile(data_path, dtype=dtype, count=rec_size, offset=offset * np.dtype(dtype).itemsize)
-    return data.reshape(ny, nx)
+    out = {}
+    for name in field_names:
+        if name not in meta["fields"]:
+            continue
+        offset = meta["fields"].index(name) * nlev * rec_size
+        surface = raw[offset:offset + rec_size].reshape(ny, nx)
+        out[name] = surface.astype(surface.dtype.newbyteorder("="))
+    del raw
+    return out
 
 
 # ---------------------------------------------------------------------------
@@ -120,19 +146,6 @@ def discover_experiment_runs(simulation_dir, experiment):
     return runs
 
 
-def find_diag_timesteps(run_dir, prefix="state3D"):
-    """Find timestep suffixes for which both .data and .meta exist."""
-    timesteps = set()
-    for f in Path(run_dir).glob(f"{prefix}.*.data"):
-        m = re.search(rf"{prefix}\.(\d{{10}})\.data", f.name)
-        if m:
-            ts = m.group(1)
-            meta = f.with_suffix(".meta")
-            if meta.exists():
-                timesteps.add(ts)
-    return sorted(timesteps)
-
-
 # ---------------------------------------------------------------------------
 # Plotting
 # ---------------------------------------------------------------------------
@@ -149,104 +162,177 @@ FIELD_CONFIG = {
 }
 
 
-def plot_field(field_data, field_name, xC, yC, title_extra, output_path):
-    _import_mpl()
-    cfg = FIELD_CONFIG[field_name]
-    fig, ax = _plt.subplots(1, 1, figsize=(12, 6))
-    masked = np.ma.masked_where(
+def _mask_invalid(field_data):
+    return np.ma.masked_where(
         (field_data == 0) | np.isnan(field_data) | (field_data <= -999), field_data
     )
-    im = ax.pcolormesh(xC, yC, masked, cmap=cfg["cmap"],
-                       vmin=cfg["vmin"], vmax=cfg["vmax"], shading="auto")
-    cb = fig.colorbar(im, ax=ax, shrink=0.8, pad=0.02)
-    cb.set_label(cfg["unit"], fontsize=10)
-    ax.set_title(f'{cfg["label"]} \u2014 {title_extra}', fontsize=13)
-    ax.set_xlabel("Longitude")
-    ax.set_ylabel("Latitude")
-    ax.set_aspect("equal")
-    fig.tight_layout()
-    fig.savefig(output_path, dpi=120, bbox_inches="tight")
-    _plt.close(fig)
+
+
+class FieldRenderer:
+    """Figure, curvilinear mesh and colorbar for one field, built once.
+
+    ``render`` only replaces the mesh data and the title, so the cost per
+    timestep is essentially the PNG encode.
+    """
+
+    def __init__(self, field_name, xC, yC):
+        _import_mpl()
+        cfg = FIELD_CONFIG[field_name]
+        self.cfg = cfg
+        self.xC = xC
+        self.fig, ax = _plt.subplots(1, 1, figsize=(12, 6))
+        self.mesh = ax.pcolormesh(xC, yC, np.ma.masked_all(xC.shape), cmap=cfg["cmap"],
+                                  vmin=cfg["vmin"], vmax=cfg["vmax"], shading="auto")
+        cb = self.fig.colorbar(self.mesh, ax=ax, shrink=0.8, pad=0.02)
+        cb.set_label(cfg["unit"], fontsize=10)
+        self.title = ax.set_title(cfg["label"], fontsize=13)
+        ax.set_xlabel("Longitude")
+        ax.set_ylabel("Latitude")
+        ax.set_aspect("equal")
+        self.fig.tight_layout()
+
+    def render(self, field_data, title_extra, output_path):
+        self.mesh.set_array(field_data)
+        self.title.set_text(f'{self.cfg["label"]} \u2014 {title_extra}')
+        self.fig.savefig(output_path, dpi=120, bbox_inches="tight")
+
+
+_renderers = {}
+
+
+def plot_field(field_data, field_name, xC, yC, title_extra, output_path,
+               raster=False, grid_file=None):
+    """Plot one field with a per-process renderer (raster: cached next to ``grid_file``)."""
+    kind = RasterRenderer if raster else FieldRenderer
+    renderer = _renderers.get(field_name)
+    if renderer is None or renderer.xC is not xC or type(renderer) is not kind:
+        if raster:
+            renderer = RasterRenderer(FIELD_CONFIG[field_name], xC, yC, grid_file=grid_file)
+        else:
+            renderer = FieldRenderer(field_name, xC, yC)
+        _renderers[field_name] = renderer
+    renderer.render(_mask_invalid(field_data), title_extra, output_path)
 
 
 # ---------------------------------------------------------------------------
 # Processing
 # ---------------------------------------------------------------------------
 
-def process_run(run_dir, run_name, xC, yC, plotted, deltaT, start_date, nx, ny):
-    """Process one run directory. Returns number of new plots created."""
+def plot_timestep(run_dir, run_name, prefix, ts, xC, yC, deltaT, start_date,
+                  raster=False, grid_file=None):
+    """Render the plots that come from one diagnostics file.
+
+    state3D gives SST, SSS and KE; state2D gives SSH.  Existing images are
+    left alone.  Returns the number of new plots created, or None if the
+    timestep failed (so it is not recorded as plotted and is retried).
+    """
     t0 = datetime.strptime(start_date, "%Y-%m-%d")
     plots_dir = os.path.join(run_dir, "plots")
     new_count = 0
 
-    # Find available timesteps
-    ts_3d = find_diag_timesteps(run_dir, "state3D")
-    ts_2d = find_diag_timesteps(run_dir, "state2D")
+    iter_num = int(ts)
+    model_date = (t0 + timedelta(seconds=iter_num * deltaT)).strftime("%Y-%m-%d")
+    title = f"{run_name} \u2014 {model_date}"
 
-    for ts in ts_3d:
-        if ts in plotted:
-            continue
+    data_path = os.path.join(run_dir, f"{prefix}.{ts}.data")
+    meta = parse_diag_meta(os.path.join(run_dir, f"{prefix}.{ts}.meta"))
 
-        iter_num = int(ts)
-        model_date = (t0 + timedelta(seconds=iter_num * deltaT)).strftime("%Y-%m-%d")
-        title = f"{run_name} \u2014 {model_date}"
-
-        data_path = os.path.join(run_dir, f"state3D.{ts}.data")
-        meta_path = os.path.join(run_dir, f"state3D.{ts}.meta")
-        meta = parse_diag_meta(meta_path)
-
-        os.makedirs(plots_dir, exist_ok=True)
-
-        try:
-            # SST
-            sst = read_surface_field(data_path, meta, "THETA")
-            if sst is not None:
-                out = os.path.join(plots_dir, f"SST_{ts}.png")
-                if not os.path.exists(out):
-                    plot_field(sst, "SST", xC, yC, title, out)
-                    new_count += 1
-
-            # SSS
-            sss = read_surface_field(data_path, meta, "SALT")
-            if sss is not None:
-                out = os.path.join(plots_dir, f"SSS_{ts}.png")
-                if not os.path.exists(out):
-                    plot_field(sss, "SSS", xC, yC, title, out)
-                    new_count += 1
-
-            # KE
-            u = read_surface_field(data_path, meta, "UVEL")
-            v = read_surface_field(data_path, meta, "VVEL")
-            if u is not None and v is not None:
-                ke = 0.5 * (u ** 2 + v ** 2)
-                out = os.path.join(plots_dir, f"KE_{ts}.png")
-                if not os.path.exists(out):
-                    plot_field(ke, "KE", xC, yC, title, out)
-                    new_count += 1
-
-        except Exception as e:
-            print(f"  [{run_name}] Error processing state3D {ts}: {e}")
-            continue
+    os.makedirs(plots_dir, exist_ok=True)
 
-        # SSH from state2D
-        if ts in ts_2d:
-            try:
-                data2d_path = os.path.join(run_dir, f"state2D.{ts}.data")
-                meta2d = parse_diag_meta(os.path.join(run_dir, f"state2D.{ts}.meta"))
-                etan = read_surface_field(data2d_path, meta2d, "ETAN")
-                if etan is not None:
-                    out = os.path.join(plots_dir, f"SSH_{ts}.png")
-                    if not os.path.exists(out):
-                        plot_field(etan, "SSH", xC, yC, title, out)
-                        new_count += 1
-            except Exception as e:
-                print(f"  [{run_name}] Error processing state2D {ts}: {e}")
-
-        plotted.add(ts)
+    if prefix == "state3D":
+        jobs = [("SST", "THETA"), ("SSS", "SALT"), ("KE", None)]
+        names = ["THETA", "SALT", "UVEL", "VVEL"]
+    elif prefix == "state2D":
+        jobs = [("SSH", "ETAN")]
+        names = ["ETAN"]
+    else:
+        return 0
+    jobs = [(f, var, os.path.join(plots_dir, f"{f}_{ts}.png")) for f, var in jobs]
+    jobs = [job for job in jobs if not os.path.exists(job[2])]
+    if not jobs:
+        return 0
+
+    try:
+        fields = read_surface_fields(data_path, meta, names)
+        for field_name, var, out in jobs:
+            if var is not None:
+                data = fields.get(var)
+            elif "UVEL" in fields and "VVEL" in fields:
+                data = 0.5 * (fields["UVEL"] ** 2 + fields["VVEL"] ** 2)
+            else:
+                data = None
+            if data is not None:
+                plot_field(data, field_name, xC, yC, title, out, raster, grid_file)
+                new_count += 1
+    except Exception as e:
+        print(f"  [{run_name}] Error processing {prefix} {ts}: {e}")
+        return None
 
     return new_count
 
 
+# Grid of a --workers process, loaded once by the pool initializer so that
+# tasks only carry file names.
+_grid = None
+
+
+def _init_worker(horizgridfile, Nx, Ny, raster):
+    global _grid
+    _grid = read_model_grid(horizgridfile, Nx, Ny) + (raster, horizgridfile)
+
+
+def _plot_timestep_worker(run_dir, run_name, prefix, ts, deltaT, start_date):
+    xC, yC, raster, horizgridfile = _grid
+    return plot_timestep(run_dir, run_name, prefix, ts, xC, yC, deltaT, start_date,
+                         raster, horizgridfile)
+
+
+# ---------------------------------------------------------------------------
+# Scheduling
+# ---------------------------------------------------------------------------
+
+class PlotScheduler:
+    """Timesteps waiting to be plotted, newest iteration first across all runs.
+
+    A timestep within ``live_iters`` of the newest iteration seen in any run
+    is live; older ones are backlog.  Because the queue is ordered by
+    iteration, live timesteps always come out before the backlog, and the
+    backlog is filled from the most recent day backwards.  With
+    ``backlog=False`` timesteps that are (or, as the ensemble advances,
+    become) older than the live window are dropped instead.
+    """
+
+    def __init__(self, live_iters, backlog=True):
+        self.live_iters = live_iters
+        self.backlog = backlog
+        self.newest = -1
+        self._heap = []
+        self._queued = set()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def push(self, run_dir, prefix, ts):
+        item = (run_dir, prefix, ts)
+        if item in self._queued:
+            return
+        self.newest = max(self.newest, int(ts))
+        self._queued.add(item)
+        heapq.heappush(self._heap, (-int(ts), run_dir, prefix, ts))
+
+    def pop(self):
+        """Next timestep as ``(run_dir, prefix, ts)``; None if nothing is left."""
+        while self._heap:
+            neg_iter, run_dir, prefix, ts = heapq.heappop(self._heap)
+            self._queued.discard((run_dir, prefix, ts))
+            if self.backlog or -neg_iter >= self.newest - self.live_iters:
+                return run_dir, prefix, ts
+            # Everything below is older still
+            self._queued.clear()
+            self._heap.clear()
+        return None
+
+
 # ---------------------------------------------------------------------------
 # Main
 # ---------------------------------------------------------------------------
@@ -263,13 +349,27 @@ def main():
                         help="Watch a single run (e.g. 001) instead of all runs")
     parser.add_argument("--poll", type=int, default=120,
                         help="Seconds between polls (0 = single pass, no loop)")
+    parser.add_argument("--watch", choices=("auto", "inotify", "poll"), default="auto",
+                        help="inotify, polling, or inotify except on network filesystems")
     parser.add_argument("--start-date", default="2002-07-01")
     parser.add_argument("--dt", type=float, default=360.0, help="Model timestep in seconds")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Processes rendering timesteps in parallel")
+    parser.add_argument("--raster", action="store_true",
+                        help="Fast raster rendering (index map cached next to horizgridfile.bin)")
+    parser.add_argument("--queue-size", type=int, default=None,
+                        help="Timesteps handed to the workers at a time (default: 2 x workers)")
+    parser.add_argument("--live-days", type=float, default=7.0,
+                        help="Model days behind the newest timestep that count as live")
+    parser.add_argument("--no-backlog", dest="backlog", action="store_false",
+                        help="Skip timesteps older than the live window instead of "
+                             "plotting them after the live ones")
     args = parser.parse_args()
 
-    Nx, Ny = 768, 424
     simulation_dir = os.path.abspath(args.simulation_dir)
     exp_dir = os.path.join(simulation_dir, args.experiment)
+    size = find_size(simulation_dir)
+    Nx, Ny = size["Nx"], size["Ny"]
 
     horizgridfile = os.path.join(simulation_dir, "input", "horizgridfile.bin")
     xC, yC = read_model_grid(horizgridfile, Nx, Ny)
@@ -278,32 +378,83 @@ def main():
     if args.run:
         print(f"Single run: {args.run}")
 
-    plotted_cache = {}  # run_name → set of plotted timesteps
-
+    # Files younger than min_age_s may still be written (polling mode only;
+    # with inotify a file is complete once its writer has closed it).
+    watcher = DiagWatcher(("state3D", "state2D"), mode=args.watch, min_age_s=120,
+                          poll_interval=max(args.poll, 1))
+
+    pool = None
+    if args.workers > 1:
+        pool = ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                                   initargs=(horizgridfile, Nx, Ny, args.raster))
+        print(f"Rendering on {args.workers} processes")
+    queue_size = args.queue_size or 2 * args.workers
+    live_iters = int(args.live_days * 86400 / args.dt)
+    scheduler = PlotScheduler(live_iters, backlog=args.backlog)
+
+    states = StateStore()
+    inflight = {}           # future -> (run_dir, prefix, ts)
+    new_counts = {}
+    next_discovery = 0.0
     while True:
-        if args.run:
-            runs = [args.run]
-        else:
-            runs = discover_experiment_runs(simulation_dir, args.experiment)
-
-        for run_name in runs:
-            run_dir = os.path.join(exp_dir, run_name)
-            if not os.path.isdir(run_dir):
-                continue
-
-            if run_name not in plotted_cache:
-                plotted_cache[run_name] = set()
-
-            n = process_run(run_dir, f"{args.experiment}/{run_name}",
-                           xC, yC, plotted_cache[run_name],
-                           args.dt, args.start_date, Nx, Ny)
-            if n > 0:
-                print(f"[{args.experiment}/{run_name}] Plotted {n} new images")
-
-        if args.poll <= 0:
-            break
-        time.sleep(args.poll)
-
+        if time.monotonic() >= next_discovery:
+            if args.run:
+                runs = [args.run]
+            else:
+                runs = discover_experiment_runs(simulation_dir, args.experiment)
+            for run_name in runs:
+                run_dir = os.path.join(exp_dir, run_name)
+                if os.path.isdir(run_dir):
+                    watcher.add_dir(run_dir)
+            next_discovery = time.monotonic() + max(args.poll, 1)
+
+        # Only block on the watcher when there is nothing to plot
+        idle = not scheduler and not inflight
+        arrived = watcher.wait(timeout=max(args.poll, 0) if idle else 0)
+        for run_dir, prefix, ts in arrived:
+            if not states[run_dir].done("plotted", prefix, ts):
+                scheduler.push(run_dir, prefix, ts)
+
+        results = []
+        if pool is not None:
+            while scheduler and len(inflight) < queue_size:
+                item = scheduler.pop()
+                if item is None:
+                    break
+                run_dir, prefix, ts = item
+                future = pool.submit(_plot_timestep_worker, run_dir,
+                                     f"{args.experiment}/{os.path.basename(run_dir)}",
+                                     prefix, ts, args.dt, args.start_date)
+                inflight[future] = (run_dir, prefix, ts)
+            if inflight:
+                done, _ = wait_futures(inflight, timeout=1.0, return_when=FIRST_COMPLETED)
+                results = [(inflight.pop(f), f.result()) for f in done]
+        elif scheduler and (item := scheduler.pop()) is not None:
+            # One timestep at a time, so new arrivals are scheduled in between
+            run_dir, prefix, ts = item
+            results = [((run_dir, prefix, ts),
+                        plot_timestep(run_dir, f"{args.experiment}/{os.path.basename(run_dir)}",
+                                      prefix, ts, xC, yC, args.dt, args.start_date,
+                                      args.raster, horizgridfile))]
+
+        # The log is only written here, so it keeps a single writer
+        for (run_dir, prefix, ts), n in results:
+            if n is None:
+                continue  # failed: left unmarked so that a restart retries it
+            states[run_dir].mark("plotted", prefix, ts)
+            run_name = os.path.basename(run_dir)
+            new_counts[run_name] = new_counts.get(run_name, 0) + n
+
+        if not scheduler and not inflight:
+            for run_name, n in sorted(new_counts.items()):
+                if n > 0:
+                    print(f"[{args.experiment}/{run_name}] Plotted {n} new images")
+            new_counts = {}
+            if args.poll <= 0 and not arrived:
+                break
+
+    if pool is not None:
+        pool.shutdown()
 
 if __name__ == "__main__":
     main()
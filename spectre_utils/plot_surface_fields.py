@@ -4,18 +4,32 @@ plot_surface_fields.py
 Watch a simulation directory for MNC NetCDF diagnostics output across all
 run subdirectories and render 2D surface field plots.
 
+New diagnostics are detected from the binary files the converter reads (see
+diag_watcher.py); a timestep is plotted once all of its tiles are converted.
+Fields are read from the run's Zarr store when the converter writes one
+(``--format zarr``, see diag_zarr.py), otherwise from the per-tile NetCDF.
+--raster renders frames from a cached pixel->cell index map instead of a
+pcolormesh per plot (see surface_raster.py).
+Plotted timesteps are recorded in ``diag_state.plotted.log`` in each run
+directory and conversions are read from the converter's
+``diag_state.converted.log`` or ``diag_state.converted.zarr.log`` (see
+diag_state.py).
+
 Usage:
-    python plot_surface_fields.py <simulation_dir> [--poll 120]
+    python plot_surface_fields.py <simulation_dir> [--poll 120] [--watch auto]
 """
 
 import os
 import sys
-import re
-import time
 import argparse
-import glob
 import numpy as np
 
+from spectre_utils.diag_state import StateStore
+from spectre_utils.diag_watcher import DiagWatcher
+from spectre_utils.diag_zarr import open_iteration, stored_iterations
+from spectre_utils.surface_raster import RasterRenderer
+from spectre_utils.tile_layout import find_size, tile_layout
+
 _plt = None
 _xr = None
 
@@ -60,26 +74,26 @@ def read_model_grid(horizgridfile, Nx, Ny):
 
 
 def get_tile_layout(run_dir, nPx, nPy, sNx=96, sNy=53):
-    _import_xr()
-    layout = {}
-    mnc_dirs = sorted(glob.glob(os.path.join(run_dir, "mnc_*_*/")))
-    seen = set()
-    for d in mnc_dirs:
-        grid_files = glob.glob(os.path.join(d, "grid.t*.nc"))
-        if not grid_files:
-            continue
-        gf = grid_files[0]
-        ds = _xr.open_dataset(gf)
-        x0 = int(ds["X"].values[0])
-        y0 = int(ds["Y"].values[0])
+    """Tile layout of ``run_dir``, shared with the converter via tile_layout.json."""
+    return tile_layout(run_dir, nPx, nPy, sNx, sNy)
+
+
+def _zarr_field_2d(run_dir, file_prefix, timestep_str, var_name, k=None):
+    """``var_name`` (level ``k``) from the run's Zarr store, or None if not stored there."""
+    ds = open_iteration(run_dir, file_prefix, timestep_str)
+    if ds is None:
+        return None
+    if var_name not in ds:
         ds.close()
-        tile_px = (x0 - 1) // sNx
-        tile_py = (y0 - 1) // sNy
-        tile_suffix = os.path.basename(gf).replace("grid.", "").replace(".nc", "")
-        if (tile_py, tile_px) not in seen:
-            layout[(tile_py, tile_px)] = {"dir": d, "tile": tile_suffix}
-            seen.add((tile_py, tile_px))
-    return layout
+        return None
+    data = ds[var_name]
+    if k is not None:
+        z_dims = [d for d in data.dims if d.startswith("Z")]
+        if z_dims:
+            data = data.isel({z_dims[0]: k})
+    arr = data.values.astype(np.float32)
+    ds.close()
+    return arr
 
 
 def stitch_field_2d(run_dir, file_prefix, timestep_str, var_name, layout,
@@ -87,6 +101,9 @@ def stitch_field_2d(run_dir, file_prefix, timestep_str, var_name, layout,
     _import_xr()
     Nx = sNx * nPx
     Ny = sNy * nPy
+    field = _zarr_field_2d(run_dir, file_prefix, timestep_str, var_name, k)
+    if field is not None:
+        return field
     global_field = np.full((Ny, Nx), np.nan, dtype=np.float32)
 
     for (py, px), info in layout.items():
@@ -119,32 +136,21 @@ def stitch_field_2d(run_dir, file_prefix, timestep_str, var_name, layout,
     return global_field
 
 
-def find_diag_timesteps(run_dir, prefix="state3D", n_tiles=64):
-    """Find timesteps where all tiles have been converted to NetCDF."""
-    # Count how many tile directories exist
-    mnc_dirs = glob.glob(os.path.join(run_dir, "mnc_*_*/"))
-    if not mnc_dirs:
-        return []
-    n_dirs = len(mnc_dirs)
-
-    # Find candidate timesteps from one tile dir
-    candidates = set()
-    for d in glob.glob(os.path.join(run_dir, "mnc_*_0001/")):
-        for f in glob.glob(os.path.join(d, f"{prefix}.*.t*.nc")):
-            m = re.search(rf"{prefix}\.(\d{{10}})\.t", f)
-            if m:
-                candidates.add(m.group(1))
-
-    # Verify all tiles are present for each candidate
-    ready = []
-    for ts in sorted(candidates):
-        count = 0
-        for d in mnc_dirs:
-            if glob.glob(os.path.join(d, f"{prefix}.{ts}.t*.nc")):
-                count += 1
-        if count >= n_dirs:
-            ready.append(ts)
-    return ready
+def tiles_converted(layout, prefix, timestep_str):
+    """True once every tile of ``prefix.timestep_str`` has been converted to NetCDF.
+
+    Tiles are checked last-first: the converter writes them in layout order,
+    so an unfinished timestep usually costs a single stat.
+    """
+    for info in reversed(list(layout.values())):
+        fname = os.path.join(info["dir"], f"{prefix}.{timestep_str}.{info['tile']}.nc")
+        if not os.path.exists(fname):
+            return False
+    return True
+
+
+# Seconds between checks for a timestep whose tiles are still being converted
+CONVERSION_RETRY_S = 15
 
 
 # ---------------------------------------------------------------------------
@@ -163,11 +169,23 @@ FIELD_CONFIG = {
 }
 
 
-def plot_field(field_data, field_name, xC, yC, model_date, output_path):
+# Raster renderers of this process, by field name
+_raster_renderers = {}
+
+
+def plot_field(field_data, field_name, xC, yC, model_date, output_path,
+               raster=False, grid_file=None):
     _import_mpl()
     cfg = FIELD_CONFIG[field_name]
-    fig, ax = _plt.subplots(1, 1, figsize=(12, 6))
     masked = np.ma.masked_where((field_data == 0) | np.isnan(field_data), field_data)
+    if raster:
+        renderer = _raster_renderers.get(field_name)
+        if renderer is None or renderer.xC is not xC:
+            renderer = RasterRenderer(cfg, xC, yC, grid_file=grid_file)
+            _raster_renderers[field_name] = renderer
+        renderer.render(masked, model_date, output_path)
+        return
+    fig, ax = _plt.subplots(1, 1, figsize=(12, 6))
     im = ax.pcolormesh(xC, yC, masked, cmap=cfg["cmap"],
                        vmin=cfg["vmin"], vmax=cfg["vmax"], shading="auto")
     cb = fig.colorbar(im, ax=ax, shrink=0.8, pad=0.02)
@@ -185,8 +203,14 @@ def plot_field(field_data, field_name, xC, yC, model_date, output_path):
 # Main loop
 # ---------------------------------------------------------------------------
 
-def process_run(run_dir, xC, yC, plotted_cache, nPx, nPy, sNx, sNy, deltaT, start_date):
-    """Process one run directory. Returns number of new plots."""
+def plot_timestep(run_dir, prefix, ts, layout, xC, yC, nPx, nPy, sNx, sNy,
+                  deltaT, start_date, raster=False, grid_file=None):
+    """Render the plots for one converted diagnostics timestep.
+
+    state3D gives SST, SSS and KE; state2D gives SSH.  Returns
+    ``(new_plots, complete)``; ``complete`` is False if the stitched field
+    looked incomplete and the timestep should be retried later.
+    """
     from datetime import datetime, timedelta
 
     Nx = sNx * nPx
@@ -194,88 +218,63 @@ def process_run(run_dir, xC, yC, plotted_cache, nPx, nPy, sNx, sNy, deltaT, star
     t0 = datetime.strptime(start_date, "%Y-%m-%d")
     plots_dir = os.path.join(run_dir, "plots")
     os.makedirs(plots_dir, exist_ok=True)
-
     run_name = os.path.basename(run_dir)
-    if run_name not in plotted_cache:
-        plotted_cache[run_name] = set()
-    plotted = plotted_cache[run_name]
-
-    # Get or build tile layout
-    layout = get_tile_layout(run_dir, nPx, nPy, sNx, sNy)
-    if not layout:
-        return 0
 
-    timesteps = find_diag_timesteps(run_dir, "state3D")
+    iter_num = int(ts)
+    model_seconds = iter_num * deltaT
+    model_date = (t0 + timedelta(seconds=model_seconds)).strftime("%Y-%m-%d")
     new_count = 0
 
-    for ts in timesteps:
-        if ts in plotted:
-            continue
-
-        iter_num = int(ts)
-        model_seconds = iter_num * deltaT
-        model_date = (t0 + timedelta(seconds=model_seconds)).strftime("%Y-%m-%d")
-
-        # Minimum fraction of valid (non-zero, non-NaN) ocean points
-        # to consider the stitched field complete. If below this, skip
-        # and retry on the next poll cycle.
-        MIN_VALID_FRAC = 0.5
-        n_total = Nx * Ny
-        skip_ts = False
-
-        # SST, SSS
-        for var, field_name, k in [("THETA", "SST", 0), ("SALT", "SSS", 0)]:
-            out = os.path.join(plots_dir, f"{field_name}_{ts}.png")
-            if not os.path.exists(out):
-                data = stitch_field_2d(run_dir, "state3D", ts, var, layout,
-                                        nPx, nPy, sNx, sNy, k=k)
-                n_valid = np.sum((data != 0) & ~np.isnan(data))
-                if n_valid < n_total * MIN_VALID_FRAC:
-                    print(f"  [{run_name}] {field_name} {ts}: only {n_valid}/{n_total} valid — skipping, will retry")
-                    skip_ts = True
-                    break
-                try:
-                    plot_field(data, field_name, xC, yC, model_date, out)
-                    new_count += 1
-                except Exception as e:
-                    print(f"  [{run_name}] Error plotting {field_name}: {e}")
-
-        if skip_ts:
-            continue  # don't mark as plotted — retry next cycle
-
-        # KE
-        out = os.path.join(plots_dir, f"KE_{ts}.png")
+    if prefix == "state2D":
+        # SSH
+        out = os.path.join(plots_dir, f"SSH_{ts}.png")
+        if not os.path.exists(out):
+            etan = stitch_field_2d(run_dir, "state2D", ts, "ETAN", layout,
+                                   nPx, nPy, sNx, sNy)
+            try:
+                plot_field(etan, "SSH", xC, yC, model_date, out, raster, grid_file)
+                new_count += 1
+            except Exception as e:
+                print(f"  [{run_name}] Error plotting SSH: {e}")
+        return new_count, True
+
+    # Minimum fraction of valid (non-zero, non-NaN) ocean points
+    # to consider the stitched field complete. If below this, skip
+    # and retry later.
+    MIN_VALID_FRAC = 0.5
+    n_total = Nx * Ny
+
+    # SST, SSS
+    for var, field_name, k in [("THETA", "SST", 0), ("SALT", "SSS", 0)]:
+        out = os.path.join(plots_dir, f"{field_name}_{ts}.png")
         if not os.path.exists(out):
-            u = stitch_field_2d(run_dir, "state3D", ts, "UVEL", layout,
-                                nPx, nPy, sNx, sNy, k=0)
-            v = stitch_field_2d(run_dir, "state3D", ts, "VVEL", layout,
-                                nPx, nPy, sNx, sNy, k=0)
-            ke = 0.5 * (u ** 2 + v ** 2)
+            data = stitch_field_2d(run_dir, "state3D", ts, var, layout,
+                                    nPx, nPy, sNx, sNy, k=k)
+            n_valid = np.sum((data != 0) & ~np.isnan(data))
+            if n_valid < n_total * MIN_VALID_FRAC:
+                print(f"  [{run_name}] {field_name} {ts}: only {n_valid}/{n_total} valid — skipping, will retry")
+                return new_count, False
             try:
-                plot_field(ke, "KE", xC, yC, model_date, out)
+                plot_field(data, field_name, xC, yC, model_date, out, raster, grid_file)
                 new_count += 1
             except Exception as e:
-                print(f"  [{run_name}] Error plotting KE: {e}")
+                print(f"  [{run_name}] Error plotting {field_name}: {e}")
+
+    # KE
+    out = os.path.join(plots_dir, f"KE_{ts}.png")
+    if not os.path.exists(out):
+        u = stitch_field_2d(run_dir, "state3D", ts, "UVEL", layout,
+                            nPx, nPy, sNx, sNy, k=0)
+        v = stitch_field_2d(run_dir, "state3D", ts, "VVEL", layout,
+                            nPx, nPy, sNx, sNy, k=0)
+        ke = 0.5 * (u ** 2 + v ** 2)
+        try:
+            plot_field(ke, "KE", xC, yC, model_date, out, raster, grid_file)
+            new_count += 1
+        except Exception as e:
+            print(f"  [{run_name}] Error plotting KE: {e}")
 
-        # SSH
-        ts2d = find_diag_timesteps(run_dir, "state2D")
-        if ts in ts2d:
-            out = os.path.join(plots_dir, f"SSH_{ts}.png")
-            if not os.path.exists(out):
-                etan = stitch_field_2d(run_dir, "state2D", ts, "ETAN", layout,
-                                       nPx, nPy, sNx, sNy)
-                try:
-                    plot_field(etan, "SSH", xC, yC, model_date, out)
-                    new_count += 1
-                except Exception as e:
-                    print(f"  [{run_name}] Error plotting SSH: {e}")
-
-        # Only mark as plotted if all expected files exist
-        expected = [f"{fn}_{ts}.png" for fn in ["SST", "SSS", "KE", "SSH"]]
-        if all(os.path.exists(os.path.join(plots_dir, e)) for e in expected):
-            plotted.add(ts)
-
-    return new_count
+    return new_count, True
 
 
 def main():
@@ -284,12 +283,17 @@ def main():
     parser.add_argument("--poll", type=int, default=120)
     parser.add_argument("--start-date", default="2002-07-01")
     parser.add_argument("--dt", type=float, default=360.0)
+    parser.add_argument("--watch", choices=("auto", "inotify", "poll"), default="auto",
+                        help="inotify, polling, or inotify except on network filesystems")
+    parser.add_argument("--raster", action="store_true",
+                        help="Fast raster rendering (index map cached next to horizgridfile.bin)")
     args = parser.parse_args()
 
-    Nx, Ny, Nz = 768, 424, 50
-    nPx, nPy = 8, 8
-    sNx, sNy = Nx // nPx, Ny // nPy
     simulation_dir = os.path.abspath(args.simulation_dir)
+    size = find_size(simulation_dir)
+    Nx, Ny, Nz = size["Nx"], size["Ny"], size["Nr"]
+    nPx, nPy = size["nPx"] * size["nSx"], size["nPy"] * size["nSy"]
+    sNx, sNy = Nx // nPx, Ny // nPy
 
     # Read model grid
     horizgridfile = os.path.join(simulation_dir, "input", "horizgridfile.bin")
@@ -297,20 +301,48 @@ def main():
     print(f"Grid: {Ny}x{Nx}, lon [{xC.min():.1f},{xC.max():.1f}], lat [{yC.min():.1f},{yC.max():.1f}]")
     print(f"Watching: {simulation_dir}")
 
-    plotted_cache = {}  # run_name → set of plotted timesteps
+    # The converter's binary inputs drive the plotter: each complete
+    # state3D/state2D pair is plotted once all of its tiles are converted.
+    watcher = DiagWatcher(("state3D", "state2D"), mode=args.watch, min_age_s=120,
+                          poll_interval=max(args.poll, 1))
 
+    states = StateStore()
     while True:
         for run_dir in discover_runs(simulation_dir):
+            watcher.add_dir(run_dir)
+
+        new_counts = {}
+        for run_dir, prefix, ts in watcher.wait(timeout=max(args.poll, 0)):
+            state = states[run_dir]
+            if state.done("plotted", prefix, ts):
+                continue
+            layout = get_tile_layout(run_dir, nPx, nPy, sNx, sNy)
+            # NetCDF and Zarr conversions have separate logs; the tile and
+            # store checks cover output converted before the run had one
+            converted = False
+            for kind in ("converted", "converted.zarr"):
+                state.refresh(kind)
+                converted = converted or state.done(kind, prefix, ts)
+            converted = converted or (layout and tiles_converted(layout, prefix, ts)) or (
+                int(ts) in stored_iterations(run_dir, prefix))
+            if not converted:
+                watcher.requeue(run_dir, prefix, ts, delay=CONVERSION_RETRY_S)
+                continue
+            n, complete = plot_timestep(run_dir, prefix, ts, layout, xC, yC,
+                                        nPx, nPy, sNx, sNy, args.dt, args.start_date,
+                                        args.raster, horizgridfile)
+            if complete:
+                state.mark("plotted", prefix, ts)
+            else:
+                watcher.requeue(run_dir, prefix, ts, delay=max(args.poll, 1))
             run_name = os.path.basename(run_dir)
-            n = process_run(run_dir, xC, yC, plotted_cache, nPx, nPy, sNx, sNy,
-                           args.dt, args.start_date)
+            new_counts[run_name] = new_counts.get(run_name, 0) + n
+        for run_name, n in new_counts.items():
             if n > 0:
                 print(f"[{run_name}] Plotted {n} new images")
 
         if args.poll <= 0:
             break
-        time.sleep(args.poll)
-
 
 if __name__ == "__main__":
     main()
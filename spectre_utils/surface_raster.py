@@ -0,0 +1,224 @@
+"""
+surface_raster.py
+=================
+Fast raster rendering of surface fields on the curvilinear model grid.
+
+``pcolormesh`` over the 768x424 grid draws ~325k quadrilaterals, the axes,
+colorbar and labels, and then encodes the PNG for every frame.  In raster
+mode the figure is drawn only at start-up:
+
+  * once without the field, giving the background image (axes, ticks,
+    labels, colorbar);
+  * once with only the mesh, each cell's index encoded in its face colour,
+    giving the model cell seen by every pixel of the map panel.
+
+A frame is then a NumPy gather of the field through that index map, a
+colormap lookup table, the title text composited on top, and a PNG encode.
+Cells are drawn without antialiasing, otherwise the frames match the
+pcolormesh figures of the plotters.
+
+The index map depends on the grid and the figure layout only, so it is cached
+next to the grid file as ``<horizgridfile>.raster-<key>.npz`` and recomputed
+when the grid file is newer.
+
+Usage:
+    renderer = RasterRenderer(FIELD_CONFIG["SST"], xC, yC, grid_file="input/horizgridfile.bin")
+    renderer.render(np.ma.masked_invalid(sst), "2002-07-02", "plots/SST_0000000240.png")
+"""
+
+import hashlib
+import os
+
+import numpy as np
+
+_plt = None
+
+
+def _import_mpl():
+    global _plt
+    if _plt is None:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+        _plt = plt
+
+
+def _encode_cells(n):
+    """RGBA face colours carrying the 24-bit cell index."""
+    if n >= (1 << 24) - 1:
+        raise ValueError(f"Grid of {n} cells does not fit in a 24-bit colour index")
+    idx = np.arange(n)
+    return np.stack([idx & 255, (idx >> 8) & 255, (idx >> 16) & 255,
+                     np.full(n, 255)], axis=1) / 255
+
+
+class RasterRenderer:
+    """Pre-rendered figure for one field; frames are composed in NumPy.
+
+    ``cfg`` has the keys of the plotters' FIELD_CONFIG entries (label, unit,
+    cmap, vmin, vmax).  The layout is that of the pcolormesh figures: 12x6
+    in, colorbar on the right, ``dpi`` 120, tight bounding box.
+    """
+
+    def __init__(self, cfg, xC, yC, grid_file=None, dpi=120, compress_level=1):
+        _import_mpl()
+        from matplotlib.colors import to_rgba
+
+        self.cfg = cfg
+        self.xC = xC
+        self.compress_level = compress_level
+
+        cmap = _plt.get_cmap(cfg["cmap"])
+        fig, ax = _plt.subplots(1, 1, figsize=(12, 6), dpi=dpi)
+        mesh = ax.pcolormesh(xC, yC, np.zeros(xC.shape), cmap=cmap,
+                             vmin=cfg["vmin"], vmax=cfg["vmax"], shading="auto",
+                             antialiased=False, edgecolors="none")
+        cb = fig.colorbar(mesh, ax=ax, shrink=0.8, pad=0.02)
+        cb.set_label(cfg["unit"], fontsize=10)
+        title = ax.set_title(f'{cfg["label"]} — 0000-00-00', fontsize=13)
+        ax.set_xlabel("Longitude")
+        ax.set_ylabel("Latitude")
+        ax.set_aspect("equal")
+        fig.tight_layout()
+        fig.canvas.draw()
+        renderer = fig.canvas.get_renderer()
+
+        # Output frame = the canvas cropped to the padded tight bounding box,
+        # which (as in savefig) may reach past the canvas edges
+        height = fig.canvas.get_width_height()[1]
+        bbox = fig.get_tightbbox(renderer).padded(_plt.rcParams["savefig.pad_inches"])
+        x0, y0 = int(round(bbox.x0 * dpi)), int(round(height - bbox.y1 * dpi))
+        x1, y1 = x0 + int(bbox.width * dpi), y0 + int(bbox.height * dpi)
+        self.margin = max(-x0, -y0, x1 - fig.canvas.get_width_height()[0], y1 - height, 0)
+        self.crop = (slice(y0 + self.margin, y1 + self.margin),
+                     slice(x0 + self.margin, x1 + self.margin))
+        facecolor = np.round(np.array(to_rgba(fig.get_facecolor())) * 255).astype(np.uint8)
+
+        # Title: anchor and the band of rows its glyphs can occupy
+        tb = title.get_window_extent(renderer)
+        self.title_rows = slice(max(int(height - tb.y1) - 3 - y0, 0), int(height - tb.y0) + 4 - y0)
+        anchor = title.get_transform().transform(title.get_position())
+        self.title_fig = _plt.figure(figsize=fig.get_size_inches(), dpi=dpi)
+        self.title_fig.patch.set_alpha(0)
+        self.title_text = self.title_fig.text(
+            anchor[0] / fig.bbox.width, anchor[1] / fig.bbox.height, "",
+            ha=title.get_ha(), va=title.get_va(), color=title.get_color(),
+            fontproperties=title.get_fontproperties())
+
+        # Background: everything but the field and title
+        title.set_text("")
+        mesh.set_visible(False)
+        fig.canvas.draw()
+        self.background = self._frame(fig, facecolor)[..., :3].copy()
+
+        # Colour lookup table; the extra last row is the blank (axes) colour
+        n = cmap.N
+        blank = np.round(np.array(to_rgba(ax.get_facecolor())) * 255)
+        self.lut = np.vstack([cmap(np.arange(n), bytes=True)[:, :3],
+                              blank[:3].astype(np.uint8)])
+        self.lut_scale = n / (cfg["vmax"] - cfg["vmin"])
+        self.n_colors = n
+
+        self.pixels, self.cells = self._index_map(fig, ax, mesh, grid_file, (x0, y0))
+        _plt.close(fig)
+
+    def _frame(self, fig, fill=(0, 0, 0, 0)):
+        """The drawn canvas of ``fig`` cropped to the output frame (RGBA)."""
+        buf = np.asarray(fig.canvas.buffer_rgba())
+        if self.margin:
+            m = self.margin
+            padded = np.empty((buf.shape[0] + 2 * m, buf.shape[1] + 2 * m, 4), dtype=np.uint8)
+            padded[:] = fill
+            padded[m:-m, m:-m] = buf
+            buf = padded
+        return buf[self.crop]
+
+    # ---- index map ---------------------------------------------------------
+
+    def _index_map(self, fig, ax, mesh, grid_file, origin):
+        """Flat frame pixels showing the map panel, and the model cell of each."""
+        extent = ax.get_window_extent()
+        key = hashlib.sha1(repr((self.xC.shape, self.background.shape, origin,
+                                 tuple(np.round(extent.bounds, 2)), ax.get_xlim(),
+                                 ax.get_ylim())).encode()).hexdigest()[:12]
+        cache_path = f"{grid_file}.raster-{key}.npz" if grid_file else None
+        if cache_path:
+            try:
+                fresh = os.path.getmtime(cache_path) >= os.path.getmtime(grid_file)
+            except OSError:
+                fresh = False
+            if fresh:
+                try:
+                    with np.load(cache_path) as cached:
+                        return cached["pixels"], cached["cells"]
+                except Exception:
+                    # Unreadable (e.g. truncated): drop it and recompute
+                    try:
+                        os.remove(cache_path)
+                    except OSError:
+                        pass
+
+        # Draw only the mesh, coloured by cell index, on a transparent canvas
+        for artist in fig.get_children():
+            if artist is not ax:
+                artist.set_visible(False)
+        for artist in ax.get_children():
+            artist.set_visible(artist is mesh)
+        ax.patch.set_visible(False)
+        mesh.set_array(None)
+        mesh.set_facecolor(_encode_cells(self.xC.size))
+        mesh.set_visible(True)
+        fig.canvas.draw()
+        buf = self._frame(fig)
+
+        index = (buf[..., 0].astype(np.int32)
+                 | buf[..., 1].astype(np.int32) << 8
+                 | buf[..., 2].astype(np.int32) << 16).ravel()
+        # Map pixels: covered by a cell and not by a spine in the background
+        blank = self.lut[-1]
+        covered = (buf[..., 3] == 255) & np.all(self.background == blank, axis=-1)
+        pixels = np.flatnonzero(covered).astype(np.int32)
+        cells = index[pixels]
+
+        if cache_path:
+            # Per-process temp name: pool workers may all miss the cache at once
+            tmp = f"{cache_path}.{os.getpid()}.tmp.npz"
+            try:
+                np.savez(tmp, pixels=pixels, cells=cells)
+                os.replace(tmp, cache_path)
+            except OSError:
+                pass  # read-only input directory: just don't cache
+            finally:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+        return pixels, cells
+
+    # ---- frames ------------------------------------------------------------
+
+    def render(self, field_data, title_extra, output_path):
+        """Save one frame; masked or NaN values are left blank like in pcolormesh."""
+        from PIL import Image
+
+        values = np.ma.getdata(field_data).ravel()[self.cells]
+        bad = np.isnan(values)
+        if np.ma.is_masked(field_data):
+            bad |= np.ma.getmaskarray(field_data).ravel()[self.cells]
+        lut_index = np.clip((values - self.cfg["vmin"]) * self.lut_scale,
+                            0, self.n_colors - 1).astype(np.intp)
+        lut_index[bad] = self.n_colors
+
+        frame = self.background.copy()
+        frame.reshape(-1, 3)[self.pixels] = self.lut[lut_index]
+
+        # Title: draw the text alone and alpha-blend it over its band
+        self.title_text.set_text(f'{self.cfg["label"]} — {title_extra}')
+        self.title_fig.canvas.draw()
+        text = self._frame(self.title_fig)[self.title_rows]
+        alpha = text[..., 3:].astype(np.float32) / 255
+        band = frame[self.title_rows]
+        band[:] = np.round(band * (1 - alpha) + text[..., :3] * alpha).astype(np.uint8)
+
+        Image.fromarray(frame).save(output_path, compress_level=self.compress_level)
+
+    def close(self):
+        _plt.close(self.title_fig)
@@ -0,0 +1,144 @@
+"""
+tile_layout.py
+==============
+Tile layout of MITgcm MNC output, computed once per run directory.
+
+Each ``mnc_<date>_<proc>/`` directory holds ``grid.t<NNN>.nc`` for the tiles of
+one process.  MITgcm numbers tiles row by row over the global domain,
+
+    tile = px + py * nSx * nPx + 1      (px, py in units of sNx, sNy)
+
+so the position of every tile follows from the file names and the SIZE.h
+decomposition; no NetCDF file has to be opened.  The result is cached as
+``tile_layout.json`` in the run directory and reused until the set of
+``mnc_*`` directories changes (e.g. after a restart created new ones).
+
+Usage:
+    size = read_size_h("code/SIZE.h")
+    layout = tile_layout(run_dir, size["nPx"], size["nPy"], size["sNx"], size["sNy"])
+    for (py, px), info in layout.items():
+        path = os.path.join(info["dir"], f"state3D.{iter}.{info['tile']}.nc")
+"""
+
+import json
+import os
+import re
+
+
+CACHE_NAME = "tile_layout.json"
+
+# Decomposition of the glorysv12-curvilinear configuration, used when no
+# SIZE.h is found.
+DEFAULT_SIZE = {"sNx": 96, "sNy": 53, "nSx": 1, "nSy": 1, "nPx": 8, "nPy": 8,
+                "Nx": 768, "Ny": 424, "Nr": 50}
+
+
+# ---------------------------------------------------------------------------
+# SIZE.h
+# ---------------------------------------------------------------------------
+
+def read_size_h(path):
+    """Parse the PARAMETER block of an MITgcm SIZE.h.
+
+    Returns ``{name: int}`` for sNx, sNy, nSx, nSy, nPx, nPy, Nx, Ny, Nr (and
+    any other integer parameters).  Products such as ``Nx = sNx*nSx*nPx`` are
+    evaluated.
+    """
+    with open(path) as f:
+        lines = [ln for ln in f if ln[:1] not in ("C", "c", "!", "*")]
+    # Fixed-form continuation lines start with '&' in column 6
+    text = "".join(ln[6:] if len(ln) > 5 and ln[5] not in (" ", "0") else ln for ln in lines)
+
+    values = {}
+    for block in re.findall(r"PARAMETER\s*\((.*?)\)", text, flags=re.S | re.I):
+        for name, expr in re.findall(r"(\w+)\s*=\s*([\w\s*]+)", block):
+            factors = [t.strip() for t in expr.split("*")]
+            prod = 1
+            for t in factors:
+                prod *= int(t) if t.isdigit() else values[t]
+            values[name] = prod
+    return values
+
+
+def find_size(simulation_dir):
+    """Decomposition from ``<simulation_dir>/code/SIZE.h``, else DEFAULT_SIZE."""
+    path = os.path.join(simulation_dir, "code", "SIZE.h")
+    size = dict(DEFAULT_SIZE)
+    if os.path.exists(path):
+        size.update(read_size_h(path))
+    return size
+
+
+# ---------------------------------------------------------------------------
+# Tile layout
+# ---------------------------------------------------------------------------
+
+def _mnc_dirs(run_dir):
+    return sorted(
+        e.name for e in os.scandir(run_dir) if e.is_dir() and e.name.startswith("mnc_")
+    )
+
+
+def compute_tile_layout(run_dir, nPx, nPy, sNx, sNy, nSx=1, nSy=1):
+    """Scan the ``mnc_*`` directories once.
+
+    Returns ``(tiles, complete)`` where ``tiles`` is a list of
+    ``[py, px, dirname, tile]`` and ``complete`` is False if some directory
+    had no grid file yet.
+    """
+    tiles_per_row = nSx * nPx
+    pattern = re.compile(r"^grid\.(t(\d+))\.nc$")
+    tiles = []
+    seen = set()
+    complete = True
+    for d in _mnc_dirs(run_dir):
+        grid = [pattern.match(n) for n in sorted(os.listdir(os.path.join(run_dir, d)))]
+        grid = [m for m in grid if m]
+        if not grid:
+            complete = False
+            continue
+        m = grid[0]
+        py, px = divmod(int(m.group(2)) - 1, tiles_per_row)
+        if (py, px) not in seen:
+            seen.add((py, px))
+            tiles.append([py, px, d, m.group(1)])
+    return tiles, complete
+
+
+def tile_layout(run_dir, nPx, nPy, sNx, sNy, nSx=1, nSy=1):
+    """``{(py, px): {"dir": <mnc dir>/, "tile": "tNNN"}}`` for ``run_dir``.
+
+    For each tile position the first ``mnc_*`` directory (sorted) that holds
+    it wins.  Read from ``tile_layout.json`` when the cached decomposition and
+    ``mnc_*`` directory list still match; otherwise recomputed and, once
+    every directory has its grid file, saved.
+    """
+    cache_path = os.path.join(run_dir, CACHE_NAME)
+    decomp = {"nPx": nPx, "nPy": nPy, "sNx": sNx, "sNy": sNy, "nSx": nSx, "nSy": nSy}
+    dirs = _mnc_dirs(run_dir)
+
+    tiles = None
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path) as f:
+                cached = json.load(f)
+            if cached.get("decomp") == decomp and cached.get("mnc_dirs") == dirs:
+                tiles = cached["tiles"]
+        except (json.JSONDecodeError, OSError, KeyError):
+            tiles = None
+
+    if tiles is None:
+        tiles, complete = compute_tile_layout(run_dir, nPx, nPy, sNx, sNy, nSx, nSy)
+        if complete and tiles:
+            tmp = f"{cache_path}.tmp"
+            try:
+                with open(tmp, "w") as f:
+                    json.dump({"decomp": decomp, "mnc_dirs": dirs, "tiles": tiles}, f)
+                os.replace(tmp, cache_path)
+            except OSError:
+                pass  # read-only run directory: just don't cache
+
+    return {
+        (py, px): {"dir": os.path.join(run_dir, d, ""), "tile": tile}
+        for py, px, d, tile in tiles
+    }
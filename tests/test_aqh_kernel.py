@@ -0,0 +1,53 @@
+"""Check the in-place aqh kernel of mk_exf_conditions against MetPy."""
+
+import numpy as np
+import pytest
+
+mpcalc = pytest.importorskip("metpy.calc")
+from metpy.units import units
+
+from spectre_utils.mk_exf_conditions import AQH_SLAB, specific_humidity_from_dewpoint
+
+
+def _grid(n_records=2 * AQH_SLAB + 5):
+    """(records, p, Td) fields spanning surface pressures and dewpoints, plus a slab remainder."""
+    p, td = np.meshgrid(np.linspace(50000.0, 105000.0, 23),
+                        np.linspace(200.0, 310.0, 31), indexing="ij")
+    shift = np.linspace(-500.0, 500.0, n_records)[:, None, None]
+    return p[None] + shift, np.broadcast_to(td, (n_records,) + td.shape).copy()
+
+
+def _metpy(p, td):
+    q = mpcalc.specific_humidity_from_dewpoint(p * units.Pa, td * units.K, phase="liquid")
+    return q.m_as("kg/kg")
+
+
+def test_matches_metpy_float64():
+    p, td = _grid()
+    q = specific_humidity_from_dewpoint(p, td, dtype=np.float64)
+    np.testing.assert_allclose(q, _metpy(p, td), rtol=1e-12, atol=0)
+
+
+def test_matches_metpy_float32():
+    p, td = _grid()
+    q = specific_humidity_from_dewpoint(p.astype(np.float32), td.astype(np.float32))
+    assert q.dtype == np.float32
+    np.testing.assert_allclose(q, _metpy(p, td), rtol=2e-5, atol=0)
+
+
+def test_in_place():
+    p, td = _grid()
+    expected = specific_humidity_from_dewpoint(p, td, dtype=np.float64)
+    out = specific_humidity_from_dewpoint(p, td, out=td)
+    assert out is td
+    np.testing.assert_array_equal(td, expected)
+
+
+@pytest.mark.filterwarnings("ignore:Saturation mixing ratio is undefined")
+def test_saturated_above_pressure_is_nan():
+    # es(310 K) is about 6.2 kPa, above a 5 kPa surface pressure
+    p = np.array([[5000.0, 100000.0]])
+    td = np.array([[310.0, 310.0]])
+    q = specific_humidity_from_dewpoint(p, td, dtype=np.float64)
+    assert np.isnan(q[0, 0]) and np.isfinite(q[0, 1])
+    np.testing.assert_allclose(q, _metpy(p, td), rtol=1e-12, atol=0)
@@ -0,0 +1,94 @@
+"""Convert binary diagnostics with --format zarr, then plot them from the store."""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+pytest.importorskip("zarr")
+
+from spectre_utils import convert_diagnostics_to_netcdf, plot_surface_fields
+from spectre_utils.diag_zarr import stored_iterations
+
+Nx, Ny, Nr, nPx, nPy = 16, 12, 3, 4, 3
+ITERS = (240, 480)
+
+SIZE_H = f"""C synthetic decomposition
+      PARAMETER (
+     &           sNx =  {Nx // nPx},
+     &           sNy =  {Ny // nPy},
+     &           nSx =   1,
+     &           nSy =   1,
+     &           nPx =   {nPx},
+     &           nPy =   {nPy},
+     &           Nx  = sNx*nSx*nPx,
+     &           Ny  = sNy*nSy*nPy,
+     &           Nr  =   {Nr})
+"""
+
+
+def _meta(path, dims, fields, it):
+    dim_list = ",\n".join(f"   {n},    1,   {n}" for n in dims)
+    names = " ".join(f"'{f:<8s}'" for f in fields)
+    with open(path, "w") as f:
+        f.write(f" nDims = [   {len(dims)} ];\n dimList = [\n{dim_list}\n ];\n"
+                f" dataprec = [ 'float32' ];\n nrecords = [   {len(fields) * (Nr if len(dims) == 3 else 1)} ];\n"
+                f" timeStepNumber = [ {it} ];\n nFlds = [    {len(fields)} ];\n"
+                f" fldList = {{\n {names}\n }};\n")
+
+
+def make_simulation(root):
+    """A simulation directory with one run of binary diagnostics, aged past min_age_s."""
+    rng = np.random.default_rng(0)
+    os.makedirs(root / "code")
+    os.makedirs(root / "input")
+    (root / "code" / "SIZE.h").write_text(SIZE_H)
+    grid = np.zeros((16, Ny + 1, Nx + 1))
+    grid[0] = np.linspace(-80, -40, Nx + 1)[None, :]
+    grid[1] = np.linspace(20, 50, Ny + 1)[:, None]
+    grid.astype(">f8").tofile(root / "input" / "horizgridfile.bin")
+
+    run = root / "run01"
+    os.makedirs(run)
+    (run / "STDOUT.0000").write_text("")
+    for t in range(1, nPx * nPy + 1):
+        os.makedirs(run / f"mnc_20020701_{t:04d}")
+        (run / f"mnc_20020701_{t:04d}" / f"grid.t{t:03d}.nc").write_bytes(b"")
+
+    old = 10**9
+    for it in ITERS:
+        state3d = np.concatenate([(amp + rng.standard_normal((Nr, Ny, Nx))).ravel()
+                                  for amp in (15, 35, 0.3, 0.3)])
+        state2d = rng.standard_normal(2 * Ny * Nx)
+        for prefix, data, dims, fields in (
+                ("state3D", state3d, (Nx, Ny, Nr), ("THETA", "SALT", "UVEL", "VVEL")),
+                ("state2D", state2d, (Nx, Ny), ("ETAN", "oceQnet"))):
+            base = run / f"{prefix}.{it:010d}"
+            data.astype(">f4").tofile(f"{base}.data")
+            _meta(f"{base}.meta", dims, fields, it)
+            for ext in (".data", ".meta"):
+                os.utime(f"{base}{ext}", (old, old))
+    return run
+
+
+def _run(module, monkeypatch, *args):
+    monkeypatch.setattr(sys, "argv", [module.__name__, *map(str, args)])
+    module.main()
+
+
+def test_zarr_conversion_is_plotted(tmp_path, monkeypatch):
+    run = make_simulation(tmp_path)
+
+    _run(convert_diagnostics_to_netcdf, monkeypatch, tmp_path, "--poll", 0, "--watch", "poll",
+         "--format", "zarr", "--workers", 1)
+    for prefix in ("state3D", "state2D"):
+        assert stored_iterations(str(run), prefix) == set(ITERS)
+    assert not list(run.glob("mnc_*/state*.nc"))
+
+    _run(plot_surface_fields, monkeypatch, tmp_path, "--poll", 0, "--watch", "poll")
+    plots = sorted(p.name for p in (run / "plots").glob("*.png"))
+    assert plots == sorted(f"{field}_{it:010d}.png" for it in ITERS
+                           for field in ("SST", "SSS", "KE", "SSH"))
+    plotted = (run / "diag_state.plotted.log").read_text().split("\n")
+    assert {f"{p} {it:010d}" for p in ("state3D", "state2D") for it in ITERS} <= set(plotted)